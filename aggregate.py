@@ -0,0 +1,297 @@
+"""Summarize the close approaches that match a query, straight from the stored columns.
+
+`NEODatabase.aggregate` finds the rows of the approach store that match a
+collection of filters (just as `NEODatabase.query_rows` does) and hands them to
+`summarize`, which groups them - by the year or month of the approach, by
+whether the approach's NEO is potentially hazardous, or by NEO - and computes a
+`Summary` of one column (the count, minimum, maximum, mean, and optionally a
+histogram) for each group. No `CloseApproach` or `NearEarthObject` is built
+along the way.
+
+Every row is first given an integer group code - an index into the list of
+years or months, the hazardous flag, or the NEO's id - and the codes are only
+turned into readable group keys once per group.
+"""
+import array
+import bisect
+import datetime
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from helpers import datetime_to_minutes, minutes_to_datetime
+from store import NO_NEO, NO_TIME
+
+
+# The ways to group close approaches.
+GROUP_BY = ('year', 'month', 'hazardous', 'neo')
+
+# The columns that can be summarized.
+COLUMNS = ('distance', 'velocity', 'diameter')
+
+# The group code of rows whose group isn't known (no time, or no NEO).
+_UNKNOWN = -1
+
+
+class Summary:
+    """Summary statistics of one column over a group of close approaches.
+
+    The `minimum`, `maximum` and `mean` are None if no value of the column is
+    known in the group (or no column was summarized), and the `histogram` and
+    its `edges` are None unless one was asked for.
+    """
+    def __init__(self, count, known=0, minimum=None, maximum=None, mean=None, histogram=None, edges=None):
+        """Create a new `Summary`.
+
+        :param count: The number of close approaches in the group.
+        :param known: How many of them have a known value of the column.
+        :param minimum: The smallest known value.
+        :param maximum: The largest known value.
+        :param mean: The mean of the known values.
+        :param histogram: The number of known values in each bin of a histogram.
+        :param edges: The edges of the histogram bins, one more than there are bins.
+        """
+        self.count = count
+        self.known = known
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mean = mean
+        self.histogram = histogram
+        self.edges = edges
+
+    @classmethod
+    def from_values(cls, count, values, edges=None):
+        """Summarize the known values of a column over a group.
+
+        :param count: The number of close approaches in the group.
+        :param values: A sequence (or NumPy array) of the known values.
+        :param edges: The edges of the histogram bins, or None for no histogram.
+        :return: A `Summary`.
+        """
+        known = len(values)
+        if not known:
+            return cls(count, histogram=None if edges is None else [0] * (len(edges) - 1), edges=edges)
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            minimum, maximum, mean = float(values.min()), float(values.max()), float(values.mean())
+            histogram = None if edges is None else numpy.histogram(values, edges)[0].tolist()
+        else:
+            minimum, maximum, mean = min(values), max(values), math.fsum(values) / known
+            histogram = None if edges is None else _histogram(values, edges)
+        return cls(count, known, minimum, maximum, mean, histogram, edges)
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(count={self.count!r}, known={self.known!r}, "
+                f"minimum={self.minimum!r}, maximum={self.maximum!r}, mean={self.mean!r})")
+
+
+def _histogram(values, edges):
+    """Count values into bins; the last bin includes its right edge, as in `numpy.histogram`."""
+    counts = [0] * (len(edges) - 1)
+    last = len(counts) - 1
+    for value in values:
+        counts[min(bisect.bisect_right(edges, value) - 1, last)] += 1
+    return counts
+
+
+def histogram_edges(groups, bins):
+    """Spread equal-width bins over the range of the known values of every group.
+
+    All groups share the same bins, so their histograms can be compared.
+
+    :param groups: An iterable of sequences (or NumPy arrays) of known values.
+    :param bins: The number of bins.
+    :return: A list of `bins + 1` edges, or None if no value is known.
+    """
+    lows, highs = [], []
+    for values in groups:
+        if not len(values):
+            continue
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            lows.append(values.min())
+            highs.append(values.max())
+        else:
+            lows.append(min(values))
+            highs.append(max(values))
+    if not lows:
+        return None
+    low, high = float(min(lows)), float(max(highs))
+    if low == high:
+        high = low + 1
+    width = (high - low) / bins
+    return [low + width * i for i in range(bins)] + [high]
+
+
+def _period_starts(group_by, first, last):
+    """List the years (or months) spanning two times, and the minute each one starts at.
+
+    :return: A tuple of a list of group keys - years as `int`s, or months as
+             'YYYY-MM' strings - and a list of the minute each one starts at.
+    """
+    first, last = minutes_to_datetime(first), minutes_to_datetime(last)
+    if group_by == 'year':
+        periods = [(year, 1) for year in range(first.year, last.year + 1)]
+        keys = [year for year, _month in periods]
+    else:
+        periods = [(year, month) for year in range(first.year, last.year + 1) for month in range(1, 13)
+                   if (first.year, first.month) <= (year, month) <= (last.year, last.month)]
+        keys = [f'{year:04d}-{month:02d}' for year, month in periods]
+    return keys, [datetime_to_minutes(datetime.datetime(year, month, 1)) for year, month in periods]
+
+
+def summarize(database, rows, column=None, group_by=None, bins=0):
+    """Group some rows of an `NEODatabase` and summarize a column over each group.
+
+    Rows whose group isn't known - approaches without a time, when grouping by
+    year or month, or without an NEO in the database, when grouping by
+    hazardous or NEO - are grouped together under the key None.
+
+    :param database: The `NEODatabase` that the rows belong to.
+    :param rows: An iterable of row indices of its approach store.
+    :param column: One of `COLUMNS`, or None to only count the rows.
+    :param group_by: One of `GROUP_BY`, or None to summarize all rows together.
+    :param bins: The number of histogram bins, or 0 for no histogram.
+    :return: A dictionary mapping each group key - a year, a 'YYYY-MM' month, a
+             hazardous flag, an NEO's primary designation, or None - to the
+             `Summary` of its rows, in order of year, month or NEO (None last).
+             Without `group_by`, the only key is None.
+    """
+    if column is not None and column not in COLUMNS:
+        raise ValueError(f"Can't summarize close approaches by {column!r}.")
+    if group_by is not None and group_by not in GROUP_BY:
+        raise ValueError(f"Can't group close approaches by {group_by!r}.")
+    if database.engine != 'python' and numpy is not None:
+        groups, keys = _group_numpy(database, rows, column, group_by)
+    else:
+        groups, keys = _group_python(database, rows, column, group_by)
+    if not groups and group_by is None:
+        groups = {0: (0, [])}
+
+    edges = histogram_edges((values for _count, values in groups.values()), bins) if bins and column else None
+    summaries = {}
+    for code in sorted(groups, key=lambda code: (code == _UNKNOWN, code)):
+        count, values = groups[code]
+        key = None if code == _UNKNOWN or group_by is None else keys(code)
+        summaries[key] = Summary.from_values(count, values, edges)
+    return summaries
+
+
+def _labels(database, group_by, starts):
+    """Make a function from a group code to its group key."""
+    if group_by in ('year', 'month'):
+        return starts[0].__getitem__
+    if group_by == 'hazardous':
+        return bool
+    neos = database._neos
+    return lambda code: neos[code].designation
+
+
+def _group_python(database, rows, column, group_by):
+    """Collect the count and the known values of each group, one row at a time.
+
+    :return: A tuple of a dictionary mapping group codes to `(count, values)`
+             pairs, and a function from a group code to its group key.
+    """
+    store = database._store
+    rows = array.array('q', rows)
+    starts = None
+    if group_by in ('year', 'month'):
+        time = store.time
+        known = [minutes for minutes in map(time.__getitem__, rows) if minutes != NO_TIME]
+        starts = _period_starts(group_by, min(known), max(known)) if known else ([], [])
+        minutes_starts = starts[1]
+
+        def code(row):
+            minutes = time[row]
+            return _UNKNOWN if minutes == NO_TIME else bisect.bisect_right(minutes_starts, minutes) - 1
+    elif group_by == 'hazardous':
+        neo, hazardous = store.neo, database._neo_hazardous
+
+        def code(row):
+            neo_row = neo[row]
+            return _UNKNOWN if neo_row == NO_NEO else hazardous[neo_row]
+    elif group_by == 'neo':
+        code = store.neo.__getitem__
+    else:
+        def code(row):
+            return 0
+
+    value = None if column is None else database._sort_values(column)
+    groups = {}
+    for row in rows:
+        key = code(row)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [0, array.array('d')]
+        group[0] += 1
+        if value is not None:
+            found = value(row)
+            if found == found:
+                group[1].append(found)
+    return {key: tuple(group) for key, group in groups.items()}, _labels(database, group_by, starts)
+
+
+def _group_numpy(database, rows, column, group_by):
+    """Collect the count and the known values of each group, with vectorized NumPy operations.
+
+    The rows are stably sorted by group code, so that each group's values are
+    one contiguous slice.
+
+    :return: As for `_group_python`, but with the values as NumPy arrays.
+    """
+    store = database._store
+    if isinstance(rows, range) and rows.step == 1:
+        rows = numpy.arange(rows.start, rows.stop, dtype=numpy.int64)
+    else:
+        rows = numpy.asarray(array.array('q', rows), dtype=numpy.int64)
+    neo = _wrap(store.neo)[rows]
+    linked = neo != NO_NEO
+    starts = None
+    if group_by in ('year', 'month'):
+        time = _wrap(store.time)[rows]
+        timed = time != NO_TIME
+        if timed.any():
+            starts = _period_starts(group_by, int(time[timed].min()), int(time.max()))
+        else:
+            starts = ([], [])
+        codes = numpy.searchsorted(numpy.asarray(starts[1], dtype=numpy.int64), time, side='right') - 1
+        codes = numpy.where(timed, codes, _UNKNOWN)
+    elif group_by == 'hazardous':
+        codes = numpy.where(linked, _by_neo(database._neo_hazardous, neo, linked), _UNKNOWN)
+    elif group_by == 'neo':
+        codes = neo
+    else:
+        codes = numpy.zeros(len(rows), dtype=numpy.int64)
+
+    if column == 'diameter':
+        values = numpy.where(linked, _by_neo(database._neo_diameter, neo, linked), math.nan)
+    elif column is not None:
+        values = _wrap(getattr(store, column))[rows]
+    else:
+        values = numpy.empty(0)
+
+    order = numpy.argsort(codes, kind='stable')
+    codes = codes[order]
+    if column is not None:
+        values = values[order]
+    unique, firsts = numpy.unique(codes, return_index=True)
+    bounds = firsts.tolist() + [len(codes)]
+    groups = {}
+    for code, start, stop in zip(unique.tolist(), bounds, bounds[1:]):
+        group = values[start:stop]
+        groups[code] = (stop - start, group[group == group])
+    return groups, _labels(database, group_by, starts)
+
+
+def _wrap(column):
+    """Wrap an `array.array` column as a NumPy array, without copying it."""
+    return numpy.frombuffer(column, dtype=column.typecode)
+
+
+def _by_neo(neo_column, neo, linked):
+    """Spread an NEO-level column out over approach rows; rows without an NEO must be masked out."""
+    if not len(neo_column):
+        return numpy.zeros(len(neo))
+    return _wrap(neo_column)[numpy.where(linked, neo, 0)]
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""Measure the performance of the hot paths of this project.
+
+This script can be invoked from the command line::
+
+    $ python3 benchmark.py {dates,models,filters,ingest,scan,aggregate,names,box,flags,days} [args]
+
+The `dates` benchmark compares parsing every `cd` value of the close approach
+data with `datetime.strptime` against `helpers.cd_to_datetime` and the bulk
+`helpers.cd_to_datetimes`:
+
+    $ python3 benchmark.py dates
+    $ python3 benchmark.py --cadfile data/cad.json dates --repeat 3
+
+The `models` benchmark measures the memory held per `NearEarthObject` and per
+`CloseApproach` (including the strings, floats and datetimes they reference):
+
+    $ python3 benchmark.py models
+
+The `filters` benchmark measures the per-row cost of checking a handful of
+filters during an unindexed scan: calling each `AttributeFilter` on each
+`CloseApproach`, the single predicate from `filters.compile_filters`, and the
+compiled row predicate that `NEODatabase` scans its columns with:
+
+    $ python3 benchmark.py filters
+
+The `ingest` benchmark compares rebuilding the database from scratch against
+applying a delta of new close approach records to it with
+`NEODatabase.add_approach_records`, for a few delta sizes:
+
+    $ python3 benchmark.py ingest --delta 10 100 1000
+
+The `scan` benchmark times an unindexed full scan in this process against the
+same scan split over a few numbers of worker processes (see
+`NEODatabase.workers`), and how long the first 10 results take:
+
+    $ python3 benchmark.py scan --jobs 2 4
+
+The `aggregate` benchmark compares computing the minimum, maximum and mean
+distance per year by folding the `CloseApproach` objects from
+`NEODatabase.query` against `NEODatabase.aggregate`:
+
+    $ python3 benchmark.py aggregate
+
+The `names` benchmark compares finding the NEOs most similar to a few
+misspelled names by comparing each name with every NEO's name and designation
+against `NEODatabase.search_neos`, and times building its trigram index:
+
+    $ python3 benchmark.py names
+
+The `box` benchmark compares screening queries - ranges of date, distance and
+velocity together - answered with the k-d tree over those columns (see
+`NEODatabase.box_columns`) against the best plan with single-column indexes
+alone, over synthetic close approaches spread uniformly or in clusters:
+
+    $ python3 benchmark.py box --rows 1000000
+
+The `flags` benchmark compares queries and counts with hazardous and diameter
+filters answered with the flag bitmaps (see `NEODatabase.flag_bitmaps`)
+against checking those filters row by row, over synthetic close approaches of
+synthetic NEOs:
+
+    $ python3 benchmark.py flags --rows 1000000
+
+The `days` benchmark compares queries and counts for a date, a month and a
+year answered from the day buckets (see `NEODatabase.day_buckets`) against
+bisecting the time index - or scanning, when time isn't one of the
+`NEODatabase.indexed_columns` - over synthetic close approaches stored in
+time order and shuffled out of it:
+
+    $ python3 benchmark.py days --rows 1000000
+
+By default, the benchmarks run over the full data set in `data` if it exists,
+and otherwise over the (much smaller) test data set in `tests`.
+"""
+import argparse
+import array
+import datetime
+import gc
+import itertools
+import pathlib
+import random
+import time
+import timeit
+import tracemalloc
+
+import database as database_module
+import helpers
+import names
+from database import NEODatabase
+from extract import iter_cad_rows, load_neos, load_approaches, load_approach_records
+from filters import compile_filters, create_filters
+from models import NearEarthObject
+from store import ApproachStore, NO_NEO
+
+
+PROJECT_ROOT = pathlib.Path(__file__).parent.resolve()
+DATA_ROOT = PROJECT_ROOT / 'data'
+TESTS_ROOT = PROJECT_ROOT / 'tests'
+
+
+def default_path(name, test_name):
+    """Prefer the full data file, falling back to the test data file."""
+    path = DATA_ROOT / name
+    return path if path.exists() else TESTS_ROOT / test_name
+
+
+def best_of(function, repeat):
+    """Return the best wall-clock time, in seconds, of `repeat` calls to `function`."""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def report(label, seconds, count, baseline=None):
+    """Print one line of timing results."""
+    line = f"{label:<32} {seconds * 1e3:9.1f} ms  {seconds / count * 1e9:8.0f} ns/row"
+    if baseline is not None:
+        line += f"  {baseline / seconds:5.1f}x"
+    print(line)
+
+
+def bench_dates(args):
+    """Compare `strptime` against the fixed-format `cd` parser."""
+    column = [cd for (cd,) in iter_cad_rows(args.cadfile, ('cd',))]
+    print(f"Parsing {len(column)} calendar dates from {args.cadfile}")
+
+    def with_strptime():
+        return [datetime.datetime.strptime(cd, "%Y-%b-%d %H:%M") for cd in column]
+
+    def with_cd_to_datetime():
+        helpers._DAYS.clear()
+        return [helpers.cd_to_datetime(cd) for cd in column]
+
+    def with_cd_to_datetimes():
+        helpers._DAYS.clear()
+        return helpers.cd_to_datetimes(column)
+
+    assert with_strptime() == with_cd_to_datetime() == with_cd_to_datetimes()
+    baseline = best_of(with_strptime, args.repeat)
+    report("datetime.strptime", baseline, len(column))
+    report("helpers.cd_to_datetime", best_of(with_cd_to_datetime, args.repeat), len(column), baseline)
+    report("helpers.cd_to_datetimes", best_of(with_cd_to_datetimes, args.repeat), len(column), baseline)
+
+
+def traced_bytes(function):
+    """Call `function` and return its result and the number of bytes it left allocated."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        gc.collect()
+        allocated, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, allocated
+
+
+def bench_models(args):
+    """Measure the memory footprint of NEO and close approach objects."""
+    neos, neo_bytes = traced_bytes(lambda: load_neos(args.neofile))
+    approaches, approach_bytes = traced_bytes(lambda: load_approaches(args.cadfile))
+    print(f"{len(neos)} NEOs from {args.neofile}: "
+          f"{neo_bytes / len(neos):.0f} bytes/NEO")
+    print(f"{len(approaches)} close approaches from {args.cadfile}: "
+          f"{approach_bytes / len(approaches):.0f} bytes/approach")
+    print(f"Both together: {(neo_bytes + approach_bytes) / len(approaches):.0f} bytes/approach")
+
+
+def bench_filters(args):
+    """Compare calling each filter on each approach against compiled predicates."""
+    approaches = load_approaches(args.cadfile)
+    database = NEODatabase(load_neos(args.neofile), approaches)
+    filters = create_filters(start_date=datetime.date(1900, 1, 1), distance_max=0.4,
+                             velocity_min=1, diameter_max=100, hazardous=False)
+    conditions, _residual = database._split_filters(filters)
+    print(f"Checking {len(filters)} filters against {len(approaches)} close approaches")
+
+    def with_filter_calls():
+        return [approach for approach in approaches if all([flt(approach) for flt in filters])]
+
+    def with_compiled_filters():
+        return list(filter(compile_filters(filters), approaches))
+
+    def with_compiled_rows():
+        return list(database._scan(conditions))
+
+    expected = with_filter_calls()
+    assert with_compiled_filters() == expected
+    assert [database._approach(row) for row in with_compiled_rows()] == expected
+    baseline = best_of(with_filter_calls, args.repeat)
+    report("AttributeFilter calls", baseline, len(approaches))
+    report("filters.compile_filters", best_of(with_compiled_filters, args.repeat), len(approaches), baseline)
+    report("NEODatabase._scan (columns)", best_of(with_compiled_rows, args.repeat), len(approaches), baseline)
+
+
+def bench_ingest(args):
+    """Compare a full rebuild of the database against applying a delta of new records."""
+    neos = load_neos(args.neofile)
+    records = list(load_approach_records(args.cadfile))
+    print(f"Adding close approach records to a database of {len(records)}")
+
+    def rebuild():
+        return NEODatabase.from_records(list(neos), records)
+
+    baseline = best_of(rebuild, args.repeat)
+    report("full rebuild", baseline, len(records))
+    for size in args.delta:
+        if not 0 < size < len(records):
+            continue
+        timings = []
+        for _ in range(args.repeat):
+            database = NEODatabase.from_records(list(neos), records[:-size])
+            start = time.perf_counter()
+            database.add_approach_records(records[-size:])
+            timings.append(time.perf_counter() - start)
+        report(f"add_approach_records({size})", min(timings), size, baseline)
+
+
+def bench_scan(args):
+    """Compare a full scan in this process against scans split over worker processes."""
+    database = NEODatabase.from_records(load_neos(args.neofile), load_approach_records(args.cadfile))
+    database.indexed_columns = ()
+    database.box_columns = ()
+    database._build_indexes()
+    filters = create_filters(distance_max=0.4, velocity_min=1, hazardous=False)
+    count = len(database._store)
+    print(f"Scanning {count} close approaches without indexes")
+    # Split even the small test data set, so there is something to measure.
+    database_module._MIN_PARALLEL_ROWS = 0
+
+    def scan():
+        return len(list(database.query_rows(filters)))
+
+    def first_results():
+        return list(itertools.islice(database.query_rows(filters), 10))
+
+    baseline = best_of(scan, args.repeat)
+    report("1 process", baseline, count)
+    report("1 process, first 10 results", best_of(first_results, args.repeat), count, baseline)
+    for jobs in args.jobs:
+        database.workers = jobs
+        report(f"{jobs} workers", best_of(scan, args.repeat), count, baseline)
+        report(f"{jobs} workers, first 10 results", best_of(first_results, args.repeat), count, baseline)
+
+
+def bench_aggregate(args):
+    """Compare folding query results in Python against aggregating the stored columns."""
+    database = NEODatabase.from_records(load_neos(args.neofile), load_approach_records(args.cadfile))
+    count = len(database._store)
+    print(f"Summarizing the distance of {count} close approaches per year")
+
+    def with_query():
+        years = {}
+        for approach in database.query():
+            years.setdefault(approach.time.year, []).append(approach.distance)
+        return {year: (len(values), min(values), max(values), sum(values) / len(values))
+                for year, values in years.items()}
+
+    def with_aggregate():
+        return database.aggregate(column='distance', group_by='year')
+
+    assert sorted(with_query()) == list(with_aggregate())
+    # Build every `CloseApproach` up front, so the baseline doesn't pay for it.
+    with_query()
+    baseline = best_of(with_query, args.repeat)
+    report("folding NEODatabase.query", baseline, count)
+    for engine in ('python', 'numpy'):
+        database.engine = engine
+        report(f"NEODatabase.aggregate ({engine})", best_of(with_aggregate, args.repeat), count, baseline)
+
+
+def bench_names(args):
+    """Compare a linear fuzzy search over every NEO against the trigram index."""
+    database = NEODatabase.from_records(load_neos(args.neofile), ())
+    queries = ['Halely', 'apolo', 'Cerbrus', '2020 SB1', '43 Eros']
+    texts = [(names.fold(text), row) for row, neo in enumerate(database._neos)
+             for text in (neo.name, neo.designation) if text]
+    count = len(texts) * len(queries)
+    print(f"Searching {len(texts)} names and designations for {len(queries)} misspellings")
+
+    def linear():
+        found = []
+        for query in queries:
+            wanted = names.trigrams(names.fold(query))
+            best = {}
+            for text, row in texts:
+                split = names.trigrams(text)
+                shared = len(wanted & split)
+                score = shared / (len(wanted) + len(split) - shared)
+                if score >= names.DEFAULT_THRESHOLD and score > best.get(row, 0.0):
+                    best[row] = score
+            found.append(sorted(best.items(), key=lambda pair: (-pair[1], pair[0]))[:10])
+        return found
+
+    def indexed():
+        return [database._trigram_index().search(query) for query in queries]
+
+    def build():
+        database._trigrams = None
+        database._trigram_index()
+
+    assert linear() == indexed()
+    baseline = best_of(linear, args.repeat)
+    report("comparing with every name", baseline, count)
+    report("NEODatabase.search_neos", best_of(indexed, args.repeat), count, baseline)
+    report("building the trigram index", best_of(build, args.repeat), len(texts))
+
+
+def synthetic_store(rows, clustered, seed=0):
+    """Make an `ApproachStore` of close approaches from 1900 to 2100, without NEOs.
+
+    Uniform approaches are spread evenly over time, distance (0 to 0.5 au) and
+    velocity (1 to 50 km/s); clustered ones gather around 50 random points.
+    """
+    generator = random.Random(seed)
+    first = helpers.datetime_to_minutes(datetime.datetime(1900, 1, 1))
+    last = helpers.datetime_to_minutes(datetime.datetime(2100, 1, 1))
+    if clustered:
+        centers = [(generator.uniform(first, last), generator.uniform(0, 0.5), generator.uniform(1, 50))
+                   for _ in range(50)]
+        spread = (last - first) / 200
+
+        def approach():
+            time, distance, velocity = generator.choice(centers)
+            return (min(max(generator.gauss(time, spread), first), last),
+                    abs(generator.gauss(distance, 0.01)), abs(generator.gauss(velocity, 1)))
+    else:
+        def approach():
+            return generator.uniform(first, last), generator.uniform(0, 0.5), generator.uniform(1, 50)
+    approaches = sorted(approach() for _ in range(rows))
+    return ApproachStore(array.array('q', (int(time) for time, _distance, _velocity in approaches)),
+                         array.array('d', (distance for _time, distance, _velocity in approaches)),
+                         array.array('d', (velocity for _time, _distance, velocity in approaches)),
+                         array.array('q', [NO_NEO]) * rows,
+                         {row: 'synthetic' for row in range(rows)})
+
+
+def bench_box(args):
+    """Compare screening queries with the k-d tree against single-column index plans."""
+    queries = {
+        "2000-2050, < 0.05 au, > 30 km/s": create_filters(start_date=datetime.date(2000, 1, 1),
+                                                          end_date=datetime.date(2049, 12, 31),
+                                                          distance_max=0.05, velocity_min=30),
+        "< 0.01 au, > 40 km/s": create_filters(distance_max=0.01, velocity_min=40),
+        "0.1-0.3 au, 10-30 km/s": create_filters(distance_min=0.1, distance_max=0.3,
+                                                 velocity_min=10, velocity_max=30),
+    }
+    for workload in ('uniform', 'clustered'):
+        database = NEODatabase.from_store([], synthetic_store(args.rows, workload == 'clustered'))
+        start = time.perf_counter()
+        database._box_index([('time', None, None), ('distance', None, None)])
+        print(f"{workload}: {args.rows} close approaches, "
+              f"k-d tree built in {(time.perf_counter() - start) * 1e3:.0f} ms")
+        for engine in ('python', 'numpy'):
+            database.engine = engine
+            for label, filters in queries.items():
+                def run():
+                    return list(database.query_rows(filters))
+
+                database.box_columns = ()
+                plan = database.explain(filters)
+                baseline = best_of(run, args.repeat)
+                report(f"{engine}: {label}", baseline, args.rows)
+                print(f"{'':>4}without the tree: {plan.access} {plan.column or ''}")
+                del database.box_columns
+                plan = database.explain(filters)
+                report(f"{'':>4}with the tree: {plan.access}", best_of(run, args.repeat), args.rows, baseline)
+
+
+def bench_flags(args):
+    """Compare hazardous and diameter filters answered with the flag bitmaps against checking them row by row."""
+    generator = random.Random(0)
+    # About as many NEOs per approach, and as many hazardous or measured ones, as in the full data set.
+    neos = [NearEarthObject(designation=str(row), name=None,
+                            diameter=generator.uniform(0.01, 5) if generator.random() < 0.07 else '',
+                            hazardous='Y' if generator.random() < 0.09 else 'N')
+            for row in range(max(1, args.rows // 20))]
+    store = synthetic_store(args.rows, clustered=False)
+    store.neo = array.array('q', (generator.randrange(len(neos)) for _ in range(args.rows)))
+    store.orphans = {}
+    database = NEODatabase.from_store(neos, store)
+    database.box_columns = ()
+    start = time.perf_counter()
+    database._flag_bitmaps(database._split_filters(create_filters(hazardous=True))[0])
+    print(f"{args.rows} close approaches of {len(neos)} NEOs, "
+          f"flag bitmaps built in {(time.perf_counter() - start) * 1e3:.0f} ms: {database._flags!r}")
+
+    queries = {
+        "hazardous": create_filters(hazardous=True),
+        "hazardous, 2000-2009": create_filters(hazardous=True, start_date=datetime.date(2000, 1, 1),
+                                               end_date=datetime.date(2009, 12, 31)),
+        "not hazardous, < 0.05 au": create_filters(hazardous=False, distance_max=0.05),
+        "hazardous, > 1 km, > 20 km/s": create_filters(hazardous=True, diameter_min=1, velocity_min=20),
+    }
+    for engine in ('python', 'numpy'):
+        database.engine = engine
+        for label, filters in queries.items():
+            for name, run in (("query", lambda: list(database.query_rows(filters))),
+                              ("count", lambda: database.count(filters))):
+                database.flag_bitmaps = False
+                plan = database.explain(filters)
+                baseline = best_of(run, args.repeat)
+                report(f"{engine}: {name} {label}", baseline, args.rows)
+                print(f"{'':>4}without the bitmaps: {plan.access} {plan.column or ''}")
+                del database.flag_bitmaps
+                plan = database.explain(filters)
+                flags = ', '.join(flag for flag, _fraction in plan.flags) or 'none'
+                report(f"{'':>4}with the bitmaps: {plan.access} ({flags})", best_of(run, args.repeat),
+                       args.rows, baseline)
+
+
+def bench_days(args):
+    """Compare date, month and year queries answered from the day buckets against the time index, or a scan."""
+    store = synthetic_store(args.rows, clustered=False)
+    shuffled = list(range(args.rows))
+    random.Random(0).shuffle(shuffled)
+    shuffled = ApproachStore(*(array.array(column.typecode, (column[row] for row in shuffled))
+                               for column in (store.time, store.distance, store.velocity, store.neo)),
+                             dict(store.orphans))
+    layouts = {
+        "in time order": (store, ('time', 'distance', 'velocity')),
+        "shuffled": (shuffled, ('time', 'distance', 'velocity')),
+        "shuffled, time not indexed": (shuffled, ('distance', 'velocity')),
+    }
+    queries = {
+        "2000-06-15": create_filters(date=datetime.date(2000, 6, 15)),
+        "2000-06": create_filters(start_date=datetime.date(2000, 6, 1), end_date=datetime.date(2000, 6, 30)),
+        "2000": create_filters(start_date=datetime.date(2000, 1, 1), end_date=datetime.date(2000, 12, 31)),
+        "2000-06-15, < 0.1 au": create_filters(date=datetime.date(2000, 6, 15), distance_max=0.1),
+    }
+    for layout, (approaches, indexed_columns) in layouts.items():
+        database = NEODatabase.from_store([], approaches)
+        database.indexed_columns = indexed_columns
+        database.box_columns = ()
+        database._build_indexes()
+        database._collect_stats()
+        start = time.perf_counter()
+        database._day_index(database._split_filters(queries["2000-06-15"])[0])
+        print(f"{args.rows} close approaches {layout}, "
+              f"day buckets built in {(time.perf_counter() - start) * 1e3:.0f} ms: {database._days!r}")
+        for label, filters in queries.items():
+            for name, run in (("query", lambda: list(database.query_rows(filters))),
+                              ("count", lambda: database.count(filters))):
+                database.day_buckets = False
+                plan = database.explain(filters)
+                baseline = best_of(run, args.repeat)
+                report(f"{name} {label}", baseline, args.rows)
+                print(f"{'':>4}without the buckets: {plan.access} {plan.column or ''}")
+                del database.day_buckets
+                plan = database.explain(filters)
+                report(f"{'':>4}with the buckets: {plan.access} {plan.column or ''}", best_of(run, args.repeat),
+                       args.rows, baseline)
+
+
+def make_parser():
+    """Create an ArgumentParser for this script."""
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of this project.")
+    parser.add_argument('--neofile', default=default_path('neos.csv', 'test-neos-2020.csv'),
+                        type=pathlib.Path, help="Path to CSV file of near-Earth objects.")
+    parser.add_argument('--cadfile', default=default_path('cad.json', 'test-cad-2020.json'),
+                        type=pathlib.Path, help="Path to JSON file of close approach data.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    dates = subparsers.add_parser('dates', description=bench_dates.__doc__)
+    dates.add_argument('-r', '--repeat', type=int, default=5,
+                       help="Number of timed runs; the best one is reported.")
+    dates.set_defaults(run=bench_dates)
+
+    models = subparsers.add_parser('models', description=bench_models.__doc__)
+    models.set_defaults(run=bench_models)
+
+    filters = subparsers.add_parser('filters', description=bench_filters.__doc__)
+    filters.add_argument('-r', '--repeat', type=int, default=5,
+                         help="Number of timed runs; the best one is reported.")
+    filters.set_defaults(run=bench_filters)
+
+    ingest = subparsers.add_parser('ingest', description=bench_ingest.__doc__)
+    ingest.add_argument('-d', '--delta', type=int, nargs='+', default=[10, 100, 1000],
+                        help="Numbers of records to apply as a delta.")
+    ingest.add_argument('-r', '--repeat', type=int, default=3,
+                        help="Number of timed runs; the best one is reported.")
+    ingest.set_defaults(run=bench_ingest)
+
+    scan = subparsers.add_parser('scan', description=bench_scan.__doc__)
+    scan.add_argument('-j', '--jobs', type=int, nargs='+', default=[2, 4],
+                      help="Numbers of worker processes to split the scan over.")
+    scan.add_argument('-r', '--repeat', type=int, default=3,
+                      help="Number of timed runs; the best one is reported.")
+    scan.set_defaults(run=bench_scan)
+
+    aggregate = subparsers.add_parser('aggregate', description=bench_aggregate.__doc__)
+    aggregate.add_argument('-r', '--repeat', type=int, default=5,
+                           help="Number of timed runs; the best one is reported.")
+    aggregate.set_defaults(run=bench_aggregate)
+
+    names_ = subparsers.add_parser('names', description=bench_names.__doc__)
+    names_.add_argument('-r', '--repeat', type=int, default=5,
+                        help="Number of timed runs; the best one is reported.")
+    names_.set_defaults(run=bench_names)
+
+    box = subparsers.add_parser('box', description=bench_box.__doc__)
+    box.add_argument('-n', '--rows', type=int, default=200000,
+                     help="Number of synthetic close approaches in each workload.")
+    box.add_argument('-r', '--repeat', type=int, default=3,
+                     help="Number of timed runs; the best one is reported.")
+    box.set_defaults(run=bench_box)
+
+    flags = subparsers.add_parser('flags', description=bench_flags.__doc__)
+    flags.add_argument('-n', '--rows', type=int, default=200000,
+                       help="Number of synthetic close approaches.")
+    flags.add_argument('-r', '--repeat', type=int, default=3,
+                       help="Number of timed runs; the best one is reported.")
+    flags.set_defaults(run=bench_flags)
+
+    days = subparsers.add_parser('days', description=bench_days.__doc__)
+    days.add_argument('-n', '--rows', type=int, default=200000,
+                      help="Number of synthetic close approaches.")
+    days.add_argument('-r', '--repeat', type=int, default=5,
+                      help="Number of timed runs; the best one is reported.")
+    days.set_defaults(run=bench_days)
+    return parser
+
+
+def main():
+    """Run the chosen benchmark."""
+    args = make_parser().parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
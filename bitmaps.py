@@ -0,0 +1,440 @@
+"""Compressed bitmaps of approach rows, for flags that many rows share.
+
+A `Bitmap` is a set of row indices, stored the way Roaring bitmaps are: the
+rows are cut into chunks of 2**16 by their high bits, and each chunk keeps the
+low 16 bits of its rows in whichever container is smaller - a sorted
+`array('H')` when the chunk holds at most 4096 rows, or else a 2**16-bit
+Python `int` with one bit per row. So a bitmap never takes more than 8 KiB per
+chunk (about a bit per row) however dense it is, nor more than 2 bytes per row
+however sparse, and intersecting or uniting two dense chunks is a single
+big-integer `&` or `|`, which runs in C a machine word at a time. (The
+intersection or difference of two bitsets stays a bitset, however few rows it
+keeps: it's usually listed right away, and that costs no more than turning it
+into an array would.)
+
+`FlagBitmaps` keeps a `Bitmap` of the approaches of hazardous NEOs, one of the
+approaches of NEOs that aren't hazardous, and one each of the approaches whose
+NEO's diameter is known and unknown (an approach without an NEO has no known
+diameter). `NEODatabase` answers a hazardous filter with the first two, and
+narrows down a diameter filter to the third, by intersecting them with each
+other and with the range of rows from a presorted index - a whole chunk at a
+time, instead of checking the rows one by one.
+"""
+import array
+import bisect
+import functools
+import operator
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from indexes import RANGE_OPS
+from store import NO_NEO
+
+
+# The rows of a chunk share all but their lowest `_CHUNK_BITS` bits.
+_CHUNK_BITS = 16
+_CHUNK_ROWS = 1 << _CHUNK_BITS
+_LOW_BITS = _CHUNK_ROWS - 1
+_CHUNK_BYTES = _CHUNK_ROWS // 8
+# A chunk of more rows than this takes less space as a bitset.
+_MAX_ARRAY = 4096
+
+_ONE = re.compile('1')
+
+# The flags of an approach row, in the order `FlagBitmaps.flags` reports them.
+FLAGS = ('hazardous', 'not hazardous', 'diameter known', 'diameter unknown')
+
+
+if hasattr(int, 'bit_count'):
+    def _popcount(bits):
+        return bits.bit_count()
+else:
+    def _popcount(bits):
+        return bin(bits).count('1')
+
+
+def _to_bits(offsets):
+    """Turn a chunk's sorted array of offsets into a bitset."""
+    if numpy is not None:
+        bits = numpy.zeros(_CHUNK_ROWS, dtype=bool)
+        bits[_wrap(offsets)] = True
+        return int.from_bytes(numpy.packbits(bits, bitorder='little').tobytes(), 'little')
+    data = bytearray(_CHUNK_BYTES)
+    for offset in offsets:
+        data[offset >> 3] |= 1 << (offset & 7)
+    return int.from_bytes(data, 'little')
+
+
+def _to_offsets(bits):
+    """Turn a chunk's bitset into a sorted array of offsets."""
+    if numpy is not None:
+        return _from_numpy(_numpy_offsets(bits))
+    # The binary digits, lowest first, so that each '1' sits at its offset.
+    return array.array('H', [match.start() for match in _ONE.finditer(bin(bits)[:1:-1])])
+
+
+def _numpy_offsets(chunk):
+    """Return a chunk's offsets, whichever form it is stored in, as a NumPy array of int64."""
+    if not isinstance(chunk, int):
+        return _wrap(chunk).astype(numpy.int64)
+    data = numpy.frombuffer(chunk.to_bytes(_CHUNK_BYTES, 'little'), dtype=numpy.uint8)
+    return numpy.flatnonzero(numpy.unpackbits(data, bitorder='little'))
+
+
+def _container(chunk):
+    """Store a chunk - a bitset or a sorted array of offsets - in its smaller form, or None if it's empty."""
+    if isinstance(chunk, int):
+        count = _popcount(chunk)
+        if not count:
+            return None
+        return _to_offsets(chunk) if count <= _MAX_ARRAY else chunk
+    if not chunk:
+        return None
+    return _to_bits(chunk) if len(chunk) > _MAX_ARRAY else chunk
+
+
+def _bits(chunk):
+    """Return a chunk as a bitset, whichever form it is stored in."""
+    return chunk if isinstance(chunk, int) else _to_bits(chunk)
+
+
+def _wrap(offsets):
+    """Wrap a chunk's array of offsets as a NumPy array, without copying it."""
+    return numpy.frombuffer(offsets, dtype=numpy.uint16)
+
+
+def _from_numpy(offsets):
+    """Copy a NumPy array of offsets into an `array('H')`."""
+    return array.array('H', offsets.astype(numpy.uint16).tobytes())
+
+
+def _filter(offsets, bits, keep):
+    """Keep the offsets whose bit in a bitset is `keep`."""
+    data = bits.to_bytes(_CHUNK_BYTES, 'little')
+    if numpy is not None:
+        found = numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8), bitorder='little')[_wrap(offsets)]
+        return _from_numpy(_wrap(offsets)[found.astype(bool) == keep])
+    return array.array('H', [offset for offset in offsets if bool(data[offset >> 3] >> (offset & 7) & 1) is keep])
+
+
+def _and(first, second):
+    """Intersect two chunks."""
+    if isinstance(first, int) and isinstance(second, int):
+        return first & second or None
+    if isinstance(first, int):
+        first, second = second, first
+    if isinstance(second, int):
+        return _container(_filter(first, second, True))
+    if numpy is not None:
+        return _container(_from_numpy(numpy.intersect1d(_wrap(first), _wrap(second), assume_unique=True)))
+    return _container(array.array('H', sorted(set(first).intersection(second))))
+
+
+def _or(first, second):
+    """Unite two chunks."""
+    if isinstance(first, int) or isinstance(second, int):
+        return _container(_bits(first) | _bits(second))
+    if numpy is not None:
+        return _container(_from_numpy(numpy.union1d(_wrap(first), _wrap(second))))
+    return _container(array.array('H', sorted(set(first).union(second))))
+
+
+def _subtract(first, second):
+    """Take the rows of one chunk out of another."""
+    if isinstance(first, int):
+        return first & ~_bits(second) or None
+    if isinstance(second, int):
+        return _container(_filter(first, second, False))
+    if numpy is not None:
+        return _container(_from_numpy(numpy.setdiff1d(_wrap(first), _wrap(second), assume_unique=True)))
+    return _container(array.array('H', sorted(set(first).difference(second))))
+
+
+class Bitmap:
+    """A compressed set of row indices, in chunks of 2**16 rows (see the module docstring).
+
+    Bitmaps combine with `&` (the rows in both), `|` (the rows in either) and
+    `-` (the rows in the first but not the second), chunk by chunk; `len`
+    counts the rows without listing them.
+    """
+    def __init__(self, rows=()):
+        """Create a new `Bitmap`.
+
+        :param rows: An iterable of non-negative row indices, in any order.
+        """
+        chunks = {}
+        for row in rows:
+            high = row >> _CHUNK_BITS
+            offsets = chunks.get(high)
+            if offsets is None:
+                offsets = chunks[high] = []
+            offsets.append(row & _LOW_BITS)
+        self._chunks = {}
+        for high in sorted(chunks):
+            self._chunks[high] = _container(array.array('H', sorted(set(chunks[high]))))
+
+    @classmethod
+    def _from_chunks(cls, chunks):
+        """Wrap a dictionary of non-empty containers, by chunk number, as a `Bitmap`."""
+        bitmap = cls.__new__(cls)
+        bitmap._chunks = chunks
+        return bitmap
+
+    @classmethod
+    def from_range(cls, start, stop):
+        """Make the `Bitmap` of a range of rows, `start <= row < stop`."""
+        chunks = {}
+        if stop <= start:
+            return cls._from_chunks(chunks)
+        for high in range(start >> _CHUNK_BITS, (stop + _LOW_BITS) >> _CHUNK_BITS):
+            first = max(start, high << _CHUNK_BITS) & _LOW_BITS
+            last = min(stop, (high + 1) << _CHUNK_BITS) - (high << _CHUNK_BITS)
+            chunk = _container(((1 << (last - first)) - 1) << first)
+            if chunk is not None:
+                chunks[high] = chunk
+        return cls._from_chunks(chunks)
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Make the `Bitmap` of the rows where a NumPy boolean array is True."""
+        packed = numpy.packbits(mask, bitorder='little').tobytes()
+        chunks = {}
+        for high, start in enumerate(range(0, len(packed), _CHUNK_BYTES)):
+            chunk = _container(int.from_bytes(packed[start:start + _CHUNK_BYTES], 'little'))
+            if chunk is not None:
+                chunks[high] = chunk
+        return cls._from_chunks(chunks)
+
+    def __len__(self):
+        """Return the number of rows in the bitmap."""
+        return sum(_popcount(chunk) if isinstance(chunk, int) else len(chunk) for chunk in self._chunks.values())
+
+    def __contains__(self, row):
+        chunk = self._chunks.get(row >> _CHUNK_BITS)
+        if chunk is None:
+            return False
+        offset = row & _LOW_BITS
+        if isinstance(chunk, int):
+            return bool(chunk >> offset & 1)
+        position = bisect.bisect_left(chunk, offset)
+        return position < len(chunk) and chunk[position] == offset
+
+    def __iter__(self):
+        """Iterate over the rows of the bitmap, in ascending order."""
+        return iter(self.rows())
+
+    def rows(self):
+        """List the rows of the bitmap, in ascending order."""
+        highs = sorted(self._chunks)
+        if numpy is None:
+            found = []
+            for high in highs:
+                chunk, base = self._chunks[high], high << _CHUNK_BITS
+                found.extend([base + offset for offset in (_to_offsets(chunk) if isinstance(chunk, int) else chunk)])
+            return found
+        if not highs:
+            return []
+        return numpy.concatenate([_numpy_offsets(self._chunks[high]) + (high << _CHUNK_BITS)
+                                  for high in highs]).tolist()
+
+    def select(self, rows):
+        """Keep the rows of a sequence that are in the bitmap.
+
+        :param rows: A sequence of row indices, in ascending order.
+        :return: A list of the rows that are in the bitmap, in the same order.
+        """
+        if isinstance(rows, range) and rows.step == 1:
+            return (self & Bitmap.from_range(rows.start, rows.stop)).rows()
+        if numpy is None:
+            return self._select_python(rows)
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        highs = rows >> _CHUNK_BITS
+        keep = numpy.zeros(len(rows), dtype=bool)
+        starts = numpy.flatnonzero(numpy.diff(highs, prepend=-1)).tolist()
+        for start, stop in zip(starts, starts[1:] + [len(rows)]):
+            chunk = self._chunks.get(int(highs[start]))
+            if chunk is None:
+                continue
+            offsets = rows[start:stop] & _LOW_BITS
+            if isinstance(chunk, int):
+                data = numpy.frombuffer(chunk.to_bytes(_CHUNK_BYTES, 'little'), dtype=numpy.uint8)
+                keep[start:stop] = numpy.unpackbits(data, bitorder='little')[offsets].astype(bool)
+            else:
+                keep[start:stop] = numpy.isin(offsets, _wrap(chunk))
+        return rows[keep].tolist()
+
+    def _select_python(self, rows):
+        """As `select`, one row at a time."""
+        chunks, found = self._chunks, []
+        # Each chunk that the rows touch, as the bytes of a bitset.
+        data = {}
+        for row in rows:
+            high = row >> _CHUNK_BITS
+            bits = data.get(high)
+            if bits is None:
+                chunk = chunks.get(high)
+                bits = data[high] = b'' if chunk is None else _bits(chunk).to_bytes(_CHUNK_BYTES, 'little')
+            if bits:
+                offset = row & _LOW_BITS
+                if bits[offset >> 3] >> (offset & 7) & 1:
+                    found.append(row)
+        return found
+
+    def _combine(self, other, function, keep_first, keep_second):
+        """Combine the chunks of two bitmaps with a function of two chunks."""
+        if not isinstance(other, Bitmap):
+            return NotImplemented
+        chunks = {}
+        for high in sorted(self._chunks.keys() | other._chunks.keys()):
+            first, second = self._chunks.get(high), other._chunks.get(high)
+            if first is not None and second is not None:
+                chunk = function(first, second)
+            else:
+                chunk = first if keep_first and second is None else second if keep_second else None
+                # Arrays change in place (see `add`), so they aren't shared between bitmaps.
+                if chunk is not None and not isinstance(chunk, int):
+                    chunk = array.array('H', chunk)
+            if chunk is not None:
+                chunks[high] = chunk
+        return Bitmap._from_chunks(chunks)
+
+    def __and__(self, other):
+        return self._combine(other, _and, False, False)
+
+    def __or__(self, other):
+        return self._combine(other, _or, True, True)
+
+    def __sub__(self, other):
+        return self._combine(other, _subtract, True, False)
+
+    def add(self, row):
+        """Add a row to the bitmap."""
+        high, offset = row >> _CHUNK_BITS, row & _LOW_BITS
+        chunk = self._chunks.get(high)
+        if chunk is None:
+            self._chunks[high] = array.array('H', [offset])
+        elif isinstance(chunk, int):
+            self._chunks[high] = chunk | (1 << offset)
+        else:
+            position = bisect.bisect_left(chunk, offset)
+            if position == len(chunk) or chunk[position] != offset:
+                chunk.insert(position, offset)
+                if len(chunk) > _MAX_ARRAY:
+                    self._chunks[high] = _to_bits(chunk)
+
+    def discard(self, row):
+        """Remove a row from the bitmap, if it's there."""
+        high, offset = row >> _CHUNK_BITS, row & _LOW_BITS
+        chunk = self._chunks.get(high)
+        if chunk is None:
+            return
+        if isinstance(chunk, int):
+            chunk = _container(chunk & ~(1 << offset))
+        else:
+            position = bisect.bisect_left(chunk, offset)
+            if position < len(chunk) and chunk[position] == offset:
+                del chunk[position]
+            chunk = chunk or None
+        if chunk is None:
+            del self._chunks[high]
+        else:
+            self._chunks[high] = chunk
+
+    def __repr__(self):
+        dense = sum(isinstance(chunk, int) for chunk in self._chunks.values())
+        return f"{self.__class__.__name__}(rows={len(self)}, chunks={len(self._chunks)}, dense={dense})"
+
+
+def flag_for(condition):
+    """Find the flag whose bitmap holds every approach row that satisfies a column condition.
+
+    :param condition: A `(column, op, value)` condition (see `NEODatabase._conditions`).
+    :return: A tuple of the flag (one of `FLAGS`) and whether its bitmap holds
+             exactly the rows that satisfy the condition - rather than a
+             superset of them, which must still be checked - or None if no
+             flag narrows the condition down.
+    """
+    column, op, value = condition
+    if column == 'hazardous' and op is operator.eq and value in (True, False):
+        return ('hazardous' if value else 'not hazardous'), True
+    if column == 'diameter' and op in RANGE_OPS:
+        # A range never holds an unknown (NaN) diameter.
+        return 'diameter known', False
+    return None
+
+
+class FlagBitmaps:
+    """The `Bitmap`s of the approach rows with each of the `FLAGS`.
+
+    The bitmaps read the NEO-level columns through the approach store's `neo`
+    column, so after a row is added, or its NEO (or that NEO's hazardous flag
+    or diameter) changes, the row must be passed to `update`.
+    """
+    def __init__(self, neo, neo_hazardous, neo_diameter):
+        """Create the `FlagBitmaps` of an approach store.
+
+        :param neo: The store's `array('q')` of NEO ids (or `NO_NEO`), one per row.
+        :param neo_hazardous: The `array('b')` of each NEO's hazardous flag.
+        :param neo_diameter: The `array('d')` of each NEO's diameter (NaN if unknown).
+        """
+        self._neo = neo
+        self._neo_hazardous = neo_hazardous
+        self._neo_diameter = neo_diameter
+        if numpy is not None:
+            self.bitmaps = self._build_numpy()
+        else:
+            rows = {flag: [] for flag in FLAGS}
+            for row in range(len(neo)):
+                for flag in self.flags(row):
+                    rows[flag].append(row)
+            self.bitmaps = {flag: Bitmap(rows[flag]) for flag in FLAGS}
+
+    def _build_numpy(self):
+        """Build the bitmaps from vectorized masks of the flags."""
+        neo = numpy.frombuffer(self._neo, dtype=numpy.int64)
+        linked = neo != NO_NEO
+        hazardous = numpy.zeros(len(neo), dtype=bool)
+        known = numpy.zeros(len(neo), dtype=bool)
+        if len(self._neo_hazardous):
+            ids = numpy.where(linked, neo, 0)
+            hazardous = numpy.frombuffer(self._neo_hazardous, dtype=numpy.int8)[ids] != 0
+            diameter = numpy.frombuffer(self._neo_diameter, dtype=numpy.float64)[ids]
+            known = diameter == diameter
+        return {'hazardous': Bitmap.from_mask(linked & hazardous),
+                'not hazardous': Bitmap.from_mask(linked & ~hazardous),
+                'diameter known': Bitmap.from_mask(linked & known),
+                'diameter unknown': Bitmap.from_mask(~(linked & known))}
+
+    def flags(self, row):
+        """Name the flags of an approach row, from its NEO as it is now."""
+        neo = self._neo[row]
+        if neo == NO_NEO:
+            return ('diameter unknown',)
+        diameter = self._neo_diameter[neo]
+        return ('hazardous' if self._neo_hazardous[neo] else 'not hazardous',
+                'diameter known' if diameter == diameter else 'diameter unknown')
+
+    def __getitem__(self, flag):
+        """Return the `Bitmap` of the rows with a flag."""
+        return self.bitmaps[flag]
+
+    def intersection(self, flags):
+        """Return the `Bitmap` of the rows with every one of some flags."""
+        return functools.reduce(operator.and_, (self.bitmaps[flag] for flag in flags))
+
+    def update(self, row):
+        """Move a row (new, or whose NEO changed) into the bitmaps of its current flags."""
+        flags = self.flags(row)
+        for flag, bitmap in self.bitmaps.items():
+            if flag in flags:
+                bitmap.add(row)
+            else:
+                bitmap.discard(row)
+
+    def __repr__(self):
+        counts = ', '.join(f"{flag!r}: {len(bitmap)}" for flag, bitmap in self.bitmaps.items())
+        return f"{self.__class__.__name__}({{{counts}}})"
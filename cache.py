@@ -0,0 +1,160 @@
+"""Cache the results of repeated queries in an interactive session.
+
+Analysts tend to run the same `query` over and over, changing only how many
+results are shown or where they're saved. A `QueryCache` remembers the rows of
+the approach store that matched each recent collection of filters (see
+`NEODatabase.query_rows`), so a repeated query skips straight to building its
+results. It keeps only row indices, never formatted output, so a cached entry
+serves any `--outfile`, and any `--limit` up to the one it was found with.
+
+A query that only wants the first few results stops looking once it has found
+that many, just as it would without a cache, and the cache remembers those
+first rows along with the limit: they serve a repeat of the query with the
+same limit or a smaller one. Finding every match of a query stops as soon as
+they would take up more than the cache's memory cap, and then isn't cached.
+
+The cache is bounded by the memory its rows take up, and evicts the least
+recently used entries first. It belongs to one `NEODatabase` at a time: asking
+it about a different database (after a reload, say), or about one that has
+changed since (see `NEODatabase.version`), empties it first.
+"""
+import array
+import collections
+import itertools
+import sys
+
+
+# The default memory cap of a `QueryCache`, in bytes.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def filter_key(filters):
+    """Normalize a collection of filters into a hashable cache key.
+
+    Filters are compared by class, comparator and reference value, and their
+    order doesn't matter - the same command-line options always produce the
+    same key.
+
+    :param filters: A collection of filters, such as from `filters.create_filters`.
+    :return: A hashable key, or None if the filters can't be compared this way.
+    """
+    try:
+        return frozenset((type(flt), flt.op, flt.value) for flt in filters)
+    except (AttributeError, TypeError):
+        return None
+
+
+class QueryCache:
+    """A least-recently-used cache of query results, as rows of an `NEODatabase`.
+
+    The `hits`, `misses` and `evictions` attributes count what the cache has
+    done since it was created.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """Create a new, empty `QueryCache`.
+
+        :param max_bytes: The most memory, in bytes, that the cached rows may take up.
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._database = None
+        self._version = None
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        """Return the number of cached queries."""
+        return len(self._entries)
+
+    def get(self, database, filters, limit=None):
+        """Look up the cached rows of the close approaches that match a collection of filters.
+
+        :param database: The `NEODatabase` to query.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param limit: The number of rows wanted, or None (or 0) for all of them.
+        :return: An `array('q')` of matching row indices, in internal order -
+                 every match, or at least the first `limit` of them - or None
+                 if the filters weren't queried recently with a large enough limit.
+        """
+        if database is not self._database or database.version != self._version:
+            self.clear()
+            self._database = database
+            self._version = database.version
+
+        key = filter_key(filters)
+        rows, found_limit = self._entries.get(key, (None, None))
+        # An entry found with a limit only holds the first rows.
+        if rows is None or (found_limit is not None and not (limit and limit <= found_limit)):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return rows
+
+    def rows(self, database, filters, limit=None, plan=None):
+        """Find the rows of the close approaches that match a collection of filters.
+
+        The rows come from the cache if the same filters were queried recently
+        (with the same limit or a larger one), and otherwise from
+        `database.query_rows`. Given a `limit`, only that many are then looked
+        for, and cached along with the limit - or as every match, if fewer
+        matched. Without one, the rows are collected until they would take up
+        more than `max_bytes`, and past that passed on as they are found,
+        without being cached.
+
+        :param database: The `NEODatabase` to query.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param limit: The number of rows wanted, or None (or 0) for all of them.
+        :param plan: The `planner.Plan` to find the rows with, if already made (see `NEODatabase.query_rows`).
+        :return: An `array('q')` (or, for a result too large to cache, an
+                 iterable) of matching row indices, in internal order - every
+                 match, or at least the first `limit` of them.
+        """
+        rows = self.get(database, filters, limit)
+        if rows is not None:
+            return rows
+
+        found = iter(database.query_rows(filters, limit=limit, plan=plan))
+        most = self.max_bytes // array.array('q').itemsize
+        rows = array.array('q', itertools.islice(found, most + 1))
+        if len(rows) > most:
+            return itertools.chain(rows, found)
+        key = filter_key(filters)
+        if key is not None:
+            self._put(key, rows, limit if limit and len(rows) >= limit else None)
+        return rows
+
+    def _put(self, key, rows, limit=None):
+        """Cache the rows for a key, evicting the least recently used entries to make room.
+
+        :param limit: The limit the rows were found with, or None if they are every match.
+        """
+        size = sys.getsizeof(rows)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            # Replace the first rows of a query with more of them.
+            replaced, _limit = self._entries.pop(key)
+            self.bytes -= sys.getsizeof(replaced)
+        while self._entries and self.bytes + size > self.max_bytes:
+            _key, (evicted, _limit) = self._entries.popitem(last=False)
+            self.bytes -= sys.getsizeof(evicted)
+            self.evictions += 1
+        self._entries[key] = (rows, limit)
+        self.bytes += size
+
+    def clear(self):
+        """Forget every cached query (but not the hit and miss counts)."""
+        self._entries.clear()
+        self.bytes = 0
+
+    def __str__(self):
+        return (f"{len(self)} cached queries using {self.bytes / 1024:.1f} KiB "
+                f"of {self.max_bytes / 1024:.0f} KiB; "
+                f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions")
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(entries={len(self)}, bytes={self.bytes}, "
+                f"hits={self.hits}, misses={self.misses}, evictions={self.evictions})")
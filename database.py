@@ -7,10 +7,106 @@ user-specified criteria.
 
 Under normal circumstances, the main module creates one NEODatabase from the
 data on NEOs and close approaches extracted by `extract.load_neos` and
-`extract.load_approaches`.
+`extract.load_approach_records`.
+
+Close approaches are kept column by column in a `store.ApproachStore`, and
+`CloseApproach` objects are only built (once per row) when one is handed out -
+as a query result, or through an NEO's `.approaches`.
 
 You'll edit this file in Tasks 2 and 3.
 """
+import array
+import collections
+import collections.abc
+import concurrent.futures
+import heapq
+import itertools
+import math
+import multiprocessing
+import operator
+import sys
+import weakref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from aggregate import summarize
+from bitmaps import Bitmap, FlagBitmaps, flag_for
+from filters import compile_comparison, compile_filters, compile_predicate
+from helpers import datetime_to_minutes, minutes_to_datetime
+from indexes import RANGE_OPS, DayIndex, KDTree, SortedIndex, day_span, range_bounds
+from models import CloseApproach
+from names import NameIndex, TrigramIndex
+from planner import ColumnStats, narrowest_index, plan_order, plan_query
+from store import ApproachStore, NO_TIME, NO_NEO
+
+
+# How many close approach records are resolved to NEO ids at a time.
+_INGEST_BATCH_SIZE = 1 << 14
+
+# The number of rows that can always be linked to NEOs before they're regrouped.
+_MAX_EXTRA_ROWS = 1 << 12
+
+# The smallest approach store that is worth scanning in worker processes.
+_MIN_PARALLEL_ROWS = 1 << 18
+
+# The smallest shard of rows that one worker process scans at a time.
+_MIN_SHARD_ROWS = 1 << 16
+
+# How many shards each worker process gets, so a `limit` can stop a scan early.
+_SHARDS_PER_WORKER = 4
+
+# Worker processes share the columns copy-on-write, which needs `fork` (and Python 3.7+ to ask for it).
+if sys.version_info >= (3, 7) and 'fork' in multiprocessing.get_all_start_methods():
+    _FORK = multiprocessing.get_context('fork')
+else:
+    _FORK = None
+
+# The database that a forked worker process scans (see `NEODatabase._scan_parallel`).
+_forked_database = None
+
+
+class ApproachList(collections.abc.Sequence):
+    """A read-only sequence of the close approaches of one NEO.
+
+    The approaches of each NEO occupy one contiguous range of the database's
+    `_neo_order` (the rows of the store grouped by NEO id), followed by any
+    rows added to the NEO since then, so the list holds only the database and
+    the NEO's id; the `CloseApproach` objects themselves are built as they are
+    accessed.
+    """
+    __slots__ = ('_database', '_neo')
+
+    def __init__(self, database, neo):
+        """Create a new `ApproachList` over the approaches of one NEO in an `NEODatabase`.
+
+        :param database: The `NEODatabase` that owns the rows.
+        :param neo: The integer id (row) of the NEO in the database.
+        """
+        self._database = database
+        self._neo = neo
+
+    def __len__(self):
+        """Return the number of close approaches."""
+        return self._database._neo_approach_count(self._neo)
+
+    def __getitem__(self, index):
+        """Return the close approach at `index`, or a list of them for a slice."""
+        database = self._database
+        rows = database._neo_approach_rows(self._neo)
+        if isinstance(index, slice):
+            return [database._approach(row) for row in rows[index]]
+        return database._approach(rows[index])
+
+    def __iter__(self):
+        """Iterate over the close approaches, in internal order."""
+        return map(self._database._approach, self._database._neo_approach_rows(self._neo))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self)!r})"
+
 
 class NEODatabase:
     """A database of near-Earth objects and their close approaches.
@@ -19,8 +115,52 @@ class NEODatabase:
     approaches. It additionally maintains a few auxiliary data structures to
     help fetch NEOs by primary designation or by name and to help speed up
     querying for close approaches that match criteria.
+
+    The `engine` attribute selects how `query` evaluates filters over the
+    stored columns: 'numpy' (the default, whenever NumPy is installed) builds
+    vectorized boolean masks, while 'python' tests one row at a time.
+
+    The `indexed_columns` attribute names the approach columns that get a
+    sorted index. Each index costs 16 bytes per approach (none for a column
+    that is already sorted, as time usually is), so it can be narrowed to
+    save memory at the cost of scanning for filters on the other columns.
+
+    The `box_columns` attribute names the approach columns of a `KDTree`,
+    which answers filters on two or more of them at once - a date range, a
+    distance range and a velocity range, say - without scanning every row
+    that one column's range leaves. It takes 8 bytes per approach, and is
+    only built for the first query that can use it.
+
+    Likewise, the first query with a hazardous or diameter filter builds the
+    compressed `bitmaps.FlagBitmaps` of which approaches belong to hazardous
+    NEOs, and which to NEOs of known diameter - at most about a bit per
+    approach for each flag - so that those filters are answered by
+    intersecting bitmaps rather than by checking every row. Setting the
+    `flag_bitmaps` attribute to False checks them row by row instead.
+
+    The first query for a single day (a `--date`) buckets the approaches by
+    calendar day in an `indexes.DayIndex`, so that a date's approaches are one
+    dictionary lookup away. When time isn't one of the `indexed_columns`, so
+    does the first query for a month, a year or any other span of whole days.
+    Setting the `day_buckets` attribute to False leaves them to the time index
+    (or a scan) instead.
+
+    NEOs and close approaches can be added to (or corrected in) an existing
+    database with `add_neos`, `add_approaches` and `add_approach_records`;
+    each call bumps the `version` attribute.
+
+    The `workers` attribute is the number of processes that a full scan of a
+    large approach store is split over (see `_scan_parallel`); with the
+    default of 1, every query runs in this process.
     """
-    def __init__(self, neos, approaches):
+    engine = 'numpy'
+    indexed_columns = ('time', 'distance', 'velocity')
+    box_columns = ('time', 'distance', 'velocity')
+    flag_bitmaps = True
+    day_buckets = True
+    workers = 1
+
+    def __init__(self, neos, approaches=()):
         """Create a new `NEODatabase`.
 
         As a precondition, this constructor assumes that the collections of NEOs
@@ -35,31 +175,474 @@ class NEODatabase:
         a collection of that NEO's close approaches, and the `.neo` attribute of
         each close approach references the appropriate NEO.
 
+        The close approaches may also be supplied as a one-shot iterator (such
+        as `extract.iter_approaches`), in which case each approach is linked as
+        soon as it has been parsed. To skip building `CloseApproach` objects
+        altogether, use `from_records` or `from_store` instead.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :param approaches: A collection (or stream) of `CloseApproach`es.
+        """
+        self._init_neos(neos)
+
+    #ELABORATE : Linking close approach with their corresponding NEO's if their designation is the same
+        views = []
+        def records():
+            for cad in approaches:
+                views.append(cad)
+                minutes = NO_TIME if cad.time is None else datetime_to_minutes(cad.time)
+                yield cad._designation, minutes, cad.distance, cad.velocity
+        self._ingest(records())
+
+        neos = self._neos
+        for row, (cad, neo_row) in enumerate(zip(views, self._store.neo)):
+            if neo_row != NO_NEO:
+                cad.neo = neos[neo_row]
+            self._views[row] = cad
+        self._link()
+
+    def _init_neos(self, neos):
+        """Set up the NEOs, and an empty approach store, of a new `NEODatabase`.
+
         :param neos: A collection of `NearEarthObject`s.
-        :param approaches: A collection of `CloseApproach`es.
         """
         #ELABORATE
         #:param NEO_des: Dictionary of all "designations" as keys & their corresponding "neos" as values to map neos with their corresponding designations(additional data structure to facilitate NEO-Close approach linking)
-        #:param NEO_names: Dictionary of all "neo names" as keys & their corresponding "neos" as values to map neos with their corresponding names(additional data structure to facilitate NEO-Close approach linking)
-        self._neos = neos
-        self._approaches = approaches
+        self._neos = list(neos)
+        self.version = 0
         self.NEO_des = dict((neo.designation,neo) for neo in self._neos)
-        self.NEO_names = dict((neo.name,neo) for neo in self._neos)
-        
-    ###ELABORATE:(Refer EXTENSIONS.md)- GOOD TO HAVE BUT NOT MANDATORY : If you want to print all NEOs having the same name, follow/enable below code to build the self.NEO_names; else keep it disabled###
-            #  self.NEO_names = dict()
-             # for neo in self._neos:
-               #    if neo.name not in self.NEO_names:
-                #       self.NEO_names[neo.name]=list()
-                 #  self.NEO_names[neo.name].append(neo)
-    ###ELABORATE:(Refer EXTENSIONS.md)- GOOD TO HAVE BUT NOT MANDATORY : If you want to print all NEOs having the same name, follow/enable above code to build the self.NEO_names; else keep it disabled### 
-     
-    #ELABORATE : Linking close approach with their corresponding NEO's if their designation is the same
-        for cad in self._approaches:
-            if cad._designation in self.NEO_des.keys():
-                cad.neo=self.NEO_des[cad._designation]
-                self.NEO_des[cad._designation].approaches.append(cad)
-        
+        #ELABORATE : every NEO sharing a name is kept (see EXTENSIONS.md); the case-folded, sorted `names.NameIndex`es over names and designations are built on first use (see `_name_index`)
+        self._names = None
+        self._designations = None
+        #ELABORATE : the `names.TrigramIndex` over names and designations for fuzzy searches, also built on first use (see `_trigram_index`)
+        self._trigrams = None
+
+        #ELABORATE : NEO-level columns (indexed by NEO row) that approach-level filters reach through the `neo` column of the store
+        self._neo_rows = {neo.designation: row for row, neo in enumerate(self._neos)}
+        self._neo_diameter = array.array('d', (neo.diameter for neo in self._neos))
+        self._neo_hazardous = array.array('b', (neo.hazardous for neo in self._neos))
+        #ELABORATE : the hazardous NEOs, and the NEOs in order of diameter, for answering NEO-level filters NEO-first
+        self._neo_indexes = {'diameter': SortedIndex(self._neo_diameter),
+                             'hazardous': SortedIndex(self._neo_hazardous)}
+
+        self._store = ApproachStore()
+        #ELABORATE : the `CloseApproach` of each row that is still in use somewhere, by row (see `_approach`)
+        self._views = weakref.WeakValueDictionary()
+        for row, neo in enumerate(self._neos):
+            neo.approaches = ApproachList(self, row)
+
+    @classmethod
+    def from_records(cls, neos, records):
+        """Create a new `NEODatabase` from compact close approach records.
+
+        No `CloseApproach` objects are created up front - see
+        `extract.load_approach_records` for the format of the records.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :param records: An iterable of (designation, minutes, distance, velocity) tuples.
+        :return: A linked `NEODatabase`.
+        """
+        database = cls.__new__(cls)
+        database._init_neos(neos)
+        database._ingest(records)
+        database._link()
+        return database
+
+    @classmethod
+    def from_store(cls, neos, store):
+        """Create a new `NEODatabase` around an already-linked `ApproachStore`.
+
+        :param neos: A collection of `NearEarthObject`s, in the order the store's `neo` column refers to.
+        :param store: An `ApproachStore` of close approaches.
+        :return: A linked `NEODatabase`.
+        """
+        database = cls.__new__(cls)
+        database._init_neos(neos)
+        database._store = store
+        database._link()
+        return database
+
+    def _ingest(self, records):
+        """Add close approach records to the store, resolving their designations to NEO ids.
+
+        Records are taken in batches, and the designations of a whole batch
+        are joined against the NEOs' designations in one pass of
+        `dict.get`, rather than one lookup and one append per approach.
+
+        :param records: An iterable of (designation, minutes, distance, velocity) tuples.
+        """
+        records = iter(records)
+        lookup = self._neo_rows.get
+        while True:
+            batch = list(itertools.islice(records, _INGEST_BATCH_SIZE))
+            if not batch:
+                break
+            designations, minutes, distances, velocities = zip(*batch)
+            neos = list(map(lookup, designations, itertools.repeat(NO_NEO, len(batch))))
+            self._store.extend(minutes, distances, velocities, neos, designations)
+
+    def _link(self):
+        """Group the store's rows by NEO id, then (re)build the secondary indexes.
+
+        After linking, the rows of the NEO with id `k` are
+        `_neo_order[_neo_offsets[k]:_neo_offsets[k + 1]]`, in internal order.
+        """
+        self._group()
+        self._build_indexes()
+        self._collect_stats()
+
+    def _group(self):
+        """Group the store's rows by NEO id (see `_group_by_neo`)."""
+        self._neo_order, self._neo_offsets = _group_by_neo(self._store.neo, len(self._neos))
+        # Rows linked to an NEO since the last grouping, by NEO id, in internal order.
+        self._neo_extra = {}
+        self._extra_rows = 0
+        # Rows without an NEO, by designation - only built once it's needed.
+        self._orphans_by_designation = None
+
+    def _neo_approach_rows(self, neo):
+        """Return the rows of an NEO's close approaches, in internal order."""
+        offsets = self._neo_offsets
+        rows = self._neo_order[offsets[neo]:offsets[neo + 1]]
+        extra = self._neo_extra.get(neo)
+        if extra:
+            rows.extend(extra)
+        return rows
+
+    def _neo_approach_count(self, neo):
+        """Return the number of an NEO's close approaches."""
+        offsets = self._neo_offsets
+        return offsets[neo + 1] - offsets[neo] + len(self._neo_extra.get(neo, ()))
+
+    def _orphan_rows(self):
+        """Return a dictionary mapping each designation without an NEO to its rows."""
+        if self._orphans_by_designation is None:
+            self._orphans_by_designation = {}
+            for row, designation in sorted(self._store.orphans.items()):
+                self._orphans_by_designation.setdefault(designation, []).append(row)
+        return self._orphans_by_designation
+
+    def _link_extra(self, neo, row):
+        """Record that a row was linked to an NEO since the last grouping."""
+        self._neo_extra.setdefault(neo, []).append(row)
+        self._extra_rows += 1
+
+    def _build_indexes(self):
+        """(Re)build the secondary indexes over the approach store.
+
+        Each column named in `indexed_columns` gets a `SortedIndex` - a sorted
+        permutation of the rows by that column - which turns a range filter on
+        it into a bisection-bounded slice of rows. Its sorted arrays are only
+        built by the first query that looks the column up.
+        """
+        store = self._store
+        self._indexes = {column: SortedIndex(getattr(store, column)) for column in self.indexed_columns}
+        # The `KDTree` over `box_columns` is built on first use (see `_box_index`).
+        self._box = None
+        # So are the `FlagBitmaps` (see `_flag_bitmaps`), and the `DayIndex` (see `_day_index`).
+        self._flags = None
+        self._days = None
+
+    def _box_index(self, conditions):
+        """Return the `KDTree` over `box_columns`, if it can answer some conditions, building it on first use.
+
+        :param conditions: A list of column conditions (see `_conditions`).
+        :return: A `KDTree`, or None if the conditions bound fewer than two of its columns.
+        """
+        if len({column for column, _op, _value in conditions if column in self.box_columns}) < 2:
+            return None
+        if self._box is None:
+            store = self._store
+            self._box = KDTree({column: getattr(store, column) for column in self.box_columns})
+        return self._box
+
+    def _flag_bitmaps(self, conditions):
+        """Return the `FlagBitmaps` of the approach store, if they can narrow down some conditions.
+
+        They are built on first use.
+
+        :param conditions: A list of column conditions (see `_conditions`).
+        :return: A `FlagBitmaps`, or None if no condition is on a flag (see `bitmaps.flag_for`).
+        """
+        if not self.flag_bitmaps or not any(flag_for(condition) for condition in conditions):
+            return None
+        if self._flags is None:
+            self._flags = FlagBitmaps(self._store.neo, self._neo_hazardous, self._neo_diameter)
+        return self._flags
+
+    def _day_index(self, conditions):
+        """Return the `DayIndex` of the time column, if the conditions cover whole days, building it on first use.
+
+        A span of several days is bisected from the time index just as well,
+        so only a single day builds the buckets while time is indexed.
+
+        :param conditions: A list of column conditions (see `_conditions`).
+        :return: A `DayIndex`, or None if the time conditions don't span whole days (see `indexes.day_span`).
+        """
+        used = [condition for condition in conditions if condition[0] == 'time' and condition[1] in RANGE_OPS]
+        span = day_span(*range_bounds(used)) if self.day_buckets and used else None
+        if span is None:
+            return None
+        if self._days is None:
+            if 'time' in self._indexes and span[0] != span[1]:
+                return None
+            self._days = DayIndex(self._store.time)
+        return self._days
+
+    def _collect_stats(self):
+        """Summarize each column for the query planner (see `planner.ColumnStats`).
+
+        A column whose index is already built is summarized from the index's
+        sorted keys; otherwise its values are sorted with NumPy, if it is
+        installed, so that collecting statistics doesn't build the indexes.
+        The NEO columns are weighted by each NEO's number of approaches, so
+        that every statistic estimates a fraction of approach rows.
+        """
+        store = self._store
+        total = len(store)
+        self._stats = {}
+        for column in ('time', 'distance', 'velocity'):
+            values = getattr(store, column)
+            integer = values.typecode == 'q'
+            index = self._indexes.get(column)
+            if index is not None and index.built:
+                self._stats[column] = ColumnStats(index.keys, total, integer=integer)
+            elif numpy is not None:
+                self._stats[column] = ColumnStats(_numpy_sorted(values), total, integer=integer)
+            elif index is not None:
+                self._stats[column] = ColumnStats(index.keys, total, integer=integer)
+            else:
+                self._stats[column] = ColumnStats.from_values(values, integer=integer)
+        offsets = self._neo_offsets
+        counts = [stop - start for start, stop in zip(offsets, offsets[1:])]
+        self._stats['diameter'] = ColumnStats.from_values(self._neo_diameter, counts, total=total)
+        self._stats['hazardous'] = ColumnStats.from_values(self._neo_hazardous, counts, total=total,
+                                                           integer=True)
+
+    def _approach(self, row):
+        """Return the `CloseApproach` at a row of the store, building it if none is in use.
+
+        Only weak references to the `CloseApproach`es are kept, so a row's
+        object lives only as long as something else holds on to it; while it
+        does, the row always returns that same object.
+        """
+        approach = self._views.get(row)
+        if approach is None:
+            store = self._store
+            neo_row = store.neo[row]
+            neo = self._neos[neo_row] if neo_row != NO_NEO else None
+            minutes = store.time[row]
+            approach = CloseApproach(
+                time=None if minutes == NO_TIME else minutes_to_datetime(minutes),
+                designation=store.orphans[row] if neo is None else neo.designation,
+                distance=store.distance[row], v_rel=store.velocity[row])
+            approach.neo = neo
+            self._views[row] = approach
+        return approach
+
+    def add_neos(self, neos):
+        """Add NEOs to the database, or correct NEOs that it already has.
+
+        An NEO whose designation is already known updates the name, diameter
+        and hazardous flag of the existing NEO, which keeps its identity and
+        its close approaches. A new NEO is linked to any stored close
+        approaches with its designation. Every index is updated in place, so
+        the cost is proportional to the number of NEOs added, not to the size
+        of the database.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :return: A tuple of the numbers of NEOs added and corrected.
+        """
+        added = corrected = 0
+        for neo in neos:
+            row = self._neo_rows.get(neo.designation)
+            if row is None:
+                self._add_neo(neo)
+                added += 1
+            else:
+                self._correct_neo(row, neo)
+                corrected += 1
+        self._maybe_regroup()
+        self.version += 1
+        return added, corrected
+
+    def _add_neo(self, neo):
+        """Add a new NEO, adopting any stored close approaches with its designation."""
+        row = len(self._neos)
+        self._neos.append(neo)
+        self.NEO_des[neo.designation] = neo
+        if self._names is not None:
+            self._names.add(neo.name, row)
+        if self._designations is not None:
+            self._designations.add(neo.designation, row)
+        if self._trigrams is not None:
+            self._trigrams.add(neo.name, row)
+            self._trigrams.add(neo.designation, row)
+        self._neo_rows[neo.designation] = row
+        self._neo_diameter.append(neo.diameter)
+        self._neo_hazardous.append(neo.hazardous)
+        for index in self._neo_indexes.values():
+            index.add(row)
+        self._neo_offsets.append(self._neo_offsets[-1])
+        neo.approaches = ApproachList(self, row)
+
+        store = self._store
+        for approach_row in self._orphan_rows().pop(neo.designation, ()):
+            store.neo[approach_row] = row
+            del store.orphans[approach_row]
+            self._link_extra(row, approach_row)
+            view = self._views.get(approach_row)
+            if view is not None:
+                view.neo = neo
+            if self._flags is not None:
+                self._flags.update(approach_row)
+            for column, value in (('diameter', neo.diameter), ('hazardous', neo.hazardous)):
+                self._stats[column].discard(math.nan)
+                self._stats[column].add(value)
+
+    def _correct_neo(self, row, neo):
+        """Update the attributes of an existing NEO from a corrected record."""
+        existing = self._neos[row]
+        if existing.name != neo.name:
+            if self._names is not None:
+                self._names.discard(existing.name, row)
+                self._names.add(neo.name, row)
+            if self._trigrams is not None:
+                self._trigrams.discard(existing.name, row)
+                self._trigrams.add(neo.name, row)
+            existing.name = neo.name
+        weight = self._neo_approach_count(row)
+        changed = False
+        for column, values, value in (('diameter', self._neo_diameter, neo.diameter),
+                                      ('hazardous', self._neo_hazardous, neo.hazardous)):
+            old = values[row]
+            if old == value or (old != old and value != value):
+                continue
+            values[row] = value
+            setattr(existing, column, value)
+            self._neo_indexes[column].update(row, old)
+            self._stats[column].discard(old, weight)
+            self._stats[column].add(value, weight)
+            changed = True
+        if changed and self._flags is not None:
+            for approach_row in self._neo_approach_rows(row):
+                self._flags.update(approach_row)
+
+    def add_approaches(self, approaches):
+        """Add close approaches to the database, or correct ones that it already has.
+
+        A close approach with the same designation and time as one already in
+        the database is a correction: it updates the distance and velocity of
+        the stored approach (and of its `CloseApproach`, if one was handed out)
+        and is not itself linked. Every other close approach is added and
+        linked to its NEO, just as the constructor would. Every index is
+        updated in place, so the cost is proportional to the number of close
+        approaches added, not to the size of the database.
+
+        :param approaches: A collection of `CloseApproach`es.
+        :return: A tuple of the numbers of close approaches added and corrected.
+        """
+        added = corrected = 0
+        for cad in approaches:
+            minutes = NO_TIME if cad.time is None else datetime_to_minutes(cad.time)
+            row, is_new = self._put_approach(cad._designation, minutes, cad.distance, cad.velocity)
+            if is_new:
+                self._views[row] = cad
+                neo_row = self._store.neo[row]
+                cad.neo = self._neos[neo_row] if neo_row != NO_NEO else None
+                added += 1
+            else:
+                corrected += 1
+        self._maybe_regroup()
+        self.version += 1
+        return added, corrected
+
+    def add_approach_records(self, records):
+        """Add compact close approach records to the database, or correct ones it already has.
+
+        This is `add_approaches` for records in the format of
+        `extract.load_approach_records`.
+
+        :param records: An iterable of (designation, minutes, distance, velocity) tuples.
+        :return: A tuple of the numbers of close approaches added and corrected.
+        """
+        added = corrected = 0
+        for designation, minutes, distance, velocity in records:
+            _row, is_new = self._put_approach(designation, minutes, distance, velocity)
+            if is_new:
+                added += 1
+            else:
+                corrected += 1
+        self._maybe_regroup()
+        self.version += 1
+        return added, corrected
+
+    def _find_approach(self, designation, minutes):
+        """Find the row of the stored close approach with a designation and time, if any."""
+        neo = self._neo_rows.get(designation)
+        rows = self._orphan_rows().get(designation, ()) if neo is None else self._neo_approach_rows(neo)
+        time = self._store.time
+        for row in rows:
+            if time[row] == minutes:
+                return row
+        return None
+
+    def _put_approach(self, designation, minutes, distance, velocity):
+        """Add a close approach, or correct the stored one with the same designation and time.
+
+        :return: A tuple of the approach's row, and whether it was added.
+        """
+        row = self._find_approach(designation, minutes)
+        if row is not None:
+            self._correct_approach(row, distance, velocity)
+            return row, False
+
+        store = self._store
+        neo = self._neo_rows.get(designation, NO_NEO)
+        orphans = self._orphan_rows()
+        row = store.append(minutes, distance, velocity, neo, designation)
+        if neo == NO_NEO:
+            orphans.setdefault(designation, []).append(row)
+            neo_values = (math.nan, math.nan)
+        else:
+            self._link_extra(neo, row)
+            neo_values = (self._neo_diameter[neo], self._neo_hazardous[neo])
+        for index in self._indexes.values():
+            index.add(row)
+        if self._box is not None:
+            self._box.add(row)
+        if self._flags is not None:
+            self._flags.update(row)
+        if self._days is not None:
+            self._days.add(row)
+        for column, value in zip(('time', 'distance', 'velocity', 'diameter', 'hazardous'),
+                                 (minutes, distance, velocity) + neo_values):
+            self._stats[column].add(value)
+        return row, True
+
+    def _correct_approach(self, row, distance, velocity):
+        """Update the distance and velocity of a stored close approach."""
+        store = self._store
+        view = self._views.get(row)
+        for column, value in (('distance', distance), ('velocity', velocity)):
+            values = getattr(store, column)
+            old = values[row]
+            if old == value or (old != old and value != value):
+                continue
+            values[row] = value
+            if column in self._indexes:
+                self._indexes[column].update(row, old)
+            if self._box is not None and column in self._box.names:
+                self._box.update(row)
+            self._stats[column].discard(old)
+            self._stats[column].add(value)
+            if view is not None:
+                setattr(view, column, value)
+
+    def _maybe_regroup(self):
+        """Regroup the rows by NEO once enough have been linked since the last grouping."""
+        if self._extra_rows > max(_MAX_EXTRA_ROWS, len(self._store) // 8):
+            self._group()
 
     def get_neo_by_designation(self, designation):
         """Find and return an NEO by its primary designation.
@@ -88,20 +671,321 @@ class NEODatabase:
         Not every NEO in the data set has a name. No NEOs are associated with
         the empty string nor with the `None` singleton.
 
-        The matching is exact - check for spelling and capitalization if no
-        match is found.
+        The matching ignores case, but an NEO whose name matches exactly is
+        preferred. If several NEOs share the name, the first one loaded is
+        returned - use `get_neos_by_name` to find all of them.
 
         :param name: The name, as a string, of the NEO to search for.
         :return: The `NearEarthObject` with the desired name, or `None`.
         """
-        #ELABORATE : if name argument passed by user belongs to the dictionary mapping of neo-name, return the corresponding NEO specific to that name, else return None
+        #ELABORATE : all NEOs having the name regardless of case (see EXTENSIONS.md); prefer the first one whose name matches exactly
+        neos = self.get_neos_by_name(name)
+        for neo in neos:
+            if neo.name == name:
+                return neo
+        return neos[0] if neos else None
+
+    def get_neos_by_name(self, name):
+        """Find and return every NEO with a name, regardless of case.
+
+        :param name: The name, as a string, of the NEOs to search for.
+        :return: A list of the `NearEarthObject`s with the name, in the order they were loaded.
+        """
+        return [self._neos[row] for row in self._name_index('name').get(name)]
+
+    def complete_names(self, prefix, limit=None):
+        """List the distinct names of NEOs that start with a prefix, regardless of case.
+
+        :param prefix: The start of the names.
+        :param limit: The most NEOs to look at, or None for all of them.
+        :return: A list of names, in order of their case-folded form.
+        """
+        return self._complete('name', prefix, limit)
+
+    def complete_designations(self, prefix, limit=None):
+        """List the primary designations of NEOs that start with a prefix, regardless of case.
+
+        :param prefix: The start of the designations.
+        :param limit: The most designations to list, or None for all of them.
+        :return: A list of designations, in order of their case-folded form.
+        """
+        return self._complete('designation', prefix, limit)
+
+    def _complete(self, attribute, prefix, limit):
+        """List the distinct values of an NEO attribute that start with a prefix."""
+        values = [getattr(self._neos[row], attribute) for row in self._name_index(attribute).prefix(prefix, limit)]
+        return list(dict.fromkeys(values))
+
+    def _name_index(self, attribute):
+        """Return the `NameIndex` over the names (or designations) of the NEOs, building it on first use.
+
+        :param attribute: Either 'name' or 'designation'.
+        """
+        if attribute == 'name':
+            if self._names is None:
+                self._names = NameIndex([neo.name for neo in self._neos])
+            return self._names
+        if self._designations is None:
+            self._designations = NameIndex([neo.designation for neo in self._neos])
+        return self._designations
+
+    def search_neos(self, text, limit=10):
+        """Find the NEOs whose name or primary designation is most similar to a text.
+
+        This finds NEOs despite typos, where `get_neo_by_name` would find nothing.
+        Similarity is measured by the three-character sequences (trigrams) the
+        text shares with a name or designation, regardless of case.
+
+        :param text: The text to search for, such as a misspelled name.
+        :param limit: The most NEOs to find.
+        :return: A list of `(NearEarthObject, score)` pairs, best first, where
+                 the score runs from 0 (nothing in common) to 1 (the same text).
+        """
+        return [(self._neos[row], score) for row, score in self._trigram_index().search(text, limit)]
+
+    def _trigram_index(self):
+        """Return the `TrigramIndex` over the names and designations of the NEOs, building it on first use."""
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex(
+                (text, row) for row, neo in enumerate(self._neos) for text in (neo.name, neo.designation))
+        return self._trigrams
+
+    def _conditions(self, flt):
+        """Translate a filter into conditions on the stored columns.
+
+        Each condition is a tuple `(column, op, value)`, satisfied by a row
+        when `column[row] OP value`. The columns are 'time', 'distance' and
+        'velocity' of the approach store, and 'diameter' and 'hazardous' of
+        the row's NEO.
+
+        :param flt: A filter from `filters.create_filters`.
+        :return: A list of conditions, or None if the filter can't be evaluated
+                 over the columns.
+        """
+        column, op, value = getattr(flt, 'column', None), getattr(flt, 'op', None), getattr(flt, 'value', None)
+        if column == 'date':
+            # A date covers a whole day's worth of minutes.
+            first = value.toordinal() * 1440
+            last = first + 1439
+            bounds = {
+                operator.eq: [(operator.ge, first), (operator.le, last)],
+                operator.ge: [(operator.ge, first)],
+                operator.gt: [(operator.gt, last)],
+                operator.le: [(operator.ge, 0), (operator.le, last)],
+                operator.lt: [(operator.ge, 0), (operator.lt, first)],
+            }.get(op)
+            if bounds is None:
+                return None
+            return [('time', bound_op, bound) for bound_op, bound in bounds]
+        if column in ('distance', 'velocity', 'diameter', 'hazardous'):
+            return [(column, op, value)]
+        return None
+
+    def _split_filters(self, filters):
+        """Split filters into column conditions and residual filters.
+
+        :return: A tuple of a list of conditions (see `_conditions`) and a list
+                 of the filters that must be called on each `CloseApproach`.
+        """
+        conditions = []
+        residual = []
+        for flt in filters:
+            translated = self._conditions(flt)
+            if translated is None:
+                residual.append(flt)
+            else:
+                conditions.extend(translated)
+        return conditions, residual
+
+    def _compile_conditions(self, conditions):
+        """Compile column conditions into one predicate on a row index.
 
-        if(name in self.NEO_names.keys()):
-            return self.NEO_names[name]           
+        The predicate reads the stored columns directly - for example
+        `distance[row] <= 0.1 and velocity[row] >= 20` - and stops at the first
+        condition that fails.
+
+        :param conditions: A list of column conditions (see `_conditions`).
+        :return: A 1-argument predicate on a row index.
+        """
+        store = self._store
+        namespace = {
+            'time': store.time, 'distance': store.distance, 'velocity': store.velocity, 'neo': store.neo,
+            'neo_diameter': self._neo_diameter, 'neo_hazardous': self._neo_hazardous,
+        }
+        terms = []
+        for column, op, value in conditions:
+            if column in ('diameter', 'hazardous'):
+                # Rows without an NEO never pass.
+                comparison = compile_comparison(f'neo_{column}[neo[row]]', op, value, namespace)
+                terms.append(f'(neo[row] != {NO_NEO} and {comparison})')
+            else:
+                terms.append(compile_comparison(f'{column}[row]', op, value, namespace))
+        return compile_predicate('row', terms, namespace)
+
+    def _scan(self, conditions, rows=None):
+        """Generate the rows that satisfy all of the conditions, one at a time.
+
+        :param conditions: A list of column conditions (see `_conditions`).
+        :param rows: The candidate rows, in internal order, or None for all rows.
+        """
+        return filter(self._compile_conditions(conditions),
+                      range(len(self._store)) if rows is None else rows)
+
+    def _scan_numpy(self, conditions, rows=None):
+        """Find the rows that satisfy all of the conditions with vectorized NumPy masks.
+
+        The columns are wrapped (not copied) as NumPy arrays only for the
+        duration of this call, so the store stays free to grow afterwards.
+
+        :param conditions: A list of column conditions (see `_conditions`).
+        :param rows: The candidate rows, in internal order, or None for all rows.
+        :return: A list of the matching rows, in internal order.
+        """
+        store = self._store
+        if rows is None:
+            def gather(values):
+                return values
+        elif isinstance(rows, range) and rows.step == 1:
+            shard = slice(rows.start, rows.stop)
+
+            def gather(values):
+                return values[shard]
         else:
-            return None
-        
-    def query(self, filters=()):
+            rows = numpy.asarray(rows, dtype=numpy.int64)
+
+            def gather(values):
+                return values[rows]
+        neo = gather(_numpy_column(store.neo))
+        linked = neo != NO_NEO
+        mask = numpy.ones(len(neo), dtype=bool)
+        for column, op, value in conditions:
+            if column == 'diameter':
+                values = _numpy_by_neo(self._neo_diameter, neo, linked)
+                # Rows without an NEO never pass.
+                mask &= linked & op(values, value)
+            elif column == 'hazardous':
+                values = _numpy_by_neo(self._neo_hazardous, neo, linked)
+                mask &= linked & op(values, value)
+            else:
+                mask &= op(gather(_numpy_column(getattr(store, column))), value)
+        matches = numpy.flatnonzero(mask)
+        if rows is None:
+            return matches.tolist()
+        if isinstance(rows, range):
+            return (matches + rows.start).tolist()
+        return rows[matches].tolist()
+
+    def _scan_parallel(self, conditions):
+        """Generate the rows that satisfy all of the conditions, scanning shards of them in worker processes.
+
+        The rows are cut into consecutive shards, a few per worker. The workers
+        are forked from this process, so they read its columns copy-on-write -
+        the columns are a handful of flat arrays, so nothing is pickled or
+        copied but the conditions on the way in and the matching rows (as
+        `array('q')` bytes) on the way out.
+
+        Only a couple of shards per worker are in flight at a time, and their
+        results are generated shard by shard, in order. So a consumer that
+        stops early (such as for a `limit`) stops the scan after the shards in
+        flight, once this generator is closed. If a worker process dies, the
+        scan raises `concurrent.futures.process.BrokenProcessPool` rather than
+        waiting for it forever.
+
+        :param conditions: A list of column conditions (see `_conditions`).
+        :return: A generator of the matching rows, in internal order.
+        """
+        count = len(self._store)
+        size = max(_MIN_SHARD_ROWS, -(-count // (self.workers * _SHARDS_PER_WORKER)))
+        shards = iter(range(0, count, size))
+
+        # A forked worker inherits `self` as is - the initializer's arguments aren't pickled.
+        executor = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=_FORK,
+                                                          initializer=_adopt_database, initargs=(self,))
+        in_flight = collections.deque()
+        try:
+            def submit(starts):
+                for start in starts:
+                    in_flight.append(executor.submit(_scan_shard, start, min(start + size, count), conditions))
+
+            submit(itertools.islice(shards, 2 * self.workers))
+            while in_flight:
+                found = in_flight.popleft().result()
+                submit(itertools.islice(shards, 1))
+                yield from array.array('q', found)
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown()
+
+    def _neo_candidates(self, conditions):
+        """Find the rows of the approaches of the NEOs that satisfy NEO-level conditions.
+
+        The qualifying NEOs come from the narrowest span of the sorted NEO
+        indexes (hazardous NEOs, or NEOs by diameter), and any other NEO
+        condition is only checked for those NEOs. Each NEO's approaches are a
+        contiguous, ascending run of rows, so the runs are gathered and then
+        sorted (cheaply - the sort merges the runs) back into internal order.
+
+        :param conditions: A list of conditions on the 'diameter' and 'hazardous' columns.
+        :return: A list of the candidate rows, in internal order.
+        """
+        found = narrowest_index(self._neo_indexes, conditions)
+        if found is None:
+            neos = range(len(self._neos))
+        else:
+            column, bounds, used, _count = found
+            neos = self._neo_indexes[column].rows_by_value(*bounds)
+            conditions = [condition for condition in conditions if condition not in used]
+        namespace = {'diameter': self._neo_diameter, 'hazardous': self._neo_hazardous}
+        test = compile_predicate('neo', [compile_comparison(f'{column}[neo]', op, value, namespace)
+                                         for column, op, value in conditions], namespace)
+        order, offsets, extra = self._neo_order, self._neo_offsets, self._neo_extra
+        rows = []
+        for neo in filter(test, neos):
+            rows.extend(order[offsets[neo]:offsets[neo + 1]])
+            if neo in extra:
+                rows.extend(extra[neo])
+        rows.sort()
+        return rows
+
+    def _plan(self, filters, sort_by=None, reverse=False, limit=None):
+        """Choose how to answer a query for a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param sort_by: The column to order the results by, or None for internal order.
+        :param reverse: Whether to put the largest values of `sort_by` first.
+        :param limit: The number of results wanted, or None (or 0) for all of them.
+        :return: A `planner.Plan`.
+        """
+        conditions, residual = self._split_filters(filters)
+        vectorized = self.engine != 'python' and numpy is not None
+        plan = plan_query(conditions, residual, self._stats, self._indexes,
+                          len(self._store), len(self._neos), vectorized, self._neo_indexes,
+                          self._box_index(conditions), self._flag_bitmaps(conditions), self._day_index(conditions))
+        if sort_by is not None:
+            self._sort_values(sort_by)  # Reject an unknown column before planning for it.
+            plan = plan_order(plan, conditions, sort_by, reverse, limit, self._stats, self._indexes)
+        if plan.access == 'scan' and not plan.flags and plan.checks and self.workers > 1 and _FORK is not None:
+            scanned = len(self._store)
+            if limit and sort_by is None and plan.matches:
+                # A scan in this process stops as soon as it has found enough rows.
+                scanned = min(scanned, limit * scanned / plan.matches)
+            if scanned >= _MIN_PARALLEL_ROWS:
+                plan.workers = self.workers
+        return plan
+
+    def explain(self, filters=(), sort_by=None, reverse=False, limit=None):
+        """Describe how `query` would answer a collection of filters, without running it.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param sort_by: The column to order the results by, or None for internal order.
+        :param reverse: Whether to put the largest values of `sort_by` first.
+        :param limit: The number of results wanted, or None (or 0) for all of them.
+        :return: The chosen `planner.Plan`; its `str` is a human-readable description.
+        """
+        return self._plan(filters, sort_by, reverse, limit)
+
+    def query(self, filters=(), sort_by=None, reverse=False, limit=None):
         """Query close approaches to generate those that match a collection of filters.
 
         This generates a stream of `CloseApproach` objects that match all of the
@@ -112,17 +996,316 @@ class NEODatabase:
         The `CloseApproach` objects are generated in internal order, which isn't
         guaranteed to be sorted meaninfully, although is often sorted by time.
 
+        A `planner.Plan` picks how to find the candidate rows - a full scan,
+        bisecting a sorted index of one column (see `indexed_columns`),
+        gathering the approaches of the NEOs that pass the diameter and
+        hazardous filters, searching a k-d tree for the rows within the
+        ranges on several columns (see `box_columns`), or looking up the days
+        of the date filters in the day buckets (see `day_buckets`) - and whether to
+        intersect them with the bitmaps of the hazardous and diameter flags,
+        from estimates of how many rows each filter matches; `explain` shows
+        the chosen plan. The remaining filters are checked over the candidate
+        rows only, most selective first. Filters
+        that name a `column` are evaluated directly over the stored columns -
+        row by row, or all at once as NumPy boolean masks if NumPy is installed
+        (see `engine`) - and a `CloseApproach` is only built for a matching
+        row. Any other filter is called on the `CloseApproach` of each row that
+        passes the column conditions. A full scan of a large store is split
+        over worker processes if `workers` is more than 1.
+
+        Given `sort_by`, the results come in order of that column instead (see
+        `sort_rows`). Only the first `limit` of them are then ever held at
+        once: either the matches are run through a bounded heap, or - if the
+        column is indexed and matches are common enough - the index is walked
+        in order until `limit` rows match.
+
         :param filters: A collection of filters capturing user-specified criteria.
+        :param sort_by: One of 'time', 'distance', 'velocity' or 'diameter', or None for internal order.
+        :param reverse: Whether to put the largest values of `sort_by` first.
+        :param limit: The most results to generate, or None (or 0) for all of them.
         :return: A stream of matching `CloseApproach` objects.
         """
-        
-        for approach in self._approaches:
-            output=[f(approach) for f in filters]   #ELABORATE:output consists of a list of closed approaches which are filtered by the :param filters
-            if(len(output) > 1): #ELABORATE:if output is a collection of more than 1 filter functions , then return approach only if it matches/satisfies all the filter functions 
-                if(all(output)): 
-                    yield approach
-            elif(len(output)==1): #ELABORATE:if output contains only one filter function, then return approach if it matches/satisfies this filter function 
-                if(output[0]):
-                    yield approach
-            else:   #ELABORATE:if output is empty or doesnt match any filter criteria, then return all closed approaches by default 
-                yield approach
+        yield from self.fetch(self.query_rows(filters, sort_by, reverse, limit))
+
+    def query_rows(self, filters=(), sort_by=None, reverse=False, limit=None, plan=None):
+        """Query close approaches for the rows of those that match a collection of filters.
+
+        This is `query`, but it produces the matching rows of the approach store
+        instead of `CloseApproach` objects - see `fetch`.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param sort_by: The column to order the results by, or None for internal order.
+        :param reverse: Whether to put the largest values of `sort_by` first.
+        :param limit: The most rows to produce, or None (or 0) for all of them.
+        :param plan: The `planner.Plan` for the filters, if `explain` already made it, or None to make one.
+        :return: An iterable of matching row indices, in internal order unless `sort_by` is given.
+        """
+        if plan is None:
+            plan = self._plan(filters, sort_by, reverse, limit)
+        if plan.access == 'walk':
+            return self._walk(plan)
+        rows = self._plan_rows(plan)
+        if sort_by is not None:
+            return self.sort_rows(rows, sort_by, reverse, limit)
+        return itertools.islice(rows, limit) if limit else rows
+
+    def count(self, filters=()):
+        """Count the close approaches that match a collection of filters.
+
+        When the chosen plan leaves nothing to check - no filters, or only
+        filters that one index (and the flag bitmaps) answer - the count comes
+        straight from the index, or from the sizes of the bitmaps' chunks,
+        without visiting the rows at all.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: The number of matching close approaches.
+        """
+        plan = self._plan(filters)
+        if not plan.checks and not plan.filters:
+            if plan.flags:
+                bitmap = self._flags.intersection(flag for flag, _fraction in plan.flags)
+                if plan.access == 'scan':
+                    return len(bitmap)
+                if plan.access in ('index', 'day'):
+                    rows = self._access_rows(plan)
+                    if isinstance(rows, range):
+                        return len(bitmap & Bitmap.from_range(rows.start, rows.stop))
+            elif plan.access == 'scan':
+                return len(self._store)
+            elif plan.access == 'index':
+                return self._indexes[plan.column].count(*plan.bounds)
+            elif plan.access == 'day':
+                return self._days.count(*plan.bounds)
+        rows = self._plan_rows(plan)
+        if isinstance(rows, collections.abc.Sized):
+            return len(rows)
+        return sum(1 for _row in rows)
+
+    def aggregate(self, filters=(), column=None, group_by=None, bins=0):
+        """Summarize the close approaches that match a collection of filters.
+
+        The matching rows are found as in `query_rows`, and then grouped and
+        summarized straight from the stored columns by `aggregate.summarize`,
+        without building any `CloseApproach`.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param column: One of 'distance', 'velocity' or 'diameter', or None to only count.
+        :param group_by: One of 'year', 'month', 'hazardous' or 'neo', or None for one group.
+        :param bins: The number of histogram bins, or 0 for no histogram.
+        :return: A dictionary mapping group keys to `aggregate.Summary`s (see `aggregate.summarize`).
+        """
+        return summarize(self, self.query_rows(filters), column, group_by, bins)
+
+    def _access_rows(self, plan):
+        """Find the rows produced by the access path of a plan, in internal order, or None for a full scan."""
+        if plan.access == 'index':
+            return self._indexes[plan.column].rows(*plan.bounds)
+        if plan.access == 'neo':
+            return self._neo_candidates(plan.used)
+        if plan.access == 'box':
+            return self._box.rows(plan.bounds)
+        if plan.access == 'day':
+            return self._days.rows(*plan.bounds)
+        return None
+
+    def _plan_rows(self, plan):
+        """Find the rows that match the conditions and filters of a plan, in internal order."""
+        rows = self._access_rows(plan)
+        if plan.flags:
+            rows = self._flag_rows([flag for flag, _fraction in plan.flags], rows)
+
+        conditions, residual = plan.conditions, plan.filters
+        if not conditions:
+            rows = range(len(self._store)) if rows is None else rows
+        elif plan.workers > 1:
+            rows = self._scan_parallel(conditions)
+        elif self.engine != 'python' and numpy is not None:
+            rows = self._scan_numpy(conditions, rows)
+        else:
+            rows = self._scan(conditions, rows)
+
+        if not residual:
+            return rows
+        predicate = compile_filters(residual)
+        return (row for row in rows if predicate(self._approach(row)))
+
+    def _flag_rows(self, flags, rows=None):
+        """Intersect candidate rows with the bitmaps of some flags (see `bitmaps.FlagBitmaps`).
+
+        :param flags: A list of flags, from `bitmaps.FLAGS`.
+        :param rows: The candidate rows, in internal order, or None for all rows.
+        :return: A list of the candidate rows with every flag, in internal order.
+        """
+        bitmap = self._flags.intersection(flags)
+        return bitmap.rows() if rows is None else bitmap.select(rows)
+
+    def _walk(self, plan):
+        """Find the first rows, in order, that match an ordered walk plan (see `planner.plan_order`).
+
+        :return: A list of at most `limit` rows, ordered as in `sort_rows`.
+        """
+        column, reverse, limit = plan.order
+        lower, lower_inclusive, upper, upper_inclusive = plan.bounds
+        if column == 'time' and (lower is None or lower < 0):
+            # Approaches without a time are indexed as `NO_TIME`, but come last.
+            lower, lower_inclusive = 0, True
+        index = self._indexes[column]
+        rows = index.walk(lower, lower_inclusive, upper, upper_inclusive, reverse)
+        found = list(itertools.islice(self._check(plan, rows), limit))
+        if len(found) < limit and not plan.used:
+            # The rows with an unknown value come last; the index knows which they are.
+            unknown = index.rows(NO_TIME, True, NO_TIME, True) if column == 'time' else index.unknown_rows()
+            found.extend(itertools.islice(self._check(plan, unknown), limit - len(found)))
+        return found
+
+    def _check(self, plan, rows):
+        """Check the remaining conditions and filters of a plan over some rows, one at a time."""
+        if plan.checks:
+            rows = filter(self._compile_conditions(plan.conditions), rows)
+        if plan.filters:
+            predicate = compile_filters(plan.filters)
+            rows = (row for row in rows if predicate(self._approach(row)))
+        return rows
+
+    def _sort_values(self, column):
+        """Make a function from a row to its value of a column to sort by; unknown values are NaN."""
+        store = self._store
+        if column == 'time':
+            time = store.time
+
+            def value(row):
+                minutes = time[row]
+                return math.nan if minutes == NO_TIME else minutes
+        elif column == 'diameter':
+            neo, diameter = store.neo, self._neo_diameter
+
+            def value(row):
+                neo_row = neo[row]
+                return math.nan if neo_row == NO_NEO else diameter[neo_row]
+        elif column in ('distance', 'velocity'):
+            value = getattr(store, column).__getitem__
+        else:
+            raise ValueError(f"Can't sort close approaches by {column!r}.")
+        return value
+
+    def sort_rows(self, rows, column, reverse=False, limit=None):
+        """Put rows of the approach store in order of a column.
+
+        Equal values keep their internal order, and rows whose value is unknown
+        (an approach without a time, or whose NEO has no known diameter) come
+        last, in internal order, whichever the direction.
+
+        With a `limit`, only the first `limit` rows are selected, with a heap of
+        at most `limit` rows: that takes O(n log k) time and O(k) memory for `n`
+        rows and a limit of `k`.
+
+        :param rows: An iterable of row indices, in internal order.
+        :param column: One of 'time', 'distance', 'velocity' or 'diameter'.
+        :param reverse: Whether to put the largest values first.
+        :param limit: The number of rows to keep, or None (or 0) for all of them.
+        :return: A list of row indices.
+        """
+        values = self._sort_values(column)
+        unknown = []
+
+        def known():
+            for row in rows:
+                value = values(row)
+                if value == value:
+                    yield value, row
+                elif not limit or len(unknown) < limit:
+                    unknown.append(row)
+
+        value = operator.itemgetter(0)
+        if limit:
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            pairs = select(limit, known(), key=value)
+        else:
+            pairs = sorted(known(), key=value, reverse=reverse)
+        ordered = [row for _value, row in pairs]
+        ordered.extend(unknown[:limit - len(ordered)] if limit else unknown)
+        return ordered
+
+    def fetch(self, rows):
+        """Generate the `CloseApproach` at each of some rows of the approach store.
+
+        :param rows: An iterable of row indices, such as from `query_rows`.
+        :return: A stream of `CloseApproach` objects.
+        """
+        return map(self._approach, rows)
+
+
+def _group_by_neo(neo_column, count):
+    """Stably sort the rows of a `neo` column by NEO id.
+
+    With NumPy this is a vectorized stable argsort; otherwise it is a counting
+    sort, since the ids are dense integers in `range(count)`. Rows without an
+    NEO are left out.
+
+    :param neo_column: An `array('q')` of NEO ids, or `NO_NEO`.
+    :param count: The number of NEOs.
+    :return: A tuple `(order, offsets)` of `array('q')`s, where the rows of NEO
+             `k` are `order[offsets[k]:offsets[k + 1]]`.
+    """
+    if numpy is not None:
+        ids = _numpy_column(neo_column)
+        order = numpy.argsort(ids, kind='stable')
+        offsets = numpy.searchsorted(ids[order], numpy.arange(count + 1))
+        first = offsets[0]
+        return (array.array('q', order[first:].astype(numpy.int64).tobytes()),
+                array.array('q', (offsets - first).astype(numpy.int64).tobytes()))
+
+    counts = [0] * (count + 1)
+    for neo in neo_column:
+        counts[neo + 1] += 1
+    counts[0] = 0  # Rows without an NEO (id -1) don't get a range.
+    offsets = array.array('q', itertools.accumulate(counts))
+    order = array.array('q', bytes(8 * offsets[-1]))
+    positions = offsets.tolist()
+    for row, neo in enumerate(neo_column):
+        if neo != NO_NEO:
+            order[positions[neo]] = row
+            positions[neo] += 1
+    return order, offsets
+
+
+def _adopt_database(database):
+    """Remember the database to scan (in a newly forked worker process)."""
+    global _forked_database
+    _forked_database = database
+
+
+def _scan_shard(start, stop, conditions):
+    """Scan one shard of the rows of the forked database (in a worker process).
+
+    :return: The matching rows, as the bytes of an `array('q')`.
+    """
+    database = _forked_database
+    rows = range(start, stop)
+    if database.engine != 'python' and numpy is not None:
+        found = database._scan_numpy(conditions, rows)
+    else:
+        found = database._scan(conditions, rows)
+    return array.array('q', found).tobytes()
+
+
+def _numpy_column(column):
+    """Wrap an `array.array` column as a NumPy array, without copying it."""
+    return numpy.frombuffer(column, dtype=column.typecode)
+
+
+def _numpy_sorted(column):
+    """Sort the values of an `array.array` column that aren't NaN, with NumPy, into a list."""
+    values = _numpy_column(column)
+    return numpy.sort(values[values == values]).tolist()
+
+
+def _numpy_by_neo(neo_column, neo, linked):
+    """Spread an NEO-level column out over approach rows, as a NumPy array.
+
+    Rows without an NEO get the value of NEO row 0 (or 0 if there are no
+    NEOs), so the caller must mask them out with `linked`.
+    """
+    if not len(neo_column):
+        return numpy.zeros(len(neo))
+    return _numpy_column(neo_column)[numpy.where(linked, neo, 0)]
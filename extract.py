@@ -2,55 +2,475 @@
 
 The `load_neos` function extracts NEO data from a CSV file, formatted as
 described in the project instructions, into a collection of `NearEarthObject`s.
+Only the handful of columns it needs are taken out of each of the 75-column
+rows; `iter_neo_rows` exposes the same projection for any other columns (such
+as `H`, `albedo` or `moid`).
 
 The `load_approaches` function extracts close approach data from a JSON file,
 formatted as described in the project instructions, into a collection of
-`CloseApproach` objects.
+`CloseApproach` objects. Given `jobs > 1`, both functions split the file into
+chunks and parse them in a pool of worker processes. The `iter_approaches` generator does the same, but
+streams the `data` rows out of the file one at a time, so that a consumer (such
+as the `NEODatabase` constructor) can start working before parsing is finished
+and the full JSON document never has to sit in memory.
+
+The `load_approach_records` function reads the same data as compact tuples
+instead of objects, which an `NEODatabase` stores column by column.
 
 The main module calls these functions with the arguments provided at the command
-line, and uses the resulting collections to build an `NEODatabase`.
+line, and uses the results to build an `NEODatabase`.
 
 You'll edit this file in Task 2.
 """
+import concurrent.futures
 import csv
+import io
+import itertools
 import json
+import operator
+import re
 
+from helpers import cd_to_datetime, datetime_to_minutes, minutes_to_datetime
 from models import NearEarthObject, CloseApproach
+from store import NO_TIME
+
+
+# Number of characters read from the close approach file per buffer refill.
+_CHUNK_SIZE = 1 << 16
+
+# How far from the end of the close approach file to look for a trailing `fields` header.
+_TAIL_PROBE_SIZE = 1 << 16
+
+# The columns of each data file that are needed to build the models.
+_NEO_COLUMNS = ('pdes', 'name', 'diameter', 'pha')
+_CAD_COLUMNS = ('des', 'cd', 'dist', 'v_rel')
+
+# Parallel loading splits each data file into about this many chunks per worker,
+# so that one slow chunk doesn't hold up the rest, but never into chunks smaller
+# than the minimum size.
+_CHUNKS_PER_JOB = 4
+_MIN_PARALLEL_CHUNK = 1 << 20
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_FIELDS_HEADER = re.compile(r'"fields"\s*:\s*(\[[^\]]*\])')
+
+
+def _neo_header_indices(neo_csv_path, header, columns):
+    """Find the index of each requested column in the header of a CSV file of NEOs."""
+    try:
+        return [header.index(column) for column in columns]
+    except ValueError as err:
+        raise ValueError(f"{neo_csv_path} is missing a requested column: {err}") from None
+
+
+def _project_csv_lines(lines, indices):
+    """Pick the fields at `indices` out of each record in an iterator of CSV lines.
 
+    A line without quotes is only split as far as the last requested column;
+    the rest of it is never tokenized. Lines with quoted fields go through the
+    `csv` module as usual (pulling more lines from `lines` if a quoted field
+    spans several).
+    """
+    project = operator.itemgetter(*indices)
+    splits = max(indices) + 1
+    for line in lines:
+        if '"' in line:
+            # A quoted field may hold a comma or even span several lines.
+            row = next(csv.reader(itertools.chain((line,), lines)))
+        else:
+            row = line.rstrip('\r\n').split(',', splits)
+        if not row or row == ['']:
+            continue
+        values = project(row)
+        yield values if len(indices) > 1 else (values,)
+
+
+def iter_neo_rows(neo_csv_path, columns):
+    """Stream selected columns of the rows of a CSV file of near-Earth objects.
 
-def load_neos(neo_csv_path):
+    The index of each requested column is looked up in the header once, and
+    only those fields are picked out of each row - no per-row dictionary is
+    built, and columns after the last requested one aren't even split apart.
+
+    :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+    :param columns: The names of the columns to extract from each row, in order.
+    :yield: A tuple of the requested (string) field values for each row, in file order.
+    """
+    with open(neo_csv_path, newline='') as infile:
+        header = next(csv.reader(infile), None)
+        if header is None:
+            return
+        indices = _neo_header_indices(neo_csv_path, header, columns)
+        yield from _project_csv_lines(infile, indices)
+
+
+def load_neos(neo_csv_path, jobs=1):
     """Read near-Earth object information from a CSV file.
 
     :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+    :param jobs: The number of worker processes to parse the file with.
     :return: A collection of `NearEarthObject`s.
     """
-    
-    neo_list=[]
-    with open(neo_csv_path) as infile:
-        read_neo=csv.DictReader(infile)
-        for row_neo in read_neo:
-            neo_list.append(NearEarthObject(designation=row_neo['pdes'],name=row_neo['name'],diameter=row_neo['diameter'],hazardous=row_neo['pha']))
-    return neo_list  #ELABORATE: list of NEO objects
+    if jobs > 1:
+        rows = _load_neo_rows_parallel(neo_csv_path, _NEO_COLUMNS, jobs)
+    else:
+        rows = iter_neo_rows(neo_csv_path, _NEO_COLUMNS)
+    return [NearEarthObject(designation=pdes, name=name, diameter=diameter, hazardous=pha)
+            for pdes, name, diameter, pha in rows]
+
+
+class _JSONStream:
+    """A buffered reader that decodes a JSON document one value at a time.
+
+    Only a small window of the underlying text file is held in memory at once.
+    Callers walk the structure of the document with `peek` and `expect`, and
+    decode complete values (such as a single row of close approach data) with
+    `value`.
+    """
+    def __init__(self, infile, chunk_size=_CHUNK_SIZE):
+        """Create a new `_JSONStream` over an open text file.
+
+        :param infile: A file-like object opened in text mode.
+        :param chunk_size: The number of characters to read per buffer refill.
+        """
+        self._infile = infile
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Read another chunk into the buffer, dropping everything already consumed.
+
+        :return: Whether any more text was read.
+        """
+        if self._eof:
+            return False
+        chunk = self._infile.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or '' at the end of the file."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be `char`."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed JSON: expected {char!r} but found {found!r}.")
+        self._pos += 1
+
+    def value(self):
+        """Decode and return the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # The value may just be cut off by the end of the buffer.
+                if self._fill():
+                    continue
+                raise
+            # A number at the very end of the buffer may continue in the next chunk.
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def array_items(self):
+        """Generate the items of the JSON array that starts at the next character."""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ']':
+                self._pos += 1
+                return
+            self.expect(',')
+
+
+def _probe_trailing_fields(cad_json_path):
+    """Look for the `fields` header near the end of a close approach file.
+
+    NASA's API emits `fields` before `data`, but a re-serialized file (for
+    example, one written with sorted keys) may put it afterwards. Rather than
+    hold every row until the header shows up, peek at the tail of the file.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :return: The list of field names, or None if it couldn't be found.
+    """
+    with open(cad_json_path, 'rb') as infile:
+        infile.seek(0, 2)
+        infile.seek(max(0, infile.tell() - _TAIL_PROBE_SIZE))
+        tail = infile.read().decode('utf-8', errors='ignore')
+    matches = _FIELDS_HEADER.findall(tail)
+    if not matches:
+        return None
+    return json.loads(matches[-1])
+
+
+def iter_cad_rows(cad_json_path, columns, chunk_size=_CHUNK_SIZE):
+    """Stream selected columns of the `data` rows of a close approach file.
+
+    The file is walked incrementally: the top-level keys other than `data` are
+    decoded whole (they are small), while the `data` array is decoded one row
+    at a time, so peak memory doesn't depend on the number of rows.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param columns: The names of the fields to extract from each row, in order.
+    :param chunk_size: The number of characters to read per buffer refill.
+    :yield: A tuple of the requested field values for each row, in file order.
+    """
+    with open(cad_json_path) as infile:
+        stream = _JSONStream(infile, chunk_size)
+        fields = None
+        pending = None
+        stream.expect('{')
+        while stream.peek() != '}':
+            key = stream.value()
+            stream.expect(':')
+            if key == 'fields':
+                fields = stream.value()
+            elif key == 'data':
+                if fields is None:
+                    fields = _probe_trailing_fields(cad_json_path)
+                if fields is None:
+                    # No header in sight - fall back to holding the rows until it arrives.
+                    pending = list(stream.array_items())
+                else:
+                    indices = [fields.index(column) for column in columns]
+                    for row in stream.array_items():
+                        yield tuple([row[i] for i in indices])
+            else:
+                stream.value()
+            if stream.peek() == ',':
+                stream.expect(',')
+        stream.expect('}')
+
+    if fields is None:
+        raise ValueError(f"{cad_json_path} has no `fields` header.")
+    if pending:
+        indices = [fields.index(column) for column in columns]
+        for row in pending:
+            yield tuple([row[i] for i in indices])
+
+
+def iter_approaches(cad_json_path, chunk_size=_CHUNK_SIZE):
+    """Stream close approaches out of a JSON file, one at a time.
 
+    This is the generator counterpart of `load_approaches`: each
+    `CloseApproach` is built as soon as its row has been read, so the
+    `NEODatabase` constructor can link approaches while parsing continues.
 
-def load_approaches(cad_json_path):
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param chunk_size: The number of characters to read per buffer refill.
+    :yield: `CloseApproach`es, in file order.
+    """
+    for des, cd, dist, v_rel in iter_cad_rows(cad_json_path, _CAD_COLUMNS, chunk_size):
+        yield CloseApproach(cd=cd, designation=des, distance=dist, v_rel=v_rel)
+
+
+def load_approaches(cad_json_path, jobs=1):
     """Read close approach data from a JSON file.
 
-    :param neo_csv_path: A path to a JSON file containing data about close approaches.
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param jobs: The number of worker processes to parse the file with.
     :return: A collection of `CloseApproach`es.
     """
-    
-    closeapproach_list=[]
-    with open(cad_json_path) as infile:
-        #ELABORATE: 
-        #Get the indices of all necessary parameters such as : cd (date & time) , dist (approach distance), des (NEO's designation), v_rel (NEO's relative approach velocity)
-        #so that they can be used later to extract the information corresponding to these parameters for every NEO-list element in the JSON dictionary's "data" key
-        #(ca_load is a JSON dictionary that contains a key - "data" & a key - "fields" where the former is paired to a value that is a list of lists where every list holds information corresponding to the parameters/elements of another list which is represented as the value of the key "fields" 
-        ca_load=json.load(infile)
-        icd=ca_load['fields'].index('cd')
-        idist=ca_load['fields'].index('dist')
-        ides=ca_load['fields'].index('des')
-        ivrel=ca_load['fields'].index('v_rel')
-        for data in ca_load['data']:
-            closeapproach_list.append(CloseApproach(cd=data[icd],designation=data[ides],distance=data[idist],v_rel=data[ivrel]))
-    return closeapproach_list  #ELABORATE: list of Close Approach objects
+    if jobs > 1:
+        records = _load_cad_records_parallel(cad_json_path, jobs)
+        if records is not None:
+            return [CloseApproach(time=None if minutes == NO_TIME else minutes_to_datetime(minutes),
+                                  designation=des, distance=dist, v_rel=v_rel)
+                    for des, minutes, dist, v_rel in records]
+    return list(iter_approaches(cad_json_path))
+
+
+def _approach_record(des, cd, dist, v_rel):
+    """Convert the fields of a row of close approach data into a compact record."""
+    minutes = datetime_to_minutes(cd_to_datetime(cd)) if cd else NO_TIME
+    return des, minutes, float(dist), float(v_rel)
+
+
+def load_approach_records(cad_json_path, jobs=1):
+    """Read close approach data from a JSON file as compact records, not objects.
+
+    Each record is a tuple of the NEO's designation, the approach time in
+    minutes (see `helpers.datetime_to_minutes`, or `store.NO_TIME`), the
+    distance and the velocity - exactly what an `NEODatabase` stores per row,
+    so it can be built with `NEODatabase.from_records` without creating a
+    `CloseApproach` for every row.
+
+    With `jobs=1`, the records are streamed as the file is parsed.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param jobs: The number of worker processes to parse the file with.
+    :return: An iterable of (designation, minutes, distance, velocity) tuples, in file order.
+    """
+    if jobs > 1:
+        records = _load_cad_records_parallel(cad_json_path, jobs)
+        if records is not None:
+            return records
+    return itertools.starmap(_approach_record, iter_cad_rows(cad_json_path, _CAD_COLUMNS))
+
+
+# Parallel loading.
+#
+# Each data file is cut into byte ranges that start exactly on a record
+# boundary: the start of a line of the CSV file, or the opening bracket of a
+# row in the `data` array of the JSON file. Worker processes parse one range
+# each into compact records of plain values, and the results are concatenated
+# in range order, so the final order is the same as for serial loading.
+#
+# This relies on the layout of NASA's exports: no CSV field spans several
+# lines, and no string in a close approach row contains a '['.
+
+def _split_points(start, end, jobs):
+    """Cut the byte range [start, end) into roughly equal pieces for `jobs` workers."""
+    count = max(1, min(jobs * _CHUNKS_PER_JOB, (end - start) // _MIN_PARALLEL_CHUNK))
+    step = (end - start) / count
+    return [start + int(step * i) for i in range(1, count)]
+
+
+def _align(infile, positions, marker, end):
+    """Move each byte position forward to just before the next `marker` byte.
+
+    :return: Sorted, de-duplicated positions, each of which is < `end`.
+    """
+    aligned = set()
+    for position in positions:
+        infile.seek(position)
+        while position < end:
+            block = infile.read(_CHUNK_SIZE)
+            if not block:
+                position = end
+                break
+            found = block.find(marker)
+            if found >= 0:
+                position += found
+                break
+            position += len(block)
+        if position < end:
+            aligned.add(position)
+    return sorted(aligned)
+
+
+def _map_chunks(worker, path, bounds, *extra):
+    """Run `worker` over consecutive byte ranges of a file in a process pool, in order."""
+    ranges = [(path, lo, hi) + extra for lo, hi in zip(bounds, bounds[1:])]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        return list(executor.map(worker, ranges))
+
+
+def _read_range(path, lo, hi):
+    """Read and decode the bytes [lo, hi) of a file."""
+    with open(path, 'rb') as infile:
+        infile.seek(lo)
+        return infile.read(hi - lo).decode('utf-8')
+
+
+def _parse_neo_chunk(args):
+    """Worker: parse the lines of one byte range of a CSV file of NEOs.
+
+    The lines are split just as `iter_neo_rows` splits them, reading with
+    `newline=''` - unlike `str.splitlines`, which also breaks lines at form
+    feeds, U+2028 and other separators that may turn up inside a name.
+    """
+    path, lo, hi, indices = args
+    lines = iter(io.StringIO(_read_range(path, lo, hi), newline=''))
+    return list(_project_csv_lines(lines, indices))
+
+
+def _load_neo_rows_parallel(neo_csv_path, columns, jobs):
+    """Project columns out of a CSV file of NEOs with a pool of worker processes."""
+    with open(neo_csv_path, 'rb') as infile:
+        header_line = infile.readline()
+        start = infile.tell()
+        end = infile.seek(0, 2)
+        # Each split point moves to just past the end of the line it lands in.
+        bounds = [position + 1 for position in
+                  _align(infile, _split_points(start, end, jobs), b'\n', end - 1)]
+    header = next(csv.reader([header_line.decode('utf-8')]), [])
+    indices = _neo_header_indices(neo_csv_path, header, columns)
+    if not bounds:
+        return iter_neo_rows(neo_csv_path, columns)
+
+    chunks = _map_chunks(_parse_neo_chunk, neo_csv_path, [start] + bounds + [end], indices)
+    return itertools.chain.from_iterable(chunks)
+
+
+def _parse_cad_chunk(args):
+    """Worker: parse the rows in one byte range of the `data` array of a close approach file.
+
+    The time of each approach is parsed here too, and returned as a count of
+    minutes so that the records stay small on their way back to the parent.
+    """
+    path, lo, hi, indices = args
+    text = _read_range(path, lo, hi).rstrip().rstrip(',')
+    project = operator.itemgetter(*indices)
+    return [_approach_record(*project(row)) for row in json.loads(f'[{text}]')]
+
+
+def _locate_cad_data(cad_json_path):
+    """Find the `fields` header and the byte range of the rows of the `data` array.
+
+    :return: A tuple of the field names, the offset of the first row, and the
+             offset of the closing bracket of the `data` array; or None if the
+             layout isn't recognized.
+    """
+    with open(cad_json_path, 'rb') as infile:
+        head = infile.read(_TAIL_PROBE_SIZE)
+        size = infile.seek(0, 2)
+        tail_start = max(0, size - _TAIL_PROBE_SIZE)
+        infile.seek(tail_start)
+        tail = infile.read()
+
+    data_key = re.search(rb'"data"\s*:\s*\[\s*', head)
+    if data_key is None:
+        return None
+    fields = _FIELDS_HEADER.findall(head.decode('utf-8', errors='ignore'))
+    if not fields:
+        fields = _FIELDS_HEADER.findall(tail.decode('utf-8', errors='ignore'))
+    if not fields:
+        return None
+    # The `data` array is the only array of arrays, so the last "]]" closes it.
+    closers = list(re.finditer(rb'\]\s*\]', tail))
+    if not closers:
+        return None
+    start = data_key.end()
+    end = tail_start + closers[-1].end() - 1
+    if end <= start:
+        return None
+    return json.loads(fields[-1]), start, end
+
+
+def _load_cad_records_parallel(cad_json_path, jobs):
+    """Parse a close approach file into compact records with a pool of worker processes.
+
+    :return: A list of (designation, minutes, distance, velocity) tuples in file
+             order, or None if the file's layout isn't suitable for splitting.
+    """
+    located = _locate_cad_data(cad_json_path)
+    if located is None:
+        return None
+    fields, start, end = located
+    indices = [fields.index(column) for column in _CAD_COLUMNS]
+    with open(cad_json_path, 'rb') as infile:
+        bounds = _align(infile, _split_points(start, end, jobs), b'[', end)
+    if not bounds:
+        return None
+    chunks = _map_chunks(_parse_cad_chunk, cad_json_path, [start] + bounds + [end], indices)
+    return list(itertools.chain.from_iterable(chunks))
@@ -11,6 +11,10 @@ from a comparator (from the `operator` module), a reference value, and a class
 method `get` that subclasses can override to fetch an attribute of interest from
 the supplied `CloseApproach`.
 
+The `compile_filters` function turns a collection of filters into a single
+predicate function, which reads each attribute straight off the `CloseApproach`
+and stops at the first filter that fails.
+
 The `limit` function simply limits the maximum number of values produced by an
 iterator.
 
@@ -37,7 +41,13 @@ class AttributeFilter:
 
     Concrete subclasses can override the `get` classmethod to provide custom
     behavior to fetch a desired attribute from the given `CloseApproach`.
+
+    Subclasses may also set `column` to the name of the attribute they compare
+    against, which lets the `NEODatabase` evaluate them directly over its
+    stored columns. Filters without a `column` are called on each approach.
     """
+    column = None
+
     def __init__(self, op, value):
         """Construct a new `AttributeFilter` from an binary predicate and a reference value.
 
@@ -72,7 +82,56 @@ class AttributeFilter:
         return f"{self.__class__.__name__}(op=operator.{self.op.__name__}, value={self.value})"
 
 
-    
+#ELABORATE:
+#Filter classes which are derivatives of Attribute Filters that return the attribute of interest
+#that is compared with the user defined value : DateFilter, VelocityFilter, DiameterFilter, HazardousFilter, DistanceFilter
+#Each one also names the `column` it reads, so that the database can evaluate it over its columns without building a `CloseApproach`
+
+class DateFilter(AttributeFilter):
+    """Derived from Attribute filter. Returns the date of a close approach in "date" format"""
+    column = 'date'
+
+    @classmethod
+    def get(cls, approach):
+        return approach.time.date()
+
+
+class VelocityFilter(AttributeFilter):
+    """Derived from Attribute filter. Returns the velocity of a close approach"""
+    column = 'velocity'
+
+    @classmethod
+    def get(cls, approach):
+        return approach.velocity
+
+
+class DiameterFilter(AttributeFilter):
+    """Derived from Attribute filter. Returns the diameter of a close approach"""
+    column = 'diameter'
+
+    @classmethod
+    def get(cls, approach):
+        return approach.neo.diameter
+
+
+class DistanceFilter(AttributeFilter):
+    """Derived from Attribute filter. Returns the distance of a close approach"""
+    column = 'distance'
+
+    @classmethod
+    def get(cls, approach):
+        return approach.distance
+
+
+class HazardousFilter(AttributeFilter):
+    """Derived from Attribute filter. Returns the hazardous status of a close approach"""
+    column = 'hazardous'
+
+    @classmethod
+    def get(cls, approach):
+        return approach.neo.hazardous
+
+
 def create_filters(date=None, start_date=None, end_date=None,
                    distance_min=None, distance_max=None,
                    velocity_min=None, velocity_max=None,
@@ -108,40 +167,6 @@ def create_filters(date=None, start_date=None, end_date=None,
     :return: A collection of filters for use with `query`.
     """
     
-    #ELABORATE: 
-    #New Filter classes are defined which are derivatives of Attribute Filters that returns the attribute of interest 
-    #that is compared with the user defined value : DateFilter, VelocityFilter, DiameterFilter, HazardousFilter, DistanceFilter 
-    
-    class DateFilter(AttributeFilter):
-        """Derived from Attribute filter. Returns the date of a close approach in "date" format"""
-        @classmethod
-        def get(cls,approach):
-           return approach.time.date()
-
-    class VelocityFilter(AttributeFilter):
-        """Derived from Attribute filter. Returns the velocity of a close approach"""
-        @classmethod
-        def get(cls,approach):
-           return approach.velocity
-    
-    class DiameterFilter(AttributeFilter):
-        """Derived from Attribute filter. Returns the diameter of a close approach"""
-        @classmethod
-        def get(cls,approach):
-            return approach.neo.diameter
-    
-    class DistanceFilter(AttributeFilter):
-        """Derived from Attribute filter. Returns the distance of a close approach"""
-        @classmethod
-        def get(cls,approach):
-            return approach.distance
-    
-    class HazardousFilter(AttributeFilter):
-        """Derived from Attribute filter. Returns the hazardous status of a close approach"""
-        @classmethod
-        def get(cls,approach):
-            return approach.neo.hazardous
-        
     #ELABORATE: 
     #Create a list (main_filter) of all necessary filter functions that should be returned as a tuple which represents a collection of filters to be used with 'query' 
     #Pass only those filter functions as a collection if & only if a user-defined criteria is specified as an argument with 'query'
@@ -172,6 +197,84 @@ def create_filters(date=None, start_date=None, end_date=None,
     return tuple(main_filter)
 
 
+# The comparators that can be compiled inline, as Python operators.
+_OPERATOR_SYMBOLS = {
+    operator.eq: '==', operator.ne: '!=',
+    operator.ge: '>=', operator.gt: '>',
+    operator.le: '<=', operator.lt: '<',
+}
+
+# How each filter class reads its attribute, as an expression on `approach`.
+_ACCESSORS = {
+    DateFilter: 'approach.time.date()',
+    VelocityFilter: 'approach.velocity',
+    DiameterFilter: 'approach.neo.diameter',
+    DistanceFilter: 'approach.distance',
+    HazardousFilter: 'approach.neo.hazardous',
+}
+
+
+def compile_comparison(operand, op, value, namespace):
+    """Write `operand OP value` as the source of a Python expression.
+
+    The reference value (and the comparator, if it has no operator symbol) is
+    bound to a fresh name in `namespace` rather than written into the source.
+
+    :param operand: The source of an expression for the left-hand side.
+    :param op: A 2-argument predicate comparator (such as `operator.le`).
+    :param value: The reference value to compare against.
+    :param namespace: The dictionary of names that the compiled code will run in.
+    :return: The source of the comparison.
+    """
+    name = f'_value{len(namespace)}'
+    namespace[name] = value
+    symbol = _OPERATOR_SYMBOLS.get(op)
+    if symbol is None:
+        op_name = f'_op{len(namespace)}'
+        namespace[op_name] = op
+        return f'{op_name}({operand}, {name})'
+    return f'({operand} {symbol} {name})'
+
+
+def compile_predicate(parameter, terms, namespace):
+    """Compile a conjunction of expressions into a 1-argument function.
+
+    :param parameter: The name of the function's argument, as used in `terms`.
+    :param terms: The sources of the expressions, checked in order until one is false.
+    :param namespace: The dictionary of names that the expressions refer to.
+    :return: The compiled function, which is true for an argument satisfying every term.
+    """
+    body = ' and '.join(terms) or 'True'
+    source = f'def predicate({parameter}):\n    return {body}\n'
+    exec(compile(source, '<predicate>', 'exec'), namespace)
+    return namespace['predicate']
+
+
+def compile_filters(filters):
+    """Compile a collection of filters into one predicate on a `CloseApproach`.
+
+    The predicate is equivalent to `all(flt(approach) for flt in filters)`, but
+    the filters from `create_filters` are inlined - each reads its attribute
+    directly and compares it with an operator, with no method calls - and
+    evaluation stops at the first filter that fails. Any other filter is still
+    called as-is, in its place in the order.
+
+    :param filters: A collection of filters, such as from `create_filters`.
+    :return: A 1-argument predicate on a `CloseApproach`.
+    """
+    namespace = {}
+    terms = []
+    for flt in filters:
+        accessor = _ACCESSORS.get(type(flt))
+        if accessor is None:
+            name = f'_filter{len(namespace)}'
+            namespace[name] = flt
+            terms.append(f'{name}(approach)')
+        else:
+            terms.append(compile_comparison(accessor, flt.op, flt.value, namespace))
+    return compile_predicate('approach', terms, namespace)
+
+
 def limit(iterator, n=None):
     """Produce a limited stream of values from an iterator.
 
@@ -3,16 +3,49 @@
 NASA's dataset provides timestamps as naive datetimes (corresponding to UTC).
 
 The `cd_to_datetime` function converts a string, formatted as the `cd` field of
-NASA's close approach data, into a Python `datetime`
+NASA's close approach data, into a Python `datetime`. The `cd_to_datetimes`
+function does the same for a whole column of such strings at once.
 
 The `datetime_to_str` function converts a Python `datetime` into a string.
 Although `datetime`s already have human-readable string representations, those
 representations display seconds, but NASA's data (and our datetimes!) don't
 provide that level of resolution, so the output format also will not.
+
+The `datetime_to_minutes` and `minutes_to_datetime` functions convert between
+a `datetime` and a single integer count of minutes, which is how approach times
+are stored in compact binary form.
 """
 import datetime
 
 
+# NASA's `cd` field always uses English month abbreviations, whatever the locale.
+_MONTHS = {name: number for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), start=1)}
+
+# Two-digit hours and minutes, parsed and range-checked by a single lookup.
+_HOURS = {f'{hour:02d}': hour for hour in range(24)}
+_MINUTES = {f'{minute:02d}': minute for minute in range(60)}
+
+# Memoized (year, month, day) of each 'YYYY-bb-DD' prefix seen so far. Many
+# close approaches fall on the same day, and there are only so many days.
+_DAYS = {}
+
+
+def _parse_day(day):
+    """Parse a 'YYYY-bb-DD' date, or return None if it isn't in exactly that form."""
+    year, month, date = day[:4], _MONTHS.get(day[5:8]), day[9:11]
+    if month is None or day[4] != '-' or day[8] != '-' or not (year + date).isdecimal():
+        return None
+    parsed = (int(year), month, int(date))
+    try:
+        # Reject impossible dates (such as Feb 30th) up front.
+        datetime.date(*parsed)
+    except ValueError:
+        return None
+    _DAYS[day] = parsed
+    return parsed
+
+
 def cd_to_datetime(calendar_date):
     """Convert a NASA-formatted calendar date/time description into a datetime.
 
@@ -23,12 +56,49 @@ def cd_to_datetime(calendar_date):
 
     This will become the Python object `datetime.datetime(2020, 12, 31, 12, 0)`.
 
+    Strings in exactly this fixed-width format are parsed directly, with the
+    date part memoized; anything else goes through `datetime.strptime`. Either
+    way, the result (or `ValueError`) is the same as from `strptime`.
+
     :param calendar_date: A calendar date in YYYY-bb-DD hh:mm format.
     :return: A naive `datetime` corresponding to the given calendar date and time.
     """
+    if len(calendar_date) == 17 and calendar_date[11] == ' ' and calendar_date[14] == ':':
+        day = calendar_date[:11]
+        parsed = _DAYS.get(day) or _parse_day(day)
+        hour = _HOURS.get(calendar_date[12:14])
+        minute = _MINUTES.get(calendar_date[15:])
+        if parsed is not None and hour is not None and minute is not None:
+            return datetime.datetime(parsed[0], parsed[1], parsed[2], hour, minute)
     return datetime.datetime.strptime(calendar_date, "%Y-%b-%d %H:%M")
 
 
+def cd_to_datetimes(calendar_dates):
+    """Convert a column of NASA-formatted calendar date/time descriptions into datetimes.
+
+    This is the bulk counterpart of `cd_to_datetime`, for converting every `cd`
+    value of a data set in one call.
+
+    :param calendar_dates: An iterable of calendar dates in YYYY-bb-DD hh:mm format.
+    :return: A list of the corresponding naive `datetime`s, in order.
+    """
+    # The fast path of `cd_to_datetime`, inlined with its lookups bound locally.
+    days, hours, minutes = _DAYS, _HOURS, _MINUTES
+    make, fallback = datetime.datetime, cd_to_datetime
+    converted = []
+    append = converted.append
+    for calendar_date in calendar_dates:
+        parsed = days.get(calendar_date[:11])
+        hour = hours.get(calendar_date[12:14])
+        minute = minutes.get(calendar_date[15:])
+        if (parsed is None or hour is None or minute is None or len(calendar_date) != 17
+                or calendar_date[11] != ' ' or calendar_date[14] != ':'):
+            append(fallback(calendar_date))
+        else:
+            append(make(parsed[0], parsed[1], parsed[2], hour, minute))
+    return converted
+
+
 def datetime_to_str(dt):
     """Convert a naive Python datetime into a human-readable string.
 
@@ -42,3 +112,29 @@ def datetime_to_str(dt):
     :return: That datetime, as a human-readable string without seconds.
     """
     return datetime.datetime.strftime(dt, "%Y-%m-%d %H:%M")
+
+
+def datetime_to_minutes(dt):
+    """Convert a naive Python datetime into a whole number of minutes.
+
+    The count is taken from midnight on the proleptic Gregorian ordinal day 0,
+    so it is always positive for a valid `datetime` and orders the same way.
+    Seconds and smaller units are dropped - NASA's data doesn't have them.
+
+    :param dt: A naive Python datetime.
+    :return: The number of minutes, as an `int`.
+    """
+    return dt.toordinal() * 1440 + dt.hour * 60 + dt.minute
+
+
+def minutes_to_datetime(minutes):
+    """Convert a whole number of minutes back into a naive Python datetime.
+
+    This is the inverse of `datetime_to_minutes`.
+
+    :param minutes: A number of minutes, as produced by `datetime_to_minutes`.
+    :return: The corresponding naive `datetime`.
+    """
+    day, minute = divmod(minutes, 1440)
+    hour, minute = divmod(minute, 60)
+    return datetime.datetime.combine(datetime.date.fromordinal(day), datetime.time(hour, minute))
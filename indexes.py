@@ -0,0 +1,799 @@
+"""Secondary indexes over the columns of an `NEODatabase`.
+
+A `SortedIndex` keeps the rows of one column in sorted order, so that the rows
+whose value lies in a range can be found by bisection instead of by scanning
+every row.
+
+A `KDTree` does the same for several columns at once: it finds the rows whose
+values lie within a box - a range on each of the columns - by visiting only
+the parts of the tree that overlap the box.
+
+A `DayIndex` buckets the rows of the time column by calendar day, so that the
+rows of a date - or of the days of a month or a year - are found by looking
+up each day in a dictionary instead of by bisection.
+
+The `range_bounds` function folds a collection of column conditions (as built
+by `NEODatabase._conditions`) into the bounds of a single range.
+"""
+import array
+import bisect
+import heapq
+import itertools
+import math
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# The comparison operators that bound a range, and which side they bound.
+RANGE_OPS = (operator.eq, operator.ge, operator.gt, operator.le, operator.lt)
+
+
+def range_bounds(conditions):
+    """Fold conditions on one column into a single range.
+
+    :param conditions: An iterable of `(column, op, value)` conditions, whose
+                       `op` is one of `RANGE_OPS`.
+    :return: A tuple `(lower, lower_inclusive, upper, upper_inclusive)`, where a
+             missing bound is None.
+    """
+    lower, lower_inclusive = None, True
+    upper, upper_inclusive = None, True
+    for _column, op, value in conditions:
+        if op in (operator.eq, operator.ge, operator.gt):
+            inclusive = op is not operator.gt
+            if lower is None or value > lower or (value == lower and not inclusive):
+                lower, lower_inclusive = value, inclusive
+        if op in (operator.eq, operator.le, operator.lt):
+            inclusive = op is not operator.lt
+            if upper is None or value < upper or (value == upper and not inclusive):
+                upper, upper_inclusive = value, inclusive
+    return lower, lower_inclusive, upper, upper_inclusive
+
+
+class SortedIndex:
+    """A sorted permutation of the rows of a column, for range lookups by bisection.
+
+    The index holds the column's values in sorted order (`keys`) and the row
+    each one came from (`order`). If the column is already sorted - close
+    approach data usually comes sorted by time - no permutation is stored at
+    all and the column itself serves as the keys, until a value in it changes
+    and the keys become a copy of it.
+
+    Rows whose value is NaN are left out, since they can't satisfy any range,
+    but the index keeps a list of them (`unknown_rows`).
+
+    Rows added to (or changed in) the column after the index is built are kept
+    up to date incrementally: new values go into a small sorted list of pending
+    `(value, row)` pairs, and rows whose value changed are marked stale in the
+    sorted arrays. Once those grow past a fraction of the index, it is rebuilt.
+
+    The sorted arrays are only built the first time they're needed - by a
+    lookup, or by reading `keys` or `order` - so that creating an index costs
+    nothing until a query uses it.
+    """
+    def __init__(self, column):
+        """Create a new `SortedIndex` over a column.
+
+        :param column: An `array.array` (or other sequence) of comparable values.
+        """
+        self._column = column
+        self._keys = None
+        self._order = None
+
+    @property
+    def built(self):
+        """Whether the sorted arrays have been built yet."""
+        return self._keys is not None
+
+    @property
+    def keys(self):
+        """The indexed values of the column, in sorted order."""
+        if self._keys is None:
+            self._build()
+        return self._keys
+
+    @property
+    def order(self):
+        """The row of each of the `keys`, or None if the column itself is sorted (and has no NaN)."""
+        if self._keys is None:
+            self._build()
+        return self._order
+
+    def _build(self):
+        """(Re)build the sorted arrays from the whole column."""
+        column = self._column
+        count = len(column)
+        if numpy is not None and isinstance(column, array.array):
+            self._build_numpy()
+        elif (not any(value != value for value in column)
+              and all(column[row] <= column[row + 1] for row in range(count - 1))):
+            self._order = None
+            self._keys = column
+            self._unknown = []
+        else:
+            rows = sorted((row for row in range(count) if column[row] == column[row]),
+                          key=column.__getitem__)
+            self._order = array.array('q', rows)
+            self._keys = array.array(getattr(column, 'typecode', 'd'), (column[row] for row in rows))
+            self._unknown = [row for row in range(count) if column[row] != column[row]]
+        # The rows of the column covered by the sorted arrays, and their size.
+        self._built_rows = count
+        self._size = count if self._order is None else len(self._keys)
+        self._pending = []
+        self._stale = {}
+
+    def _build_numpy(self):
+        """Build the sorted arrays with a stable NumPy argsort, which keeps equal values in row order."""
+        column = self._column
+        values = _wrap(column)
+        known = values == values
+        if known.all() and not (values[1:] < values[:-1]).any():
+            self._order = None
+            self._keys = column
+            self._unknown = []
+            return
+        self._unknown = numpy.flatnonzero(~known).tolist()
+        rows = numpy.flatnonzero(known)
+        rows = rows[numpy.argsort(values[rows], kind='stable')]
+        self._order = array.array('q', rows.astype(numpy.int64).tobytes())
+        self._keys = array.array(column.typecode, values[rows].tobytes())
+
+    def __len__(self):
+        """Return the number of indexed rows."""
+        if self._keys is None:
+            self._build()
+        return self._size - len(self._stale) + len(self._pending)
+
+    def add(self, row):
+        """Index a row that was just appended to the column."""
+        if self._keys is None:
+            # The row will be picked up when the index is built.
+            return
+        value = self._column[row]
+        if value != value:
+            self._unknown.append(row)
+            return
+        if (self._keys is self._column and not self._pending and row == self._size == self._built_rows
+                and (not row or value >= self._keys[row - 1])):
+            # The column is still sorted, and the keys are the column itself.
+            self._size += 1
+            self._built_rows += 1
+            return
+        bisect.insort(self._pending, (value, row))
+        self._maybe_rebuild()
+
+    def update(self, row, old_value):
+        """Re-index a row whose value in the column has changed.
+
+        :param row: The row that changed.
+        :param old_value: The row's value before the change.
+        """
+        if self._keys is None:
+            return
+        if self._keys is self._column:
+            # The keys are the column itself, which is no longer sorted: keep
+            # the sorted values apart from it, and mark the row stale as usual.
+            self._keys = self._column[:self._size]
+            if row < self._size:
+                self._keys[row] = old_value
+        if old_value == old_value:
+            position = bisect.bisect_left(self._pending, (old_value, row))
+            if position < len(self._pending) and self._pending[position] == (old_value, row):
+                # The old value was itself a change since the index was built.
+                del self._pending[position]
+            elif row < self._built_rows and row not in self._stale:
+                # Otherwise the old value is in the sorted arrays.
+                self._stale[row] = old_value
+        else:
+            position = bisect.bisect_left(self._unknown, row)
+            if position < len(self._unknown) and self._unknown[position] == row:
+                del self._unknown[position]
+        value = self._column[row]
+        if value == value:
+            bisect.insort(self._pending, (value, row))
+        else:
+            bisect.insort(self._unknown, row)
+        self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        """Rebuild the index once the incremental changes are a sizable fraction of it."""
+        if len(self._pending) + len(self._stale) > max(_MAX_PENDING, self._size // 8):
+            self._build()
+
+    def unknown_rows(self):
+        """Find the rows that are left out of the index, because their value is NaN.
+
+        :return: A list of row indices, in ascending (internal) order.
+        """
+        if self._keys is None:
+            self._build()
+        return self._unknown
+
+    def span(self, lower=None, lower_inclusive=True, upper=None, upper_inclusive=True):
+        """Find the positions in sorted order of the values within a range.
+
+        This covers only the sorted arrays, not any changes since they were built.
+
+        :return: A tuple `(start, stop)` of positions into `keys`.
+        """
+        return _bisect_range(self.keys, lower, lower_inclusive, upper, upper_inclusive, self._size)
+
+    def count(self, lower=None, lower_inclusive=True, upper=None, upper_inclusive=True):
+        """Count the rows whose values lie within a range.
+
+        :return: The number of rows.
+        """
+        start, stop = self.span(lower, lower_inclusive, upper, upper_inclusive)
+        count = stop - start
+        if self._stale:
+            count -= sum(1 for value in self._stale.values()
+                         if _in_range(value, lower, lower_inclusive, upper, upper_inclusive))
+        if self._pending:
+            start, stop = _bisect_range(self._pending, lower, lower_inclusive, upper, upper_inclusive,
+                                        pairs=True)
+            count += stop - start
+        return count
+
+    def rows(self, lower=None, lower_inclusive=True, upper=None, upper_inclusive=True):
+        """Find the rows whose values lie within a range.
+
+        :return: A sequence of row indices, in ascending (internal) order.
+        """
+        start, stop = self.span(lower, lower_inclusive, upper, upper_inclusive)
+        if self.order is None and not self._stale and not self._pending:
+            return range(start, stop)
+        return sorted(self.rows_by_value(lower, lower_inclusive, upper, upper_inclusive))
+
+    def rows_by_value(self, lower=None, lower_inclusive=True, upper=None, upper_inclusive=True):
+        """Find the rows whose values lie within a range, without sorting them back into order.
+
+        :return: A sequence of row indices, not necessarily in internal order.
+        """
+        start, stop = self.span(lower, lower_inclusive, upper, upper_inclusive)
+        rows = range(start, stop) if self.order is None else self.order[start:stop]
+        if not self._stale and not self._pending:
+            return rows
+        stale = self._stale
+        rows = [row for row in rows if row not in stale]
+        if self._pending:
+            start, stop = _bisect_range(self._pending, lower, lower_inclusive, upper, upper_inclusive,
+                                        pairs=True)
+            rows.extend(row for _value, row in self._pending[start:stop])
+        return rows
+
+    def walk(self, lower=None, lower_inclusive=True, upper=None, upper_inclusive=True, reverse=False):
+        """Generate the rows whose values lie within a range, in order of value.
+
+        Rows with equal values come in internal order, in either direction.
+        The rows are produced lazily, so a caller that only wants the first
+        few pays for no more than those.
+
+        :param reverse: Whether to start from the largest value.
+        :return: An iterator of row indices.
+        """
+        start, stop = self.span(lower, lower_inclusive, upper, upper_inclusive)
+        keys, order, stale = self.keys, self.order, self._stale
+        positions = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+        pairs = ((keys[position], position if order is None else order[position]) for position in positions)
+        if stale:
+            pairs = (pair for pair in pairs if pair[1] not in stale)
+        if self._pending:
+            start, stop = _bisect_range(self._pending, lower, lower_inclusive, upper, upper_inclusive,
+                                        pairs=True)
+            pending = self._pending[start:stop]
+            if reverse:
+                pending.reverse()
+            pairs = heapq.merge(pairs, pending, reverse=reverse)
+        if not reverse:
+            return (row for _value, row in pairs)
+        # Walking backwards reverses each run of equal values, so put them back in order.
+        return (row for _value, run in itertools.groupby(pairs, key=operator.itemgetter(0))
+                for row in sorted(row for _value, row in run))
+
+    def __repr__(self):
+        if self._keys is None:
+            return f"{self.__class__.__name__}(built=False)"
+        return f"{self.__class__.__name__}(rows={len(self)}, presorted={self._order is None})"
+
+
+# The number of incremental changes a `SortedIndex` (or `KDTree`) always tolerates before a rebuild.
+_MAX_PENDING = 1024
+
+# The most rows in a leaf of a `KDTree`.
+_LEAF_ROWS = 256
+
+
+class KDTree:
+    """A k-d tree over several columns, for finding the rows whose values lie within a box.
+
+    The tree splits the rows in half at the median of one column - whichever
+    is most spread out among them, relative to its spread over all rows - and
+    splits each half the same way, down to leaves of at most `_LEAF_ROWS`
+    rows. Each node keeps the bounding box of its rows, so a search only
+    visits the nodes whose bounding box overlaps the box searched for: the
+    rows of a node that lies wholly inside the box are taken without looking
+    at them, and only the rows of the leaves that straddle its edge are
+    checked one by one (as NumPy masks, if NumPy is installed).
+
+    The rows of each node are a contiguous slice of one permutation of the rows
+    (`order`), and the nodes are numbered as in a binary heap - node `i` has
+    children `2i + 1` and `2i + 2` - so the whole tree is a few flat arrays.
+
+    Rows with a NaN value aren't in the tree, and neither are rows added (or
+    changed) since it was built; they're checked one by one on every search,
+    until there are enough changes to rebuild the tree.
+    """
+    def __init__(self, columns):
+        """Create a new `KDTree` over some columns.
+
+        :param columns: A dictionary mapping column names to `array.array`s (or
+                        other sequences) of comparable values, all of the same length.
+        """
+        self.names = tuple(columns)
+        self._columns = [columns[name] for name in self.names]
+        self._build()
+
+    def _build(self):
+        """(Re)build the tree from the whole of the columns."""
+        columns = self._columns
+        count = len(columns[0])
+        if numpy is not None:
+            values = [_wrap(column) for column in columns]
+            known = numpy.ones(count, dtype=bool)
+            for column in values:
+                known &= column == column
+            order = numpy.flatnonzero(known)
+            loose = numpy.flatnonzero(~known).tolist()
+        else:
+            order = [row for row in range(count) if all(column[row] == column[row] for column in columns)]
+            loose = sorted(set(range(count)).difference(order))
+        size = len(order)
+        self._depth = max(0, math.ceil(math.log2(size / _LEAF_ROWS))) if size else 0
+        nodes = 2 ** (self._depth + 1) - 1
+        self._starts = array.array('q', bytes(8 * nodes))
+        self._stops = array.array('q', bytes(8 * nodes))
+        self._lows = [array.array('d', bytes(8 * nodes)) for _column in columns]
+        self._highs = [array.array('d', bytes(8 * nodes)) for _column in columns]
+        if numpy is not None:
+            self._build_numpy(order, values)
+            self.order = array.array('q', order.astype(numpy.int64).tobytes())
+        else:
+            self.order = array.array('q', order)
+            self._build_python()
+        # The rows that each search checks one by one, and those of them that the tree holds stale values for.
+        self._loose = set(loose)
+        self._stale = set()
+        self._built_rows = count
+        self._changes = 0
+
+    def _split(self, node, start, stop):
+        """Record the positions covered by the children of a node, split at the middle."""
+        if 2 * node + 2 < len(self._starts):
+            middle = (start + stop) // 2
+            self._starts[2 * node + 1], self._stops[2 * node + 1] = start, middle
+            self._starts[2 * node + 2], self._stops[2 * node + 2] = middle, stop
+            return middle
+        return None
+
+    def _widest(self, node, spreads):
+        """Choose the column that a node's rows are most spread out in, relative to its overall spread."""
+        return max(range(len(spreads)),
+                   key=lambda column: (self._highs[column][node] - self._lows[column][node]) / spreads[column])
+
+    def _build_python(self):
+        """Sort each node's rows by its widest column, and split them at the median."""
+        order, columns = self.order, self._columns
+        spreads = None
+        self._starts[0], self._stops[0] = 0, len(order)
+        for node in range(len(self._starts)):
+            start, stop = self._starts[node], self._stops[node]
+            if start == stop:
+                continue
+            for column, lows, highs in zip(columns, self._lows, self._highs):
+                values = [column[row] for row in order[start:stop]]
+                lows[node], highs[node] = min(values), max(values)
+            if spreads is None:
+                spreads = [(highs[0] - lows[0]) or 1.0 for lows, highs in zip(self._lows, self._highs)]
+            middle = self._split(node, start, stop)
+            if middle is not None:
+                key = columns[self._widest(node, spreads)].__getitem__
+                order[start:stop] = array.array('q', sorted(order[start:stop], key=key))
+
+    def _build_numpy(self, order, values):
+        """As `_build_python`, but partitioning each node's rows around the median with NumPy."""
+        spreads = None
+        self._starts[0], self._stops[0] = 0, len(order)
+        for node in range(len(self._starts)):
+            start, stop = self._starts[node], self._stops[node]
+            if start == stop:
+                continue
+            rows = order[start:stop]
+            segment = [column[rows] for column in values]
+            for column, lows, highs in zip(segment, self._lows, self._highs):
+                lows[node], highs[node] = column.min(), column.max()
+            if spreads is None:
+                spreads = [(highs[0] - lows[0]) or 1.0 for lows, highs in zip(self._lows, self._highs)]
+            middle = self._split(node, start, stop)
+            if middle is not None:
+                widest = segment[self._widest(node, spreads)]
+                order[start:stop] = rows[numpy.argpartition(widest, middle - start)]
+
+    def __len__(self):
+        """Return the number of rows in the columns."""
+        return len(self._columns[0])
+
+    def add(self, row):
+        """Take in a row that was just appended to the columns."""
+        self._loose.add(row)
+        self._changes += 1
+        self._maybe_rebuild()
+
+    def update(self, row):
+        """Take in a row whose values in the columns have changed."""
+        if row < self._built_rows and row not in self._loose:
+            self._stale.add(row)
+        self._loose.add(row)
+        self._changes += 1
+        self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        """Rebuild the tree once the changes are a sizable fraction of it."""
+        if self._changes > max(_MAX_PENDING, len(self.order) // 8):
+            self._build()
+
+    def _ranges(self, box):
+        """Turn a box into a list of `(column, range_bounds)` pairs, one per column it bounds."""
+        ranges = []
+        for name, bounds in box.items():
+            if bounds != (None, True, None, True):
+                ranges.append((self.names.index(name), bounds))
+        return ranges
+
+    def _relation(self, node, ranges):
+        """Check how a node's bounding box relates to a box.
+
+        :return: 0 if they don't overlap, 1 if they overlap, or 2 if the node lies inside the box.
+        """
+        inside = 2
+        for column, (lower, lower_inclusive, upper, upper_inclusive) in ranges:
+            low, high = self._lows[column][node], self._highs[column][node]
+            if lower is not None and (high < lower or (high == lower and not lower_inclusive)):
+                return 0
+            if upper is not None and (low > upper or (low == upper and not upper_inclusive)):
+                return 0
+            if inside and not (_in_range(low, lower, lower_inclusive, upper, upper_inclusive)
+                               and _in_range(high, lower, lower_inclusive, upper, upper_inclusive)):
+                inside = 1
+        return inside
+
+    def _search(self, ranges):
+        """Find the nodes to take rows from for a box: those inside it, and the leaves straddling its edge.
+
+        :return: A tuple of a list of `(node, relation)` pairs (see `_relation`),
+                 in order of position, and the number of nodes visited.
+        """
+        first_leaf = 2 ** self._depth - 1
+        starts, stops = self._starts, self._stops
+        pending = [0] if len(self.order) else []
+        found, visited = [], 0
+        while pending:
+            node = pending.pop()
+            if starts[node] == stops[node]:
+                continue
+            visited += 1
+            relation = self._relation(node, ranges)
+            if relation == 2 or (relation == 1 and node >= first_leaf):
+                found.append((node, relation))
+            elif relation == 1:
+                pending.extend((2 * node + 2, 2 * node + 1))
+        return found, visited
+
+    def rows(self, box):
+        """Find the rows whose values lie within a box.
+
+        :param box: A dictionary mapping some of the column names to
+                    `range_bounds` tuples; the other columns are unbounded.
+        :return: A list of row indices, in ascending (internal) order.
+        """
+        ranges = self._ranges(box)
+        starts, stops = self._starts, self._stops
+        if numpy is not None:
+            order = _wrap(self.order)
+            values = [_wrap(column) for column in self._columns]
+            found = []
+            for node, relation in self._search(ranges)[0]:
+                rows = order[starts[node]:stops[node]]
+                if relation == 1:
+                    mask = numpy.ones(len(rows), dtype=bool)
+                    for column, bounds in ranges:
+                        mask &= _mask(values[column][rows], *bounds)
+                    rows = rows[mask]
+                found.append(rows)
+            rows = numpy.sort(numpy.concatenate(found)).tolist() if found else []
+        else:
+            order, columns = self.order, self._columns
+            rows = []
+            for node, relation in self._search(ranges)[0]:
+                if relation == 2:
+                    rows.extend(order[starts[node]:stops[node]])
+                else:
+                    rows.extend(row for row in order[starts[node]:stops[node]]
+                                if all(_in_range(columns[column][row], *bounds) for column, bounds in ranges))
+            rows.sort()
+        if self._stale:
+            rows = [row for row in rows if row not in self._stale]
+        if self._loose:
+            columns = self._columns
+            rows.extend(row for row in self._loose
+                        if all(_in_range(columns[column][row], *bounds) for column, bounds in ranges))
+            rows.sort()
+        return rows
+
+    def estimate(self, box):
+        """Estimate the work of finding the rows within a box, without looking at any row.
+
+        Within a leaf that straddles the edge of the box, rows are assumed to
+        be spread evenly over the leaf's bounding box. With NumPy, the bounding
+        boxes of all the leaves are compared with the box at once, rather than
+        searching the tree.
+
+        :param box: A dictionary mapping some of the column names to `range_bounds` tuples.
+        :return: A tuple `(matches, checked, visited)` of the estimated number
+                 of rows within the box, the number of rows that must be checked
+                 one by one, and the number of nodes visited.
+        """
+        ranges = self._ranges(box)
+        if numpy is not None:
+            return self._estimate_numpy(ranges)
+        starts, stops = self._starts, self._stops
+        found, visited = self._search(ranges)
+        matches, checked = 0.0, len(self._loose)
+        for node, relation in found:
+            size = stops[node] - starts[node]
+            if relation == 2:
+                matches += size
+                continue
+            checked += size
+            fraction = 1.0
+            for column, (lower, _lower_inclusive, upper, _upper_inclusive) in ranges:
+                low, high = self._lows[column][node], self._highs[column][node]
+                if high > low:
+                    overlap = (min(high, math.inf if upper is None else upper)
+                               - max(low, -math.inf if lower is None else lower))
+                    fraction *= max(0.0, overlap) / (high - low)
+            matches += size * fraction
+        return matches, checked, visited
+
+    def _estimate_numpy(self, ranges):
+        """As `estimate`, but comparing every leaf's bounding box with the box at once."""
+        leaves = slice(2 ** self._depth - 1, len(self._starts))
+        sizes = _wrap(self._stops)[leaves] - _wrap(self._starts)[leaves]
+        overlapping = sizes > 0
+        inside = overlapping.copy()
+        fraction = numpy.ones(len(sizes))
+        for column, (lower, lower_inclusive, upper, upper_inclusive) in ranges:
+            low, high = _wrap(self._lows[column])[leaves], _wrap(self._highs[column])[leaves]
+            overlapping &= _mask(high, lower, lower_inclusive, None, True)
+            overlapping &= _mask(low, None, True, upper, upper_inclusive)
+            inside &= (_mask(low, lower, lower_inclusive, upper, upper_inclusive)
+                       & _mask(high, lower, lower_inclusive, upper, upper_inclusive))
+            width = high - low
+            overlap = (numpy.minimum(high, math.inf if upper is None else upper)
+                       - numpy.maximum(low, -math.inf if lower is None else lower))
+            fraction *= numpy.where(width > 0, numpy.clip(overlap, 0, None) / numpy.where(width > 0, width, 1), 1)
+        straddling = overlapping & ~inside
+        matches = float(sizes[inside].sum() + (sizes * fraction)[straddling].sum())
+        checked = int(sizes[straddling].sum()) + len(self._loose)
+        # A node straddles the edge of the box if its children differ, or straddle it;
+        # the search visits the root and both children of every such node.
+        visited = 1 if len(self.order) else 0
+        level = numpy.where(inside, 2, numpy.where(overlapping, 1, 0))
+        while len(level) > 1:
+            level = numpy.where(level[0::2] == level[1::2], level[0::2], 1)
+            visited += 2 * int(numpy.count_nonzero(level == 1))
+        return matches, checked, visited
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(columns={self.names!r}, rows={len(self)}, depth={self._depth})"
+
+
+# The minutes in a day (see `helpers.datetime_to_minutes`).
+_DAY = 1440
+
+
+def day_span(lower=None, lower_inclusive=True, upper=None, upper_inclusive=True):
+    """Find the whole days that a range of times (in minutes) covers exactly.
+
+    :return: A tuple `(first, last)` of the first and last day ordinals (see
+             `datetime.date.toordinal`), or None if the range is unbounded or
+             doesn't start and end on a day boundary.
+    """
+    if lower is None or upper is None:
+        return None
+    start = lower if lower_inclusive else lower + 1
+    stop = upper + 1 if upper_inclusive else upper
+    if start < 0 or start % _DAY or stop % _DAY:
+        return None
+    return start // _DAY, stop // _DAY - 1
+
+
+class DayIndex:
+    """The rows of a time column bucketed by calendar day.
+
+    Each day with an approach maps to the rows of that day, in internal order:
+    a `range` when they are contiguous - as every day's are when the column is
+    sorted by time - or otherwise an `array('q')`. The rows of a day are then
+    one dictionary lookup away, and those of a month or a year a few dozen or
+    a few hundred lookups. Rows without a time (a negative one) are left out.
+
+    Rows appended to the column are added to their day's bucket as they come.
+    The times of stored rows never change, so there is nothing else to update.
+    """
+    def __init__(self, column):
+        """Create a new `DayIndex` over a column of times.
+
+        :param column: An `array('q')` (or other sequence) of times, in minutes.
+        """
+        self._column = column
+        self._days = {}
+        # Whether the buckets, in order of day, are consecutive ranges of rows.
+        self.presorted = True
+        # The latest day, and the last row, indexed so far.
+        self._last = None
+        self._size = 0
+        if numpy is not None and len(column):
+            self._build_numpy()
+        else:
+            for row in range(len(column)):
+                self.add(row)
+
+    def _build_numpy(self):
+        """Bucket the rows with vectorized NumPy operations."""
+        minutes = _wrap(self._column)
+        rows = numpy.flatnonzero(minutes >= 0)
+        if not len(rows):
+            return
+        days = minutes[rows] // _DAY
+        if (days[1:] < days[:-1]).any():
+            order = numpy.argsort(days, kind='stable')
+            rows, days = rows[order], days[order]
+            self.presorted = False
+        elif rows[-1] - rows[0] != len(rows) - 1:
+            self.presorted = False
+        starts = numpy.flatnonzero(days[1:] != days[:-1]) + 1
+        bounds = [0] + starts.tolist() + [len(days)]
+        buckets = self._days
+        for day, start, stop in zip(days[bounds[:-1]].tolist(), bounds, bounds[1:]):
+            first, last = int(rows[start]), int(rows[stop - 1])
+            if last - first == stop - start - 1:
+                buckets[day] = range(first, last + 1)
+            else:
+                buckets[day] = array.array('q', rows[start:stop].tobytes())
+        self._size = len(rows)
+        self._last = (int(days.max()), int(rows.max()))
+
+    def __len__(self):
+        """Return the number of indexed rows."""
+        return self._size
+
+    def add(self, row):
+        """Index a row that was just appended to the column."""
+        minutes = self._column[row]
+        if minutes < 0:
+            return
+        day = minutes // _DAY
+        bucket = self._days.get(day)
+        if bucket is None:
+            self._days[day] = range(row, row + 1)
+        elif isinstance(bucket, range) and bucket.stop == row:
+            self._days[day] = range(bucket.start, row + 1)
+        elif isinstance(bucket, range):
+            bucket = self._days[day] = array.array('q', bucket)
+            bucket.append(row)
+        else:
+            bucket.append(row)
+        if self._last is not None and (day < self._last[0] or row != self._last[1] + 1):
+            self.presorted = False
+        self._last = (day if self._last is None else max(day, self._last[0]), row)
+        self._size += 1
+
+    def _buckets(self, first, last):
+        """List the buckets of the days from `first` to `last`, in order of day."""
+        days = self._days
+        if last - first + 1 > len(days):
+            # Fewer days have approaches than the span holds.
+            return [days[day] for day in sorted(day for day in days if first <= day <= last)]
+        return [days[day] for day in range(first, last + 1) if day in days]
+
+    def probes(self, first, last):
+        """Return the number of days that `rows` and `count` look at for a span of days."""
+        return max(0, min(last - first + 1, len(self._days)))
+
+    def count(self, first, last):
+        """Count the rows on the days from `first` to `last`, inclusive.
+
+        :param first: The ordinal of the first day.
+        :param last: The ordinal of the last day.
+        :return: The number of rows.
+        """
+        return sum(len(bucket) for bucket in self._buckets(first, last))
+
+    def rows(self, first, last):
+        """Find the rows on the days from `first` to `last`, inclusive.
+
+        :param first: The ordinal of the first day.
+        :param last: The ordinal of the last day.
+        :return: A sequence of row indices, in ascending (internal) order.
+        """
+        buckets = self._buckets(first, last)
+        if not buckets:
+            return range(0)
+        if self.presorted:
+            # Every bucket is a range, and each day's rows follow on from the day before's.
+            return range(buckets[0].start, buckets[-1].stop)
+        if len(buckets) == 1:
+            bucket = buckets[0]
+            return bucket if isinstance(bucket, range) else array.array('q', bucket)
+        if all(before[-1] < after[0] for before, after in zip(buckets, buckets[1:])):
+            rows = array.array('q')
+            for bucket in buckets:
+                rows.extend(bucket)
+            return rows
+        # Each bucket is already in order, which sorting their concatenation takes advantage of.
+        return sorted(itertools.chain.from_iterable(buckets))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(rows={len(self)}, days={len(self._days)}, presorted={self.presorted})"
+
+
+def _wrap(column):
+    """Wrap an `array.array` column as a NumPy array, without copying it."""
+    return numpy.frombuffer(column, dtype=column.typecode)
+
+
+def _mask(values, lower, lower_inclusive, upper, upper_inclusive):
+    """Build a NumPy mask of the values within a range."""
+    mask = numpy.ones(len(values), dtype=bool)
+    if lower is not None:
+        mask &= values >= lower if lower_inclusive else values > lower
+    if upper is not None:
+        mask &= values <= upper if upper_inclusive else values < upper
+    return mask
+
+
+def _bisect_range(keys, lower, lower_inclusive, upper, upper_inclusive, size=None, pairs=False):
+    """Find the positions of the values within a range in a sorted sequence.
+
+    :param keys: A sorted sequence of values, or of `(value, row)` pairs if `pairs`.
+    :param size: Only search `keys[:size]`, if given.
+    :param pairs: Whether the keys are `(value, row)` pairs.
+    :return: A tuple `(start, stop)` of positions.
+    """
+    size = len(keys) if size is None else size
+    # As bisection keys for pairs, `(value,)` sorts before and `(value, inf)` after every row.
+    if lower is None:
+        start = 0
+    elif lower_inclusive:
+        start = bisect.bisect_left(keys, (lower,) if pairs else lower, 0, size)
+    else:
+        start = bisect.bisect_right(keys, (lower, math.inf) if pairs else lower, 0, size)
+    if upper is None:
+        stop = size
+    elif upper_inclusive:
+        stop = bisect.bisect_right(keys, (upper, math.inf) if pairs else upper, 0, size)
+    else:
+        stop = bisect.bisect_left(keys, (upper,) if pairs else upper, 0, size)
+    return start, max(start, stop)
+
+
+def _in_range(value, lower, lower_inclusive, upper, upper_inclusive):
+    """Check whether a value lies within a range."""
+    if lower is not None and not (value >= lower if lower_inclusive else value > lower):
+        return False
+    if upper is not None and not (value <= upper if upper_inclusive else value < upper):
+        return False
+    return True
@@ -5,7 +5,7 @@ See `README.md` for a detailed discussion of this project.
 
 This script can be invoked from the command line::
 
-    $ python3 main.py {inspect,query,interactive} [args]
+    $ python3 main.py {inspect,query,aggregate,interactive} [args]
 
 The `inspect` subcommand looks up an NEO by name or by primary designation, and
 optionally lists all of that NEO's known close approaches:
@@ -14,6 +14,11 @@ optionally lists all of that NEO's known close approaches:
     $ python3 main.py inspect --name Halley
     $ python3 main.py inspect --verbose --name Halley
 
+With `--fuzzy`, a name or designation that matches no NEO - a typo, say - shows
+the most similar NEO instead, and lists a few other close matches:
+
+    $ python3 main.py inspect --fuzzy --name Haley
+
 The `query` subcommand searches for close approaches that match given criteria:
 
     $ python3 main.py query --date 1969-07-29
@@ -29,24 +34,62 @@ or JSON format:
     $ python3 main.py query --limit 5 --outfile results.csv
     $ python3 main.py query --limit 15 --outfile results.json
 
+The results can be ordered by time, distance, velocity or NEO diameter with
+`--sort-by` (smallest first, or largest first with `--reverse`) - for example,
+the ten closest approaches of 2020:
+
+    $ python3 main.py query --start-date 2020-01-01 --end-date 2020-12-31 --sort-by distance
+
+To only count the matches, add `--count`:
+
+    $ python3 main.py query --start-date 2020-01-01 --hazardous --count
+
+The `aggregate` subcommand takes the same filters as `query`, and summarizes the
+matching close approaches instead of listing them - their count, and the
+minimum, maximum, mean and (with `--bins`) histogram of their distance,
+velocity or diameter, grouped by year, month, hazardous flag or NEO:
+
+    $ python3 main.py aggregate --group-by year
+    $ python3 main.py aggregate --column distance --group-by hazardous --bins 5
+
+To see how a query would be answered (and how many rows it's expected to
+match) without running it, add `--explain`:
+
+    $ python3 main.py query --date 2020-03-14 --max-distance 0.1 --explain
+
 The `interactive` subcommand loads the NEO database and spawns an interactive
 command shell that can repeatedly execute `inspect` and `query` commands without
-having to wait to reload the database each time. However, it doesn't hot-reload.
+having to wait to reload the database each time. When `--neofile` or `--cadfile`
+changes during the session, it is reloaded in the background while the old data
+keeps answering commands, and the new data is swapped in between commands.
+Within the session, the results of recent queries are cached (up to
+`--cache-size` MiB), and the `cache` command reports how well that's working.
 
 If needed, the script can load data from data files other than the default with
 `--neofile` or `--cadfile`.
+
+Parsing the data files, and scanning a large data set for a query that no index
+can answer, can be spread over several worker processes with `--jobs N`.
+
+Parsed data is cached in a binary snapshot next to the data files, which is
+rebuilt automatically whenever either data file changes. Pass `--no-cache` to
+neither read nor write the snapshot.
 """
 import argparse
 import cmd
 import datetime
 import pathlib
+import re
 import shlex
 import sys
 import time
 
-from extract import load_neos, load_approaches
+from extract import load_neos, load_approach_records
+from cache import DEFAULT_MAX_BYTES, QueryCache
 from database import NEODatabase
 from filters import create_filters, limit
+from reload import Reloader
+from snapshot import snapshot_path, load_snapshot, write_snapshot
 from write import write_to_csv, write_to_json
 
 
@@ -57,6 +100,15 @@ DATA_ROOT = PROJECT_ROOT / 'data'
 # The current time, for use with the kill-on-change feature of the interactive shell.
 _START = time.time()
 
+# The most NEOs that tab completion of a name or designation looks at.
+_MAX_COMPLETIONS = 100
+
+# The most close matches that a fuzzy `inspect`, or `search`, lists.
+_MAX_FUZZY_MATCHES = 10
+
+# The end of an `inspect` command line that is partway through a name or designation.
+_PARTIAL_NEO = re.compile(r'''(?:^|\s)(-n|--name|-p|--pdes)\s+(?:(["'])([^"']*)|(\S*))$''')
+
 
 def date_fromisoformat(date_string):
     """Return a `datetime.date` corresponding to a string in YYYY-MM-DD format.
@@ -73,42 +125,11 @@ def date_fromisoformat(date_string):
         raise argparse.ArgumentTypeError(f"'{date_string}' is not a valid date. Use YYYY-MM-DD.")
 
 
-def make_parser():
-    """Create an ArgumentParser for this script.
-
-    :return: A tuple of the top-level, inspect, and query parsers.
-    """
-    parser = argparse.ArgumentParser(
-        description="Explore past and future close approaches of near-Earth objects."
-    )
-
-    # Add arguments for custom data files.
-    parser.add_argument('--neofile', default=(DATA_ROOT / 'neos.csv'),
-                        type=pathlib.Path,
-                        help="Path to CSV file of near-Earth objects.")
-    parser.add_argument('--cadfile', default=(DATA_ROOT / 'cad.json'),
-                        type=pathlib.Path,
-                        help="Path to JSON file of close approach data.")
-    subparsers = parser.add_subparsers(dest='cmd')
-
-    # Add the `inspect` subcommand parser.
-    inspect = subparsers.add_parser('inspect',
-                                    description="Inspect an NEO by primary designation or by name.")
-    inspect.add_argument('-v', '--verbose', action='store_true',
-                         help="Additionally, print all known close approaches of this NEO.")
-    inspect_id = inspect.add_mutually_exclusive_group(required=True)
-    inspect_id.add_argument('-p', '--pdes',
-                            help="The primary designation of the NEO to inspect (e.g. '433').")
-    inspect_id.add_argument('-n', '--name',
-                            help="The IAU name of the NEO to inspect (e.g. 'Halley').")
-
-    # Add the `query` subcommand parser.
-    query = subparsers.add_parser('query',
-                                  description="Query for close approaches that "
-                                              "match a collection of filters.")
-    filters = query.add_argument_group('Filters',
-                                       description="Filter close approaches by their attributes "
-                                                   "or the attributes of their NEOs.")
+def add_filter_arguments(parser):
+    """Add the options that create filters (see `filters_from_args`) to a subcommand parser."""
+    filters = parser.add_argument_group('Filters',
+                                        description="Filter close approaches by their attributes "
+                                                    "or the attributes of their NEOs.")
     filters.add_argument('-d', '--date', type=date_fromisoformat,
                          help="Only return close approaches on the given date, "
                               "in YYYY-MM-DD format (e.g. 2020-12-31).")
@@ -144,22 +165,132 @@ def make_parser():
     filters.add_argument('--not-hazardous', dest='hazardous', default=None, action='store_false',
                          help="If specified, only return close approaches of NEOs that "
                               "are not potentially hazardous.")
+
+
+def filters_from_args(args):
+    """Construct a collection of filters from the parsed filter options."""
+    return create_filters(
+        date=args.date, start_date=args.start_date, end_date=args.end_date,
+        distance_min=args.distance_min, distance_max=args.distance_max,
+        velocity_min=args.velocity_min, velocity_max=args.velocity_max,
+        diameter_min=args.diameter_min, diameter_max=args.diameter_max,
+        hazardous=args.hazardous
+    )
+
+
+def make_parser():
+    """Create an ArgumentParser for this script.
+
+    :return: A tuple of the top-level, inspect, query, and aggregate parsers.
+    """
+    parser = argparse.ArgumentParser(
+        description="Explore past and future close approaches of near-Earth objects."
+    )
+
+    # Add arguments for custom data files.
+    parser.add_argument('--neofile', default=(DATA_ROOT / 'neos.csv'),
+                        type=pathlib.Path,
+                        help="Path to CSV file of near-Earth objects.")
+    parser.add_argument('--cadfile', default=(DATA_ROOT / 'cad.json'),
+                        type=pathlib.Path,
+                        help="Path to JSON file of close approach data.")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="Don't read or write the binary snapshot of the parsed data files.")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Number of worker processes to parse the data files and scan for queries with.")
+    subparsers = parser.add_subparsers(dest='cmd')
+
+    # Add the `inspect` subcommand parser.
+    inspect = subparsers.add_parser('inspect',
+                                    description="Inspect an NEO by primary designation or by name.")
+    inspect.add_argument('-v', '--verbose', action='store_true',
+                         help="Additionally, print all known close approaches of this NEO.")
+    inspect.add_argument('-f', '--fuzzy', action='store_true',
+                         help="If no NEO matches, show the most similar one and list other close matches.")
+    inspect_id = inspect.add_mutually_exclusive_group(required=True)
+    inspect_id.add_argument('-p', '--pdes',
+                            help="The primary designation of the NEO to inspect (e.g. '433').")
+    inspect_id.add_argument('-n', '--name',
+                            help="The IAU name of the NEO to inspect (e.g. 'Halley').")
+
+    # Add the `query` subcommand parser.
+    query = subparsers.add_parser('query',
+                                  description="Query for close approaches that "
+                                              "match a collection of filters.")
+    add_filter_arguments(query)
     query.add_argument('-l', '--limit', type=int,
                        help="The maximum number of matches to return. "
                             "Defaults to 10 if no --outfile is given.")
     query.add_argument('-o', '--outfile', type=pathlib.Path,
                        help="File in which to save structured results. "
                             "If omitted, results are printed to standard output.")
+    query.add_argument('--sort-by', choices=('time', 'distance', 'velocity', 'diameter'),
+                       help="Order the matches by this value, smallest first. "
+                            "Approaches whose value is unknown come last.")
+    query.add_argument('--reverse', action='store_true',
+                       help="With --sort-by, order the matches largest first.")
+    query.add_argument('--count', action='store_true',
+                       help="Print the number of matches, instead of the matches themselves.")
+    query.add_argument('--explain', action='store_true',
+                       help="Print how the query would be answered, instead of its results.")
+
+    # Add the `aggregate` subcommand parser.
+    aggregate = subparsers.add_parser('aggregate',
+                                      description="Summarize the close approaches that "
+                                                  "match a collection of filters.")
+    add_filter_arguments(aggregate)
+    aggregate.add_argument('-c', '--column', choices=('distance', 'velocity', 'diameter'),
+                           help="Summarize this value of the matches - its minimum, maximum and mean. "
+                                "If omitted, only count the matches.")
+    aggregate.add_argument('-g', '--group-by', choices=('year', 'month', 'hazardous', 'neo'),
+                           help="Summarize each year, month, hazardous flag or NEO separately.")
+    aggregate.add_argument('-b', '--bins', type=int, default=0,
+                           help="With --column, also count the values into this many histogram bins.")
 
     repl = subparsers.add_parser('interactive',
                                  description="Start an interactive command session "
                                              "to repeatedly run `interact` and `query` commands.")
     repl.add_argument('-a', '--aggressive', action='store_true',
                       help="If specified, kill the session whenever a project file is modified.")
-    return parser, inspect, query
+    repl.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / 2 ** 20, metavar='MiB',
+                      help="The most memory, in MiB, to spend on caching the results of repeated "
+                           "queries. Use 0 to disable the cache.")
+    return parser, inspect, query, aggregate
+
+
+def load_database(neofile, cadfile, cache=True, jobs=1):
+    """Build an `NEODatabase` from the data files, going through the snapshot cache.
 
+    If a fresh snapshot of the data files exists, it is loaded instead of
+    parsing the data files. Otherwise, the data files are parsed and (if
+    `cache=True`) a new snapshot is written for next time.
 
-def inspect(database, pdes=None, name=None, verbose=False):
+    :param neofile: Path to the CSV file of near-Earth objects.
+    :param cadfile: Path to the JSON file of close approach data.
+    :param cache: Whether to use the snapshot cache at all.
+    :param jobs: The number of worker processes to parse the data files with.
+    :return: A linked `NEODatabase`.
+    """
+    path = snapshot_path(neofile, cadfile)
+    if cache:
+        database = load_snapshot(path, neofile, cadfile)
+        if database is not None:
+            return database
+
+    # Extract data from the data files into structured Python objects. Serially,
+    # the close approach records are streamed, so linking overlaps with parsing.
+    database = NEODatabase.from_records(load_neos(neofile, jobs),
+                                        load_approach_records(cadfile, jobs))
+
+    if cache:
+        try:
+            write_snapshot(path, database, neofile, cadfile)
+        except OSError as err:
+            print(f"Couldn't save a snapshot of the data files: {err}", file=sys.stderr)
+    return database
+
+
+def inspect(database, pdes=None, name=None, verbose=False, fuzzy=False):
     """Perform the `inspect` subcommand.
 
     This function fetches an NEO by designation or by name. If a matching NEO is
@@ -168,73 +299,127 @@ def inspect(database, pdes=None, name=None, verbose=False):
     Otherwise, a message is printed noting that there are no matching NEOs.
 
     At least one of `pdes` and `name` must be given. If both are given, prefer
-    to look up the NEO by the primary designation.
+    to look up the NEO by the primary designation. Names are matched regardless
+    of case, and every NEO sharing the name is printed.
+
+    If `fuzzy=True` and nothing matches, the NEO whose name or designation is
+    most similar (see `NEODatabase.search_neos`) is printed instead, followed
+    by a list of the other close matches.
 
     :param database: The `NEODatabase` containing data on NEOs and their close approaches.
     :param pdes: The primary designation of an NEO for which to search.
     :param name: The name of an NEO for which to search.
     :param verbose: Whether to additionally print all of a matching NEO's close approaches.
-    :return: The matching `NearEarthObject`, or None if not found.
+    :param fuzzy: Whether to fall back to the most similar NEO if none matches.
+    :return: The matching `NearEarthObject` (the one whose name matches exactly,
+             if several match, or the most similar one), or None if not found.
     """
-    # Fetch the NEO of interest.
+    # Fetch the NEO of interest - or, by name, every NEO sharing the name.
     if pdes:
         neo = database.get_neo_by_designation(pdes)
+        neos = [neo] if neo else []
     else:
         neo = database.get_neo_by_name(name)
+        neos = database.get_neos_by_name(name)
+
+    # Fall back to the most similar NEO, if asked to.
+    others = []
+    if not neo and fuzzy:
+        matches = database.search_neos(pdes or name, _MAX_FUZZY_MATCHES)
+        if matches:
+            neo, score = matches[0]
+            neos, others = [neo], matches[1:]
+            print(f"No NEO matches {pdes or name!r}; showing the closest match ({score:.0%} similar).",
+                  file=sys.stderr)
 
     # Ensure that we have received an NEO.
     if not neo:
         print("No matching NEOs exist in the database.", file=sys.stderr)
         return None
 
-    # Display information about this NEO, and optionally its close approaches if verbose.
-    print(neo) 
-  ###ELABORATE:(Refer EXTENSIONS.md)-GOOD TO HAVE BUT NOT MANDATORY - Enable below code if you want to print out all NEOs & their closed approaches having the same NEO name###
-   # if(len(neo) > 1):
-    #    for neo_elem in neo:
-     #       print(neo_elem)
-   # else:
-    #    print(neo)
-  ###ELABORATE:(Refer EXTENSIONS.md)- GOOD TO HAVE BUT NOT MANDATORY - Enable above code if you want to print out all NEOs & their closed approaches having the same NEO name###
-    if verbose:
-        ###ELABORATE:(Refer EXTENSIONS.md)-GOOD TO HAVE BUT NOT MANDATORY - Enable below code if you want to print out all NEOs & their closed approaches having the same NEO name###
-        #if(len(neo) == 1):
-        ###ELABORATE:(Refer EXTENSIONS.md)- GOOD TO HAVE BUT NOT MANDATORY - Enable above code if you want to print out all NEOs & their closed approaches having the same NEO name###
-          for approach in neo.approaches:
-              print(f"- {approach}")
-    ###ELABORATE:(Refer EXTENSIONS.md)- GOOD TO HAVE BUT NOT MANDATORY - Enable below code if you want to print out all NEOs & their closed approaches having the same NEO name###   
-    # else:
-        #   for neo_elem in neo:
-         #     for approach in neo_elem.approaches:
-          #          print(f"- {approach}")
-    ###ELABORATE:(Refer EXTENSIONS.md)- GOOD TO HAVE BUT NOT MANDATORY - Enable above code if you want to print out all NEOs & their closed approaches having the same NEO name###
+    # Display information about each NEO, and optionally its close approaches if verbose.
+    #ELABORATE : all NEOs having the same name are printed, each followed by its close approaches (see EXTENSIONS.md)
+    for match in neos:
+        print(match)
+        if verbose:
+            for approach in match.approaches:
+                print(f"- {approach}")
+    if others:
+        print("Other close matches:")
+        print_matches(others)
     return neo
 
 
-def query(database, args):
+def search(database, text, limit=_MAX_FUZZY_MATCHES):
+    """Perform the `search` command of the interactive shell.
+
+    Print the NEOs whose name or primary designation is most similar to a text,
+    best first, each with how similar it is.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param text: The text to search for, such as a misspelled name.
+    :param limit: The most NEOs to print.
+    :return: A list of `(NearEarthObject, score)` pairs, as from `NEODatabase.search_neos`.
+    """
+    matches = database.search_neos(text, limit)
+    if not matches:
+        print("No similar NEOs exist in the database.", file=sys.stderr)
+    print_matches(matches)
+    return matches
+
+
+def print_matches(matches):
+    """Print a list of `(NearEarthObject, score)` pairs, one per line."""
+    for neo, score in matches:
+        print(f"{score:4.0%}  {neo.fullname}")
+
+
+def query(database, args, cache=None):
     """Perform the `query` subcommand.
 
     Create a collection of filters with `create_filters` and supply them to the
-    database's `query` method to produce a stream of matching results.
+    database's `query` method to produce a stream of matching results. If a
+    `QueryCache` is given, the matching rows are looked up in it (or added to
+    it) instead.
 
     If an output file wasn't given, print these results to stdout, limiting to
     10 entries if no limit was specified. If an output file was given, use the
     file's extension to infer whether the file should hold CSV or JSON data, and
     then write the results to the output file in that format.
 
+    With `--sort-by`, only the first results in that order are selected (with
+    `NEODatabase.sort_rows`), rather than sorting every match. With `--count`,
+    only the number of matches is printed (see `NEODatabase.count`).
+
     :param database: The `NEODatabase` containing data on NEOs and their close approaches.
     :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param cache: A `QueryCache` of recent query results, or None.
     """
     # Construct a collection of filters from arguments supplied at the command line.
-    filters = create_filters(
-        date=args.date, start_date=args.start_date, end_date=args.end_date,
-        distance_min=args.distance_min, distance_max=args.distance_max,
-        velocity_min=args.velocity_min, velocity_max=args.velocity_max,
-        diameter_min=args.diameter_min, diameter_max=args.diameter_max,
-        hazardous=args.hazardous
-    )
-    # Query the database with the collection of filters.
-    results = database.query(filters)
+    filters = filters_from_args(args)
+    count = args.limit if args.outfile else (args.limit or 10)
+    if args.explain:
+        print(database.explain(filters, args.sort_by, args.reverse, count))
+        return
+    if args.count:
+        rows = None if cache is None else cache.get(database, filters)
+        print(database.count(filters) if rows is None else len(rows))
+        return
+
+    # Query the database with the collection of filters. Results in order that
+    # come from walking an index can't be cached, since the walk stops early.
+    if cache is None:
+        results = database.query(filters, args.sort_by, args.reverse, count)
+    elif args.sort_by is None:
+        results = database.fetch(cache.rows(database, filters, count))
+    else:
+        plan = database.explain(filters, args.sort_by, args.reverse, count)
+        if plan.access == 'walk':
+            results = database.fetch(database.query_rows(filters, args.sort_by, args.reverse, count, plan))
+        else:
+            # Any other plan finds every match, and sorts them afterwards.
+            rows = cache.rows(database, filters, plan=plan)
+            results = database.fetch(database.sort_rows(rows, args.sort_by, args.reverse, count))
 
     if not args.outfile:
         # Write the results to stdout, limiting to 10 entries if not specified.
@@ -250,6 +435,42 @@ def query(database, args):
             print("Please use an output file that ends with `.csv` or `.json`.", file=sys.stderr)
 
 
+def aggregate(database, args):
+    """Perform the `aggregate` subcommand.
+
+    Summarize the close approaches that match the filters with the database's
+    `aggregate` method, and print one line per group: the group, the number of
+    matches, and - if a column was chosen - how many of them have a known
+    value, and the minimum, maximum and mean of those values. A histogram (if
+    asked for) follows each group's line, one bin per line.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    summaries = database.aggregate(filters_from_args(args), args.column, args.group_by, args.bins)
+
+    def number(value):
+        return '-' if value is None else f'{value:.6g}'
+
+    header = f"{args.group_by or 'all':<12} {'count':>8}"
+    if args.column:
+        header += f" {'known':>8} {'min':>12} {'max':>12} {'mean':>12}"
+    print(header)
+    for key, summary in summaries.items():
+        label = 'all' if args.group_by is None else ('unknown' if key is None else str(key))
+        line = f"{label:<12} {summary.count:>8}"
+        if args.column:
+            line += (f" {summary.known:>8} {number(summary.minimum):>12} "
+                     f"{number(summary.maximum):>12} {number(summary.mean):>12}")
+        print(line)
+        if summary.histogram is not None:
+            edges = summary.edges
+            for low, high, count in zip(edges, edges[1:], summary.histogram):
+                # The last bin includes its upper edge.
+                close = ']' if high == edges[-1] else ')'
+                print(f"    [{low:.6g}, {high:.6g}{close} {count:>8}")
+
+
 class NEOShell(cmd.Cmd):
     """Perform the `interactive` subcommand.
 
@@ -260,13 +481,25 @@ class NEOShell(cmd.Cmd):
 
     The primary purpose of this shell is to allow users to repeatedly perform
     inspect and query commands, while only loading the data (which can be quite
-    slow) once.
+    slow) once. The rows matched by recent queries are kept in a `QueryCache`,
+    so repeating a query (even with a different `--limit` or `--outfile`)
+    doesn't search the data again.
+
+    The `inspect` command completes NEO names and designations with the Tab
+    key, regardless of case, from the sorted name indexes of the database. The
+    `search` command lists the NEOs with the most similar names, despite typos.
+
+    If it's given a `Reloader`, the shell checks before each command whether
+    the data files have changed. If so, they're reloaded in a background thread
+    while the current database keeps answering commands, and the result - just
+    the changed records, where possible - is applied before a later command.
     """
     intro = ("Explore close approaches of near-Earth objects. "
              "Type `help` or `?` to list commands and `exit` to exit.\n")
     prompt = '(neo) '
 
-    def __init__(self, database, inspect_parser, query_parser, aggressive=False, **kwargs):
+    def __init__(self, database, inspect_parser, query_parser, aggregate_parser=None, aggressive=False,
+                 cache_size=DEFAULT_MAX_BYTES, reloader=None, **kwargs):
         """Create a new `NEOShell`.
 
         Creating this object doesn't start the session - for that, use `.cmdloop()`.
@@ -274,14 +507,20 @@ class NEOShell(cmd.Cmd):
         :param database: The `NEODatabase` containing data on NEOs and their close approaches.
         :param inspect_parser: The subparser for the `inspect` subcommand.
         :param query_parser: The subparser for the `query` subcommand.
+        :param aggregate_parser: The subparser for the `aggregate` subcommand, if it's available.
         :param aggressive: Whether to kill the session whenever a project file is changed.
+        :param cache_size: The memory cap, in bytes, of the query result cache; 0 disables it.
+        :param reloader: A `Reloader` watching the data files, or None to never reload them.
         :param kwargs: A dictionary of excess keyword arguments passed to the superclass.
         """
         super().__init__(**kwargs)
         self.db = database
         self.inspect = inspect_parser
         self.query = query_parser
+        self.aggregate = aggregate_parser
         self.aggressive = aggressive
+        self.cache = QueryCache(cache_size) if cache_size > 0 else None
+        self.reloader = reloader
 
     @classmethod
     def parse_arg_with(cls, arg, parser):
@@ -325,6 +564,10 @@ class NEOShell(cmd.Cmd):
         Additionally, list all known close approaches:
 
             (neo) inspect --verbose --name Eros
+
+        If nothing matches a misspelled name, show the most similar NEO instead:
+
+            (neo) inspect --fuzzy --name Aros
         """
         args = self.parse_arg_with(arg, self.inspect)
         if not args:
@@ -333,12 +576,52 @@ class NEOShell(cmd.Cmd):
         # Run the `inspect` subcommand.
         inspect(self.db,
                 pdes=args.pdes, name=args.name,
-                verbose=args.verbose)
+                verbose=args.verbose, fuzzy=args.fuzzy)
 
     def do_q(self, arg):
         """Shorthand for `query`."""
         self.do_query(arg)
 
+    def complete_inspect(self, text, line, begidx, endidx):
+        """Complete the options of `inspect`, and the NEO names and designations they take.
+
+        Names and designations are completed regardless of case, and a
+        completion that contains a space is quoted.
+        """
+        match = _PARTIAL_NEO.search(line[:endidx])
+        if match is None:
+            if not text.startswith('-'):
+                return []
+            return [option for action in self.inspect._actions for option in action.option_strings
+                    if option.startswith('--') and option.startswith(text)]
+        option, quote, quoted, partial = match.groups()
+        if quote:
+            partial = quoted
+        if option in ('-n', '--name'):
+            candidates = self.db.complete_names(partial, _MAX_COMPLETIONS)
+        else:
+            candidates = self.db.complete_designations(partial, _MAX_COMPLETIONS)
+        # Readline replaces just `text`, the end of the partial name after any space or quote.
+        skip = len(partial) - len(text)
+        return [f'"{candidate}"' if not quote and ' ' in candidate else candidate[skip:]
+                for candidate in candidates]
+
+    complete_i = complete_inspect
+
+    def do_search(self, arg):
+        """List the NEOs whose name or designation is most similar to some text.
+
+        Typos and case don't matter, and the best matches come first:
+
+            (neo) search Apolo
+            (neo) search 2020 sb
+        """
+        text = arg.strip()
+        if not text:
+            print("Search for what? For example: search Halley", file=sys.stderr)
+            return
+        search(self.db, text)
+
     def do_query(self, arg):
         """Perform the `query` subcommand within the REPL session.
 
@@ -360,13 +643,98 @@ class NEOShell(cmd.Cmd):
 
             (neo) query --limit 5 --outfile results.csv
             (neo) query --limit 5 --outfile results.json
+
+        The results can be ordered with `--sort-by` (and `--reverse`):
+
+            (neo) query --start-date 2020-01-01 --sort-by velocity --reverse
+
+        To only count the matches, use `--count`:
+
+            (neo) query --hazardous --count
+
+        To see how a query would be answered, without running it, use `--explain`:
+
+            (neo) query --max-distance 0.01 --explain
         """
         args = self.parse_arg_with(arg, self.query)
         if not args:
             return
 
-        # Run the `inspect` subcommand.
-        query(self.db, args)
+        # Run the `query` subcommand.
+        query(self.db, args, self.cache)
+
+    def do_aggregate(self, arg):
+        """Perform the `aggregate` subcommand within the REPL session.
+
+        This command behaves the same as the `aggregate` subcommand from the
+        command line, and takes the same filters as `query`. For example, to
+        count the close approaches of hazardous NEOs in each month of 2020:
+
+            (neo) aggregate --start-date 2020-01-01 --end-date 2020-12-31 --hazardous --group-by month
+
+        Summarize the distance, velocity or diameter of the matches with
+        `--column`, and add a histogram of it with `--bins`:
+
+            (neo) aggregate --column velocity --group-by year --bins 10
+        """
+        if self.aggregate is None:
+            print("The aggregate command isn't available.", file=sys.stderr)
+            return
+        args = self.parse_arg_with(arg, self.aggregate)
+        if not args:
+            return
+
+        # Run the `aggregate` subcommand.
+        aggregate(self.db, args)
+
+    def do_cache(self, arg):
+        """Show how the query result cache is doing, or empty it.
+
+        Show the number of cached queries, the memory they take up, and the
+        number of cache hits, misses and evictions so far:
+
+            (neo) cache
+
+        Forget every cached query:
+
+            (neo) cache clear
+        """
+        if self.cache is None:
+            print("The query cache is disabled.", file=sys.stderr)
+        elif arg.strip() == 'clear':
+            self.cache.clear()
+        elif arg.strip():
+            print(f"Unknown cache command: {arg.strip()}", file=sys.stderr)
+        else:
+            print(self.cache)
+
+    def do_reload(self, _arg):
+        """Reload the data files in the background, even if they seem unchanged.
+
+        The current data keeps answering commands until the reload is done.
+        Changes to the data files are normally noticed and reloaded without
+        this command.
+        """
+        if self.reloader is None:
+            print("This session can't reload its data files.", file=sys.stderr)
+        elif self.reloader.running:
+            print("The data files are already being reloaded.", file=sys.stderr)
+        else:
+            self.reloader.start(self.db)
+
+    def follow_data_files(self):
+        """Apply a finished reload of the data files, and start one if they've changed."""
+        if self.reloader is None:
+            return
+        result = self.reloader.poll()
+        if isinstance(result, Exception):
+            print(f"Couldn't reload the data files: {result}", file=sys.stderr)
+        elif result is not None:
+            self.db = result.apply(self.db)
+            print(f"Reloaded the data files: {result}.", file=sys.stderr)
+        if not self.reloader.running and self.reloader.changed():
+            print("The data files have changed; reloading them in the background.", file=sys.stderr)
+            self.reloader.start(self.db)
 
     def do_EOF(self, _arg):
         """Exit the interactive session."""
@@ -377,7 +745,8 @@ class NEOShell(cmd.Cmd):
     do_quit = do_EOF
 
     def precmd(self, line):
-        """Watch for changes to the files in this project."""
+        """Watch for changes to the data files and to the files in this project."""
+        self.follow_data_files()
         changed = [f for f in PROJECT_ROOT.glob('*.py') if f.stat().st_mtime > _START]
         if changed:
             print("The following file(s) have been modified since this interactive session began: "
@@ -394,19 +763,24 @@ class NEOShell(cmd.Cmd):
 
 def main():
     """Run the main script."""
-    parser, inspect_parser, query_parser = make_parser()
+    parser, inspect_parser, query_parser, aggregate_parser = make_parser()
     args = parser.parse_args()
 
-    # Extract data from the data files into structured Python objects.
-    database = NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile))
+    # Extract data from the data files (or their snapshot) into structured Python objects.
+    database = load_database(args.neofile, args.cadfile, cache=args.cache, jobs=args.jobs)
+    database.workers = args.jobs
 
     # Run the chosen subcommand.
     if args.cmd == 'inspect':
-        inspect(database, pdes=args.pdes, name=args.name, verbose=args.verbose)
+        inspect(database, pdes=args.pdes, name=args.name, verbose=args.verbose, fuzzy=args.fuzzy)
     elif args.cmd == 'query':
         query(database, args)
+    elif args.cmd == 'aggregate':
+        aggregate(database, args)
     elif args.cmd == 'interactive':
-        NEOShell(database, inspect_parser, query_parser, aggressive=args.aggressive).cmdloop()
+        reloader = Reloader(args.neofile, args.cadfile, cache=args.cache, jobs=args.jobs)
+        NEOShell(database, inspect_parser, query_parser, aggregate_parser, aggressive=args.aggressive,
+                 cache_size=int(args.cache_size * 2 ** 20), reloader=reloader).cmdloop()
 
 
 if __name__ == '__main__':
@@ -15,8 +15,15 @@ The functions that construct these objects use information extracted from the
 data files from NASA, so these objects should be able to handle all of the
 quirks of the data set, such as missing names and unknown diameters.
 
+Both classes declare `__slots__`, so instances carry no per-instance `__dict__`,
+and designations are interned, so an NEO and all of its close approaches share a
+single designation string. There can be millions of close approaches, so this
+per-object overhead adds up to most of the memory held by an `NEODatabase`.
+
 You'll edit this file in Task 1.
 """
+import sys
+
 from helpers import cd_to_datetime, datetime_to_str
 
 
@@ -32,19 +39,20 @@ class NearEarthObject:
     initialized to an empty collection, but eventually populated in the
     `NEODatabase` constructor.
     """
-    
+    __slots__ = ('designation', 'name', 'diameter', 'hazardous', 'approaches')
+
     def __init__(self, **info):
         """Create a new `NearEarthObject`.
 
         :param info: A dictionary of excess keyword arguments supplied to the constructor.
         """
         
-        self.designation = info['designation']   #ELABORATE:Get NEO's designation 
+        self.designation = sys.intern(info['designation'])   #ELABORATE:Get NEO's designation, shared with its close approaches
         if(not info['name']):  #ELABORATE:get NEO's name, if its empty string, then default is None 
             self.name=None
         else:
             self.name=info['name']
-        if(not info['diameter']):   #ELABORATE:get NEO's diameter, if its not defined/unknown, then default is "nan"
+        if(info['diameter'] is None or info['diameter'] == ''):   #ELABORATE:get NEO's diameter, if its not defined/unknown, then default is "nan"
             self.diameter = float('nan')
         else:
             self.diameter=float(info['diameter'])
@@ -113,15 +121,19 @@ class CloseApproach:
     private attribute, but the referenced NEO is eventually replaced in the
     `NEODatabase` constructor.
     """
-   
+    # A `__weakref__` slot lets an `NEODatabase` keep the approaches it hands out without keeping them alive.
+    __slots__ = ('_designation', 'time', 'distance', 'velocity', 'neo', '__weakref__')
+
     def __init__(self, **info):
         """Create a new `CloseApproach`.
 
         :param info: A dictionary of excess keyword arguments supplied to the constructor.
         """
         
-        self._designation = info['designation'] #ELABORATE:get designation of NEO
-        if(not info['cd']): #ELABORATE:get unformatted date & time of NEO, if not defined assign none, else convert to datetime format
+        self._designation = sys.intern(info['designation']) #ELABORATE:get designation of NEO, shared with every other approach of that NEO
+        if 'time' in info: #ELABORATE:an already-parsed datetime (e.g. from a snapshot) is used as-is
+            self.time = info['time']
+        elif(not info['cd']): #ELABORATE:get unformatted date & time of NEO, if not defined assign none, else convert to datetime format
             self.time = None  
         else:
             self.time=cd_to_datetime(info['cd'])
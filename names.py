@@ -0,0 +1,276 @@
+"""Look up NEOs by name or designation regardless of case, or by the start of one.
+
+A `NameIndex` keeps the case-folded names of a collection of NEOs in sorted
+order, each next to the id (row) of its NEO. Several NEOs may share a name -
+every one of them is kept - and a name is found by bisection, as is the run
+of names that start with a prefix, so a lookup takes O(log n) time however
+many NEOs there are, plus the time to list what it found.
+
+`NEODatabase` keeps one `NameIndex` over the NEOs' names and one over their
+primary designations, for `get_neos_by_name` and for completing partial names
+and designations in the interactive shell.
+
+For names that are misspelled rather than incomplete, a `TrigramIndex` finds
+the names most similar to a query - by the fraction of three-character
+sequences (trigrams) they share - by looking up the query's rarest trigrams
+instead of comparing the query with every name.
+"""
+import array
+import bisect
+import collections
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Sorts after any character that can follow a prefix.
+_LAST_CHARACTER = chr(0x10FFFF)
+
+
+def fold(text):
+    """Normalize a name (or designation) for comparison regardless of case."""
+    folded = text.casefold()
+    # Keep one copy of the string when folding doesn't change it, as for most designations.
+    return text if folded == text else folded
+
+
+class NameIndex:
+    """A sorted index of the case-folded names of NEOs, for exact and prefix lookups."""
+    def __init__(self, names=()):
+        """Create a new `NameIndex`.
+
+        :param names: A sequence of names (or None), one per NEO id, in order of id.
+        """
+        pairs = sorted((fold(name), neo) for neo, name in enumerate(names) if name)
+        self._keys = [key for key, _neo in pairs]
+        self._neos = array.array('q', (neo for _key, neo in pairs))
+
+    def __len__(self):
+        """Return the number of indexed names."""
+        return len(self._keys)
+
+    def get(self, name):
+        """Find the NEOs with a name, regardless of case.
+
+        :param name: The name to look up.
+        :return: A list of NEO ids, in ascending order.
+        """
+        if not name:
+            return []
+        key = fold(name)
+        start = bisect.bisect_left(self._keys, key)
+        stop = bisect.bisect_right(self._keys, key, start)
+        return self._neos[start:stop].tolist()
+
+    def prefix(self, prefix, limit=None):
+        """Find the NEOs whose name starts with a prefix, regardless of case.
+
+        :param prefix: The start of the names to look up; '' matches every name.
+        :param limit: The most NEOs to find, or None for all of them.
+        :return: A list of NEO ids, in order of (case-folded) name, then id.
+        """
+        key = fold(prefix)
+        start = bisect.bisect_left(self._keys, key)
+        stop = bisect.bisect_left(self._keys, key + _LAST_CHARACTER, start)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return self._neos[start:stop].tolist()
+
+    def add(self, name, neo):
+        """Index the name of an NEO.
+
+        :param name: The name (or None, which isn't indexed).
+        :param neo: The NEO's id.
+        """
+        if not name:
+            return
+        key = fold(name)
+        start = bisect.bisect_left(self._keys, key)
+        stop = bisect.bisect_right(self._keys, key, start)
+        # Among equal names, keep the ids in ascending order.
+        position = start + bisect.bisect_right(self._neos[start:stop], neo)
+        self._keys.insert(position, key)
+        self._neos.insert(position, neo)
+
+    def discard(self, name, neo):
+        """Stop indexing the name of an NEO, if it's indexed.
+
+        :param name: The name it was indexed under.
+        :param neo: The NEO's id.
+        """
+        if not name:
+            return
+        key = fold(name)
+        start = bisect.bisect_left(self._keys, key)
+        stop = bisect.bisect_right(self._keys, key, start)
+        for position in range(start, stop):
+            if self._neos[position] == neo:
+                del self._keys[position]
+                del self._neos[position]
+                return
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(names={len(self)})"
+
+
+# The least similarity - the trigrams two texts share, out of all the trigrams
+# of either - that a `TrigramIndex` reports by default.
+DEFAULT_THRESHOLD = 0.25
+
+
+def trigrams(text):
+    """Split a case-folded text into the set of its three-character sequences.
+
+    The text is padded with two spaces in front and one behind, so that even a
+    one-character text has a trigram, and matching starts count for more.
+
+    :param text: A case-folded text.
+    :return: A set of strings of three characters.
+    """
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """An inverted index from trigrams to the texts that contain them, for fuzzy lookups.
+
+    Each text is indexed under an id (such as an NEO's row); several texts may
+    share an id - an NEO's name and designation, say - and a search reports
+    each id once, with the score of its most similar text.
+    """
+    def __init__(self, entries=()):
+        """Create a new `TrigramIndex`.
+
+        :param entries: An iterable of `(text, id)` pairs; texts that are empty or None aren't indexed.
+        """
+        self._texts = []
+        self._ids = array.array('q')
+        # The number of distinct trigrams in each text.
+        self._sizes = array.array('q')
+        postings = {}
+        for text, ident in entries:
+            if not text:
+                continue
+            entry = len(self._texts)
+            folded = fold(text)
+            self._texts.append(folded)
+            self._ids.append(ident)
+            split = trigrams(folded)
+            self._sizes.append(len(split))
+            for trigram in split:
+                postings.setdefault(trigram, []).append(entry)
+        # Each posting list holds the entries with a trigram, in ascending order.
+        self._postings = {trigram: array.array('q', entries) for trigram, entries in postings.items()}
+
+    def __len__(self):
+        """Return the number of indexed texts."""
+        return len(self._texts) - self._texts.count(None)
+
+    def add(self, text, ident):
+        """Index one more text under an id."""
+        if not text:
+            return
+        entry = len(self._texts)
+        folded = fold(text)
+        self._texts.append(folded)
+        self._ids.append(ident)
+        split = trigrams(folded)
+        self._sizes.append(len(split))
+        for trigram in split:
+            self._postings.setdefault(trigram, array.array('q')).append(entry)
+
+    def discard(self, text, ident):
+        """Stop finding a text under an id, if it's indexed.
+
+        The text's postings stay behind, but are ignored from then on.
+        """
+        if not text:
+            return
+        folded = fold(text)
+        for entry in self._postings.get(next(iter(trigrams(folded))), ()):
+            if self._texts[entry] == folded and self._ids[entry] == ident:
+                self._texts[entry] = None
+                return
+
+    def search(self, query, limit=10, threshold=DEFAULT_THRESHOLD):
+        """Find the ids of the texts most similar to a query.
+
+        The trigrams each text shares with the query are counted straight from
+        the query's posting lists - with `numpy.bincount`, if NumPy is
+        available. Otherwise, as a text at least `threshold` similar to the
+        query shares at least `ceil(threshold * len(query_trigrams))` of them,
+        so must contain one of the rest - the rarest ones - only the texts in
+        the posting lists of those rarest trigrams are scored, and the longer
+        posting lists are only searched for them.
+
+        :param query: The text to look for, such as a misspelled name.
+        :param limit: The most ids to report.
+        :param threshold: The least similarity to report, between 0 (exclusive) and 1.
+        :return: A list of `(id, similarity)` pairs, most similar first (ties in order of id).
+        """
+        wanted = trigrams(fold(query))
+        postings = [self._postings[trigram] for trigram in wanted if trigram in self._postings]
+        if not postings or limit < 1:
+            return []
+        if numpy is not None:
+            ranked = self._rank_numpy(len(wanted), postings, threshold)
+        else:
+            ranked = self._rank_python(len(wanted), postings, threshold)
+
+        # Report each id once, with the score of its most similar text.
+        texts, ids = self._texts, self._ids
+        best = {}
+        for entry, score in ranked:
+            if texts[entry] is None:
+                continue
+            ident = ids[entry]
+            if ident not in best:
+                best[ident] = score
+                if len(best) == limit:
+                    break
+        return sorted(best.items(), key=lambda pair: (-pair[1], pair[0]))
+
+    def _rank_python(self, size, postings, threshold):
+        """List the `(entry, similarity)` pairs at least `threshold` similar to a query, best first."""
+        needed = max(1, math.ceil(threshold * size))
+        postings.sort(key=len)
+        rarest = size - needed + 1
+        shared = collections.Counter()
+        for posting in postings[:rarest]:
+            shared.update(posting)
+        # Only the candidates need counting in the longer lists: walk a list if
+        # it's shorter than the candidates, and otherwise bisect it for each one.
+        for posting in postings[rarest:]:
+            if len(posting) <= len(shared):
+                for entry in posting:
+                    if entry in shared:
+                        shared[entry] += 1
+                continue
+            for entry in shared:
+                position = bisect.bisect_left(posting, entry)
+                if position < len(posting) and posting[position] == entry:
+                    shared[entry] += 1
+
+        sizes, ids = self._sizes, self._ids
+        scored = []
+        for entry, count in shared.items():
+            score = count / (size + sizes[entry] - count)
+            if score >= threshold:
+                scored.append((-score, ids[entry], entry))
+        scored.sort()
+        return [(entry, -score) for score, _ident, entry in scored]
+
+    def _rank_numpy(self, size, postings, threshold):
+        """As `_rank_python`, but counting the shared trigrams of every text at once with NumPy."""
+        entries = numpy.concatenate([numpy.frombuffer(posting, dtype=numpy.int64) for posting in postings])
+        shared = numpy.bincount(entries, minlength=len(self._texts))
+        scores = shared / (size + numpy.frombuffer(self._sizes, dtype=numpy.int64) - shared)
+        found = numpy.flatnonzero(scores >= threshold)
+        found = found[numpy.lexsort((numpy.frombuffer(self._ids, dtype=numpy.int64)[found], -scores[found]))]
+        return zip(found.tolist(), scores[found].tolist())
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(texts={len(self)}, trigrams={len(self._postings)})"
@@ -0,0 +1,513 @@
+"""Plan how an `NEODatabase` answers a query.
+
+A query is a collection of column conditions (see `NEODatabase._conditions`)
+plus any filters that can only be called on `CloseApproach` objects. There is
+more than one way to find the rows that satisfy the conditions:
+
+- a full scan, which checks every row of the approach store;
+- an index scan, which bisects the `SortedIndex` of one column for the rows
+  within a range, and checks the other conditions over just those rows;
+- an NEO-first scan, which picks the NEOs whose diameter and hazardous flag
+  qualify (from sorted indexes over the NEOs), and checks the other
+  conditions over just their approaches;
+- a box search, which finds the rows within ranges on several columns at
+  once from a `KDTree`, and checks the other conditions over just those rows;
+- a day lookup, which gathers the rows of the whole days that a date filter
+  (or a pair of them) covers from a `DayIndex`, one bucket per day.
+
+Any of these may also intersect its rows with the `bitmaps.Bitmap`s of the
+hazardous and diameter flags (see `bitmaps.flag_for`): a hazardous condition
+is then answered outright, and a diameter condition is only checked over the
+rows whose diameter is known.
+
+The `plan_query` function estimates the cost of each of these from the
+`ColumnStats` collected when the database is built, and returns the cheapest
+as a `Plan`. The conditions that the access path doesn't answer are ordered
+from most to least selective, so that a row-at-a-time check gives up on a row
+as early as possible.
+
+A query whose results are wanted in order of a column (and usually only the
+first few of them) can additionally be answered by an ordered walk, which
+follows the column's `SortedIndex` from one end and stops after enough rows
+match; `plan_order` weighs that against sorting the results of the plan.
+"""
+import bisect
+import datetime
+import functools
+import itertools
+import math
+import operator
+
+from bitmaps import flag_for
+from indexes import RANGE_OPS, day_span, range_bounds
+
+
+# The number of buckets in the histogram of a column.
+_HISTOGRAM_BINS = 64
+
+# The columns that belong to an approach's NEO rather than to the approach.
+NEO_COLUMNS = ('diameter', 'hazardous')
+
+# Relative costs, in units of checking one condition on one row of a scan.
+_ROW_COST = 1.0
+_VECTOR_ROW_COST = 0.05
+_GATHER_COST = 2.0
+_VECTOR_GATHER_COST = 1.0
+_NODE_COST = 30.0
+_VECTOR_CALL_COST = 50.0
+_CHUNK_COST = 40.0
+_BITMAP_ROW_COST = 1.0
+_VECTOR_BITMAP_ROW_COST = 0.1
+_BIT_COST = 0.015
+_BUCKET_COST = 1.0
+
+# The rows in each chunk of a `bitmaps.Bitmap`, and the most rows a chunk keeps as an array rather than a bitset.
+_CHUNK_ROWS = 1 << 16
+_MAX_ARRAY = 4096
+
+
+class ColumnStats:
+    """Summary statistics of a numeric column: its range and an equi-width histogram.
+
+    Values that are NaN are left out of the histogram, but still count towards
+    the `total`, since they can't satisfy any condition.
+    """
+    def __init__(self, keys, total, integer=False, cumulative=None, bins=_HISTOGRAM_BINS):
+        """Summarize a column from its sorted values.
+
+        :param keys: The non-NaN values of the column, in sorted order.
+        :param total: The total weight of the column (by default, its number of rows).
+        :param integer: Whether the column only holds integers.
+        :param cumulative: The running total of the weights of `keys`, or None if each weighs 1.
+        :param bins: The number of buckets in the histogram.
+        """
+        self.total = total
+        self.integer = integer
+        if not len(keys):
+            self.minimum = self.maximum = None
+            self.edges, self.counts = [], []
+            return
+        self.minimum, self.maximum = keys[0], keys[-1]
+
+        if integer:
+            # Buckets are half-open [edge, next edge), so value `v` spans [v, v + 1).
+            width = max(1, math.ceil((self.maximum + 1 - self.minimum) / bins))
+            self.edges = list(range(self.minimum, self.maximum + width + 1, width))
+            positions = [bisect.bisect_left(keys, edge) for edge in self.edges]
+        elif self.minimum == self.maximum:
+            self.edges = [self.minimum, self.maximum]
+            positions = [0, len(keys)]
+        else:
+            width = (self.maximum - self.minimum) / bins
+            self.edges = [self.minimum + i * width for i in range(bins)] + [self.maximum]
+            positions = [bisect.bisect_left(keys, edge) for edge in self.edges[:-1]] + [len(keys)]
+
+        def weight(position):
+            if cumulative is None:
+                return position
+            return cumulative[position - 1] if position else 0
+        self.counts = [weight(stop) - weight(start) for start, stop in zip(positions, positions[1:])]
+
+    @classmethod
+    def from_values(cls, values, weights=None, total=None, integer=False):
+        """Summarize a column from its values, in any order.
+
+        :param values: An iterable of the column's values.
+        :param weights: An iterable of one weight per value, or None if each weighs 1.
+        :param total: The total weight to measure selectivity against, if not the sum of the weights.
+        :param integer: Whether the column only holds integers.
+        :return: A `ColumnStats`.
+        """
+        weights = itertools.repeat(1) if weights is None else weights
+        pairs = list(zip(values, weights))
+        if total is None:
+            total = sum(weight for _value, weight in pairs)
+        pairs = sorted(pair for pair in pairs if pair[0] == pair[0])
+        keys = [value for value, _weight in pairs]
+        cumulative = list(itertools.accumulate(weight for _value, weight in pairs))
+        return cls(keys, total, integer=integer, cumulative=cumulative)
+
+    def add(self, value, weight=1):
+        """Count a new value (of the given weight) into the statistics.
+
+        A value outside the histogram's range widens the range, and is counted
+        in the bucket at that end.
+        """
+        self.total += weight
+        if value != value:
+            return
+        if not self.counts:
+            self.minimum = self.maximum = value
+            self.edges = [value, value + 1] if self.integer else [value, value]
+            self.counts = [weight]
+            return
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.counts[self._bucket(value)] += weight
+
+    def discard(self, value, weight=1):
+        """Take a value (of the given weight) that was counted before out of the statistics."""
+        self.total -= weight
+        if value != value or not self.counts:
+            return
+        bucket = self._bucket(value)
+        self.counts[bucket] = max(0, self.counts[bucket] - weight)
+
+    def _bucket(self, value):
+        """Return the index of the bucket that counts a value."""
+        return max(0, min(bisect.bisect_right(self.edges, value) - 1, len(self.counts) - 1))
+
+    def selectivity(self, lower=None, lower_inclusive=True, upper=None, upper_inclusive=True):
+        """Estimate the fraction of the column whose values lie within a range.
+
+        Values are assumed to be spread evenly within each bucket.
+
+        :return: A fraction between 0 and 1.
+        """
+        if not self.total or not self.counts:
+            return 0.0
+        if self.integer:
+            low = -math.inf if lower is None else (math.ceil(lower) if lower_inclusive else math.floor(lower) + 1)
+            high = math.inf if upper is None else (math.floor(upper) + 1 if upper_inclusive else math.ceil(upper))
+        else:
+            low = -math.inf if lower is None else lower
+            high = math.inf if upper is None else upper
+        if high < low or low > self.maximum or high < self.minimum:
+            return 0.0
+        if not self.integer and (low == high or self.minimum == self.maximum):
+            # A point (or a constant column) - count the bucket holding it.
+            index = min(bisect.bisect_right(self.edges, max(low, self.minimum)) - 1, len(self.counts) - 1)
+            matched = self.counts[index] if self.minimum == self.maximum else min(1, self.counts[index])
+            return min(1.0, matched / self.total)
+
+        matched = 0.0
+        for start, stop, count in zip(self.edges, self.edges[1:], self.counts):
+            overlap = min(high, stop) - max(low, start)
+            if overlap > 0:
+                matched += count * overlap / (stop - start)
+        return min(1.0, matched / self.total)
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(min={self.minimum!r}, max={self.maximum!r}, "
+                f"total={self.total!r}, bins={len(self.counts)})")
+
+
+class Plan:
+    """How a query is answered: an access path and the checks that follow it.
+
+    :param access: One of 'scan', 'index', 'neo', 'box', 'day' or 'walk'.
+    :param column: The indexed column of an 'index', 'day' or 'walk' plan, or None.
+    :param bounds: The `range_bounds` answered by the access path - for a 'box'
+                   plan, a dictionary mapping each column to its `range_bounds`,
+                   and for a 'day' plan, the `(first, last)` day ordinals - or None.
+    :param used: The conditions answered by the access path.
+    :param checks: A list of `(condition, selectivity)` pairs still to check, most selective first.
+    :param filters: The filters that must be called on each `CloseApproach`.
+    :param estimate: The estimated number of rows the access path produces.
+    :param total: The number of rows in the approach store.
+    :param cost: The estimated cost of the plan.
+    :param workers: The number of worker processes that share a 'scan'.
+    :param flags: A list of `(flag, fraction)` pairs - the flag bitmaps that
+                  the rows from the access path are intersected with, and the
+                  fraction of all rows in each - or None. A 'scan' with flags
+                  lists the rows of their bitmaps instead of scanning.
+
+    The `order` attribute is None, or the `(column, reverse, limit)` that the
+    results are wanted in (see `plan_order`).
+    """
+    def __init__(self, access, column, bounds, used, checks, filters, estimate, total, cost, workers=1,
+                 flags=None):
+        self.access = access
+        self.column = column
+        self.bounds = bounds
+        self.used = used
+        self.checks = checks
+        self.filters = filters
+        self.estimate = estimate
+        self.total = total
+        self.cost = cost
+        self.workers = workers
+        self.flags = flags or []
+        self.order = None
+
+    @property
+    def conditions(self):
+        """The conditions still to check, most selective first."""
+        return [condition for condition, _selectivity in self.checks]
+
+    @property
+    def matches(self):
+        """The estimated number of rows that satisfy every condition."""
+        fractions = itertools.chain((sel for _condition, sel in self.checks),
+                                    (fraction for _flag, fraction in self.flags))
+        return self.estimate * functools.reduce(operator.mul, fractions, 1.0)
+
+    def __str__(self):
+        if self.access == 'scan' and self.workers > 1:
+            head = f"parallel full scan ({self.workers} workers)"
+        elif self.access == 'scan' and self.flags:
+            head = "bitmap scan"
+        elif self.access == 'scan':
+            head = "full scan"
+        elif self.access == 'index':
+            head = f"index scan on {self.column} ({_describe(self.used)})"
+        elif self.access == 'walk':
+            details = ['descending' if self.order[1] else 'ascending']
+            if self.used:
+                details.append(_describe(self.used))
+            head = f"ordered walk of the {self.column} index ({', '.join(details)})"
+        elif self.access == 'box':
+            head = f"k-d tree box search ({_describe(self.used)})"
+        elif self.access == 'day':
+            first, last = (datetime.date.fromordinal(day) for day in self.bounds)
+            days = first.isoformat() if first == last else f"{first.isoformat()} to {last.isoformat()}"
+            head = f"day bucket lookup ({days})"
+        else:
+            head = f"NEO-first scan ({_describe(self.used)})"
+        lines = [f"{head}: ~{round(self.estimate)} of {self.total} rows (cost {self.cost:.0f})"]
+        for flag, fraction in self.flags:
+            lines.append(f"  intersect the {flag!r} bitmap (~{fraction:.1%})")
+        for condition, selectivity in self.checks:
+            lines.append(f"  check {_describe([condition])} (~{selectivity:.1%})")
+        if self.filters:
+            lines.append(f"  then call {len(self.filters)} other filter(s)")
+        if self.access == 'walk':
+            lines.append(f"  stop after {self.order[2]} matches")
+        elif self.order is not None:
+            column, reverse, limit = self.order
+            direction = " (descending)" if reverse else ""
+            if limit:
+                lines.append(f"  then keep the top {limit} by {column}{direction} with a bounded heap")
+            else:
+                lines.append(f"  then sort by {column}{direction}")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(access={self.access!r}, column={self.column!r}, "
+                f"estimate={self.estimate!r}, cost={self.cost!r})")
+
+
+_OP_SYMBOLS = {'eq': '==', 'ge': '>=', 'gt': '>', 'le': '<=', 'lt': '<', 'ne': '!='}
+
+
+def _describe(conditions):
+    """Describe a list of column conditions, for humans."""
+    return ', '.join(f"{column} {_OP_SYMBOLS.get(op.__name__, op.__name__)} {value!r}"
+                     for column, op, value in conditions)
+
+
+def condition_selectivity(condition, stats):
+    """Estimate the fraction of approach rows that satisfy a column condition.
+
+    :param condition: A `(column, op, value)` condition.
+    :param stats: A dictionary mapping column names to `ColumnStats`.
+    :return: A fraction between 0 and 1 (1 if there are no statistics for the column).
+    """
+    column, op, _value = condition
+    if column not in stats or op not in RANGE_OPS:
+        return 1.0
+    return stats[column].selectivity(*range_bounds([condition]))
+
+
+def narrowest_index(indexes, conditions):
+    """Find the index that narrows down a set of conditions the most.
+
+    :param indexes: A dictionary mapping column names to `SortedIndex`es.
+    :param conditions: A list of column conditions.
+    :return: A tuple `(column, bounds, used, count)` of the chosen column, its
+             `range_bounds`, the conditions on it, and the number of rows
+             within the bounds - or None if no condition is on an indexed column.
+    """
+    best = None
+    for column, index in indexes.items():
+        used = [condition for condition in conditions
+                if condition[0] == column and condition[1] in RANGE_OPS]
+        if not used:
+            continue
+        bounds = range_bounds(used)
+        count = index.count(*bounds)
+        if best is None or count < best[3]:
+            best = (column, bounds, used, count)
+    return best
+
+
+def _check_cost(rows, selectivities, vectorized):
+    """Estimate the cost of checking conditions of the given selectivities over some rows."""
+    if vectorized:
+        return rows * _VECTOR_ROW_COST * len(selectivities)
+    # Row by row, each check only runs on the rows that passed the ones before it.
+    cost, passing = 0.0, float(rows)
+    for selectivity in selectivities:
+        cost += passing * _ROW_COST
+        passing *= selectivity
+    return cost
+
+
+def plan_query(conditions, filters, stats, indexes, total, neo_count, vectorized, neo_indexes=None,
+               box_index=None, flag_bitmaps=None, day_index=None):
+    """Choose the cheapest way to answer a query.
+
+    :param conditions: A list of column conditions.
+    :param filters: A list of filters that must be called on each `CloseApproach`.
+    :param stats: A dictionary mapping column names to `ColumnStats` (see `NEODatabase._collect_stats`).
+    :param indexes: A dictionary mapping column names to `SortedIndex`es over the approach store.
+    :param total: The number of rows in the approach store.
+    :param neo_count: The number of NEOs.
+    :param vectorized: Whether the conditions are checked with NumPy masks.
+    :param neo_indexes: A dictionary mapping NEO column names to `SortedIndex`es over the NEOs.
+    :param box_index: A `KDTree` over some columns of the approach store, or
+                      None; only worth searching when conditions bound two or more of them.
+    :param flag_bitmaps: The `bitmaps.FlagBitmaps` of the approach store, or None.
+    :param day_index: A `DayIndex` over the time column of the approach store, or None.
+    :return: The cheapest `Plan`.
+    """
+    selectivity = {condition: condition_selectivity(condition, stats) for condition in conditions}
+    flagged = {}
+    fractions = {}
+    if flag_bitmaps is not None:
+        for condition in conditions:
+            found = flag_for(condition)
+            if found is not None:
+                flagged[condition] = found
+                fractions[found[0]] = len(flag_bitmaps[found[0]]) / total if total else 0.0
+
+    def make_plan(access, column, bounds, used, estimate, access_cost, ranged=False):
+        remaining = [condition for condition in conditions if condition not in used]
+        checks = sorted(((condition, selectivity[condition]) for condition in remaining),
+                        key=lambda check: check[1])
+        cost = access_cost + _check_cost(estimate, [sel for _condition, sel in checks], vectorized)
+        plan = Plan(access, column, bounds, used, checks, filters, estimate, total, cost)
+        flags = list(dict.fromkeys(flagged[condition][0] for condition in remaining if condition in flagged))
+        if not flags:
+            return plan
+
+        # The rows are intersected with the flags' bitmaps before the remaining conditions are checked.
+        kept = estimate * functools.reduce(operator.mul, (fractions[flag] for flag in flags))
+        checks = []
+        for condition in remaining:
+            flag, exact = flagged.get(condition, (None, False))
+            if exact:
+                continue
+            sel = selectivity[condition]
+            if flag is not None:
+                # Only rows with the flag are left, and they hold every row that satisfies the condition.
+                sel = min(1.0, sel / fractions[flag]) if fractions[flag] else 0.0
+            checks.append((condition, sel))
+        checks.sort(key=lambda check: check[1])
+        # Bitmaps are combined a chunk at a time, but the offsets in a sparse chunk one at a time.
+        row_cost = _VECTOR_BITMAP_ROW_COST if vectorized else _BITMAP_ROW_COST
+        covered = min(total, (estimate // _CHUNK_ROWS + 1) * _CHUNK_ROWS)  # The rows of the chunks spanned.
+        cost = access_cost + _check_cost(kept, [sel for _condition, sel in checks], vectorized)
+        dense = False
+        for flag in flags:
+            cost += math.ceil(covered / _CHUNK_ROWS) * _CHUNK_COST
+            if fractions[flag] * min(total, _CHUNK_ROWS) <= _MAX_ARRAY:
+                cost += covered * fractions[flag] * row_cost
+            else:
+                dense = True
+        # A range of rows is listed from the combined bitmap - every bit of a
+        # bitset is looked at - while other rows are probed one by one.
+        if ranged:
+            cost += kept * row_cost + (covered * _BIT_COST if dense else 0.0)
+        else:
+            cost += estimate * row_cost
+        if cost >= plan.cost:
+            return plan
+        return Plan(access, column, bounds, used, checks, filters, estimate, total, cost,
+                    flags=[(flag, fractions[flag]) for flag in flags])
+
+    plans = [make_plan('scan', None, None, [], total, 0.0, ranged=True)]
+
+    for column, index in indexes.items():
+        used = [condition for condition in conditions
+                if condition[0] == column and condition[1] in RANGE_OPS]
+        if not used:
+            continue
+        bounds = range_bounds(used)
+        count = index.count(*bounds)
+        # A presorted column yields a range of rows; otherwise the rows must be sorted back into order.
+        gather = 0.0 if index.order is None else _GATHER_COST
+        plans.append(make_plan('index', column, bounds, used, count,
+                               math.log2(total + 1) + count * gather, ranged=index.order is None))
+
+    used = [condition for condition in conditions if condition[0] in NEO_COLUMNS]
+    if used:
+        estimate = total * functools.reduce(operator.mul, (selectivity[condition] for condition in used))
+        # Only the NEOs within the narrowest NEO index span are checked, one at a time.
+        found = narrowest_index(neo_indexes or {}, used)
+        neos = neo_count if found is None else found[3]
+        plans.append(make_plan('neo', None, None, used, estimate,
+                               math.log2(neo_count + 1) + neos * _ROW_COST * len(used)
+                               + estimate * _GATHER_COST))
+
+    if box_index is not None:
+        used = [condition for condition in conditions
+                if condition[0] in box_index.names and condition[1] in RANGE_OPS]
+        columns = sorted({column for column, _op, _value in used})
+        if len(columns) > 1:
+            box = {column: range_bounds(condition for condition in used if condition[0] == column)
+                   for column in columns}
+            matches, checked, visited = box_index.estimate(box)
+            if vectorized:
+                # About half the nodes visited are leaves to check, with a couple of NumPy calls per column.
+                cost = (visited * (_NODE_COST + len(columns) * _VECTOR_CALL_COST)
+                        + checked * _VECTOR_ROW_COST * len(columns) + matches * _VECTOR_GATHER_COST)
+            else:
+                cost = visited * _NODE_COST + checked * _ROW_COST * len(columns) + matches * _GATHER_COST
+            plans.append(make_plan('box', None, box, used, matches, cost))
+
+    used = [condition for condition in conditions if condition[0] == 'time' and condition[1] in RANGE_OPS]
+    span = day_span(*range_bounds(used)) if day_index is not None and used else None
+    # Looking up more days than it takes to bisect the time index never pays.
+    if span is not None and not ('time' in indexes
+                                 and day_index.probes(*span) * _BUCKET_COST >= math.log2(total + 1)):
+        count = day_index.count(*span)
+        # Out of time order, the rows of several days must be merged back into order.
+        gather = 0.0 if day_index.presorted or span[0] == span[1] else _GATHER_COST
+        plans.append(make_plan('day', 'time', span, used, count,
+                               day_index.probes(*span) * _BUCKET_COST + count * gather,
+                               ranged=day_index.presorted))
+
+    return min(plans, key=lambda plan: plan.cost)
+
+
+def plan_order(plan, conditions, column, reverse, limit, stats, indexes):
+    """Choose how to produce the results of a query in order of a column.
+
+    Either the results of `plan` are put in order afterwards - with a bounded
+    heap when only the first `limit` are wanted, in O(n log limit) time - or,
+    when only the first `limit` are wanted and the column has an index, the
+    index is walked in order, checking every condition row by row, until
+    `limit` rows match. The walk wins when matches are common, since it then
+    stops early.
+
+    :param plan: The `Plan` from `plan_query` for the same conditions.
+    :param conditions: A list of column conditions.
+    :param column: The column to order the results by.
+    :param reverse: Whether to put the largest values first.
+    :param limit: The number of results wanted, or None (or 0) for all of them.
+    :param stats: A dictionary mapping column names to `ColumnStats`.
+    :param indexes: A dictionary mapping column names to `SortedIndex`es over the approach store.
+    :return: The cheaper `Plan`, with its `order` set.
+    """
+    order = (column, reverse, limit)
+    plan.order = order
+    matches = plan.matches
+    plan.cost += matches * math.log2((limit or matches) + 1) * _ROW_COST
+    if not limit or column not in indexes:
+        return plan
+
+    used = [condition for condition in conditions if condition[0] == column and condition[1] in RANGE_OPS]
+    bounds = range_bounds(used)
+    count = indexes[column].count(*bounds)
+    # Matches are assumed to be spread evenly over the rows within the bounds.
+    walked = count if matches <= limit else count * limit / matches
+    checks = sorted(((condition, condition_selectivity(condition, stats)) for condition in conditions
+                     if condition not in used), key=lambda check: check[1])
+    cost = (math.log2(plan.total + 1) + walked * _ROW_COST
+            + _check_cost(walked, [sel for _condition, sel in checks], False))
+    if cost >= plan.cost:
+        return plan
+    walk = Plan('walk', column, bounds, used, checks, plan.filters, walked, plan.total, cost)
+    walk.order = order
+    return walk
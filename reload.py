@@ -0,0 +1,216 @@
+"""Follow changes to the data files from a long-running interactive session.
+
+A `Reloader` watches the NEO and close approach data files that a database was
+loaded from. Once either of them changes, `start` parses the files again in a
+background thread - the old database keeps answering queries meanwhile - and
+compares the fresh data with the database:
+
+- If records were only added or corrected, the result is the delta, which
+  `Update.apply` hands to `NEODatabase.add_neos` and `add_approach_records`.
+  Applying a delta takes time proportional to its size, not to the data set.
+- If records were removed (or the data can't be compared record by record),
+  the background thread builds a whole new database instead, and
+  `Update.apply` simply returns it in place of the old one.
+
+The caller polls for the result and applies it between commands, so a query
+never sees a half-updated database.
+"""
+import itertools
+import os
+import threading
+
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from snapshot import snapshot_path, write_snapshot
+from store import NO_NEO
+
+
+class Update:
+    """The outcome of reloading the data files.
+
+    Exactly one of `database` (a rebuilt `NEODatabase`) and the pair `neos`
+    and `records` (the NEOs and close approach records that were added or
+    corrected) is set.
+    """
+    def __init__(self, database=None, neos=None, records=None):
+        self.database = database
+        self.neos = neos
+        self.records = records
+
+    def apply(self, database):
+        """Bring a database up to date.
+
+        :param database: The `NEODatabase` that the reload started from.
+        :return: The up-to-date `NEODatabase` - either `database` itself, updated in place, or a new one.
+        """
+        if self.database is not None:
+            return self.database
+        database.add_neos(self.neos)
+        database.add_approach_records(self.records)
+        return database
+
+    def __str__(self):
+        if self.database is not None:
+            return "rebuilt the database from scratch"
+        return f"applied {len(self.neos)} changed NEOs and {len(self.records)} changed close approaches"
+
+
+def _same(a, b):
+    """Compare two values, where NaN is the same as NaN."""
+    return a == b or (a != a and b != b)
+
+
+def diff_neos(database, neos):
+    """Find the NEOs that were added or corrected since a database was loaded.
+
+    :param database: An `NEODatabase`.
+    :param neos: The freshly loaded collection of `NearEarthObject`s.
+    :return: A list of new and corrected NEOs, or None if some NEO was removed.
+    """
+    changed = []
+    seen = 0
+    for neo in neos:
+        old = database.NEO_des.get(neo.designation)
+        if old is None:
+            changed.append(neo)
+            continue
+        seen += 1
+        if not (old.name == neo.name and _same(old.diameter, neo.diameter) and old.hazardous == neo.hazardous):
+            changed.append(neo)
+    if seen < len(database.NEO_des):
+        return None
+    return changed
+
+
+def diff_records(database, records):
+    """Find the close approach records that were added or corrected since a database was loaded.
+
+    The fresh records are compared with the stored rows in order, which is
+    cheap while they agree - as they do when new records are appended to the
+    data file. From the first disagreement on, the remaining rows are looked
+    up by designation and time.
+
+    :param database: An `NEODatabase`.
+    :param records: The freshly loaded (designation, minutes, distance, velocity) records.
+    :return: A list of new and corrected records, or None if some record was removed.
+    """
+    store = database._store
+    neos = database._neos
+
+    def stored(row):
+        neo = store.neo[row]
+        designation = store.orphans[row] if neo == NO_NEO else neos[neo].designation
+        return designation, store.time[row], store.distance[row], store.velocity[row]
+
+    count = len(store)
+    records = iter(records)
+    position = 0
+    for record in records:
+        if position < count and tuple(record) == stored(position):
+            position += 1
+            continue
+        records = itertools.chain([record], records)
+        break
+    else:
+        return [] if position == count else None
+
+    remaining = {}
+    for row in range(position, count):
+        designation, minutes, distance, velocity = stored(row)
+        remaining[designation, minutes] = (distance, velocity)
+    if len(remaining) < count - position:
+        # Duplicate (designation, time) pairs can't be matched up one to one.
+        return None
+
+    changed = []
+    for record in records:
+        designation, minutes, distance, velocity = record
+        old = remaining.pop((designation, minutes), None)
+        if old is None or not (_same(old[0], distance) and _same(old[1], velocity)):
+            changed.append(record)
+    if remaining:
+        return None
+    return changed
+
+
+def _signature(path):
+    """Describe the state of a file cheaply, by its size and modification time."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Reloader:
+    """Watch a pair of data files, and reload them in the background when they change."""
+    def __init__(self, neofile, cadfile, cache=True, jobs=1):
+        """Start watching the data files that a database was just loaded from.
+
+        :param neofile: Path to the CSV file of near-Earth objects.
+        :param cadfile: Path to the JSON file of close approach data.
+        :param cache: Whether to save a snapshot of a rebuilt database.
+        :param jobs: The number of worker processes to parse the data files with.
+        """
+        self.neofile = neofile
+        self.cadfile = cadfile
+        self.cache = cache
+        self.jobs = jobs
+        self._signatures = self._current_signatures()
+        self._thread = None
+        self._result = None
+
+    def _current_signatures(self):
+        return _signature(self.neofile), _signature(self.cadfile)
+
+    def changed(self):
+        """Check whether either data file has changed since it was last loaded."""
+        return self._current_signatures() != self._signatures
+
+    @property
+    def running(self):
+        """Whether a reload is in progress."""
+        return self._thread is not None
+
+    def start(self, database):
+        """Start reloading the data files in a background thread, unless already reloading.
+
+        :param database: The current `NEODatabase`, which is only read while reloading.
+        """
+        if self._thread is not None:
+            return
+        self._signatures = self._current_signatures()
+        self._result = None
+        self._thread = threading.Thread(target=self._reload, args=(database,), daemon=True)
+        self._thread.start()
+
+    def _reload(self, database):
+        """Parse the data files and compare them with the database (in the background thread)."""
+        try:
+            neos = load_neos(self.neofile, self.jobs)
+            records = list(load_approach_records(self.cadfile, self.jobs))
+            changed_neos = diff_neos(database, neos)
+            changed_records = None if changed_neos is None else diff_records(database, records)
+            if changed_records is not None:
+                self._result = Update(neos=changed_neos, records=changed_records)
+                return
+            rebuilt = NEODatabase.from_records(neos, records)
+            rebuilt.workers = database.workers
+            if self.cache:
+                write_snapshot(snapshot_path(self.neofile, self.cadfile), rebuilt, self.neofile, self.cadfile)
+            self._result = Update(database=rebuilt)
+        except Exception as err:  # Reported to the session by `poll`.
+            self._result = err
+
+    def poll(self):
+        """Collect the result of a finished reload.
+
+        :return: None if no reload has finished since the last poll; otherwise
+                 an `Update`, or the exception that the reload failed with.
+        """
+        if self._thread is None or self._thread.is_alive():
+            return None
+        self._thread.join()
+        self._thread = None
+        result, self._result = self._result, None
+        return result
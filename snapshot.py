@@ -0,0 +1,248 @@
+"""Cache parsed NEO and close approach data in a compact binary snapshot.
+
+Parsing `neos.csv` and `cad.json` from scratch takes seconds, which dominates
+the runtime of a single `inspect` or `query`. The `load_snapshot` function reads
+a previously written snapshot straight back into an `NEODatabase`, and
+`write_snapshot` saves the contents of one.
+
+A snapshot lives next to the NEO data file. It holds one binary column per
+attribute - designation, name, diameter and hazardous flag for NEOs, and the
+time, distance, velocity and NEO row index columns of the database's
+`store.ApproachStore` - preceded by a small JSON header. The header records the
+size, modification time and SHA-256 hash of both source files: a snapshot is
+used only if its sources are unchanged, and is otherwise treated as stale (and
+rebuilt by the caller).
+"""
+import array
+import hashlib
+import json
+import os
+import struct
+
+from database import NEODatabase
+from models import NearEarthObject
+from store import ApproachStore, NO_NEO
+
+
+# Bumped whenever the layout of the snapshot changes.
+_MAGIC = b'NEOSNAP2'
+_HEADER_LENGTH = struct.Struct('<I')
+
+# Separator for packed string columns. It can't occur in a designation or name.
+_SEPARATOR = '\x00'
+
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+def snapshot_path(neo_path, cad_path):
+    """Return where the snapshot for a pair of data files is kept.
+
+    :param neo_path: A path to the CSV file of near-Earth objects.
+    :param cad_path: A path to the JSON file of close approaches.
+    :return: A Path-like object next to `neo_path`.
+    """
+    return neo_path.parent / f'.{neo_path.name}+{cad_path.name}.snapshot'
+
+
+def _file_digest(path):
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    """Describe a source file by its size, modification time and content hash."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _file_digest(path)}
+
+
+def _is_fresh(fingerprint, path):
+    """Check whether a source file still matches the fingerprint recorded for it.
+
+    The size and modification time are checked first. The (comparatively
+    expensive) content hash is only recomputed when the modification time has
+    moved, so that a file which was merely touched or copied is still accepted.
+    The fingerprint then takes the new modification time, for the caller to
+    record, so that the file isn't hashed again next time.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != fingerprint['size']:
+        return False
+    if stat.st_mtime_ns == fingerprint['mtime_ns']:
+        return True
+    if _file_digest(path) != fingerprint['sha256']:
+        return False
+    fingerprint['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+
+def _pack_strings(strings):
+    """Pack a sequence of strings into one UTF-8 encoded byte column."""
+    return _SEPARATOR.join(strings).encode('utf-8')
+
+
+def _unpack_strings(data, count):
+    """Unpack a byte column produced by `_pack_strings` into a list of strings."""
+    if not count:
+        return []
+    return data.decode('utf-8').split(_SEPARATOR)
+
+
+def write_snapshot(path, database, neo_path, cad_path):
+    """Save the contents of an `NEODatabase` to a snapshot file.
+
+    The file is written to a temporary name and then moved into place, so a
+    concurrent reader never sees a half-written snapshot.
+
+    :param path: Where to write the snapshot.
+    :param database: A linked `NEODatabase`.
+    :param neo_path: The CSV file that the database's NEOs were loaded from.
+    :param cad_path: The JSON file that the database's close approaches were loaded from.
+    """
+    neos = database._neos
+    store = database._store
+    orphan_rows = sorted(store.orphans)
+
+    columns = [
+        ('designation', 'str', _pack_strings(neo.designation for neo in neos)),
+        ('name', 'str', _pack_strings(neo.name or '' for neo in neos)),
+        ('diameter', 'd', database._neo_diameter.tobytes()),
+        ('hazardous', 'b', database._neo_hazardous.tobytes()),
+        ('time', 'q', store.time.tobytes()),
+        ('distance', 'd', store.distance.tobytes()),
+        ('velocity', 'd', store.velocity.tobytes()),
+        ('neo', 'q', store.neo.tobytes()),
+        ('orphan', 'str', _pack_strings(store.orphans[row] for row in orphan_rows)),
+    ]
+    header = {
+        'sources': {'neo': _fingerprint(neo_path), 'cad': _fingerprint(cad_path)},
+        'counts': {'neo': len(neos), 'approach': len(store), 'orphan': len(orphan_rows)},
+        'columns': [(name, kind, len(data)) for name, kind, data in columns],
+    }
+    _write_file(path, header, [data for _name, _kind, data in columns])
+
+
+def _write_file(path, header, chunks):
+    """Write a snapshot file from its header and its columns' bytes, through a temporary file."""
+    encoded = json.dumps(header).encode('utf-8')
+    tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as outfile:
+            outfile.write(_MAGIC)
+            outfile.write(_HEADER_LENGTH.pack(len(encoded)))
+            outfile.write(encoded)
+            for data in chunks:
+                outfile.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Don't leave a half-written file behind.
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_snapshot(path, neo_path, cad_path):
+    """Load an `NEODatabase` from a snapshot, if it is still fresh.
+
+    The close approach columns are loaded straight into the database's
+    `ApproachStore`; no `CloseApproach` objects are built until they're needed.
+
+    A snapshot that can't be read - truncated, corrupted, or written with a
+    different layout - is treated like a missing one. If a source file was
+    touched but not changed, the snapshot is rewritten with its new
+    modification time, so that it isn't hashed on every load.
+
+    :param path: Where the snapshot is kept.
+    :param neo_path: The CSV file that the snapshot must have been built from.
+    :param cad_path: The JSON file that the snapshot must have been built from.
+    :return: A linked `NEODatabase`, or None if there is no usable snapshot.
+    """
+    try:
+        with open(path, 'rb') as infile:
+            data = infile.read()
+    except OSError:
+        return None
+    if not data.startswith(_MAGIC):
+        return None
+    try:
+        return _read_snapshot(path, data, neo_path, cad_path)
+    except (struct.error, KeyError, IndexError, TypeError, ValueError):
+        # UnicodeDecodeError and json.JSONDecodeError are ValueErrors too.
+        return None
+
+
+def _read_snapshot(path, data, neo_path, cad_path):
+    """Build an `NEODatabase` from the contents of a snapshot file (see `load_snapshot`).
+
+    :return: A linked `NEODatabase`, or None if the snapshot is stale.
+    :raise ValueError: If the columns don't match the sizes in the header.
+    """
+    offset = len(_MAGIC)
+    (length,) = _HEADER_LENGTH.unpack_from(data, offset)
+    offset += _HEADER_LENGTH.size
+    header = json.loads(data[offset:offset + length].decode('utf-8'))
+    offset += length
+
+    sources = header['sources']
+    recorded = [source['mtime_ns'] for source in sources.values()]
+    if not (_is_fresh(sources['neo'], neo_path) and _is_fresh(sources['cad'], cad_path)):
+        return None
+    touched = [source['mtime_ns'] for source in sources.values()] != recorded
+    body = offset
+
+    counts = header['counts']
+    view = memoryview(data)
+    columns = {}
+    for name, kind, nbytes in header['columns']:
+        chunk = view[offset:offset + nbytes]
+        offset += nbytes
+        if len(chunk) != nbytes:
+            raise ValueError(f"The snapshot's {name!r} column is truncated.")
+        if kind == 'str':
+            columns[name] = bytes(chunk)
+        else:
+            columns[name] = array.array(kind)
+            columns[name].frombytes(chunk)
+
+    designations = _unpack_strings(columns['designation'], counts['neo'])
+    names = _unpack_strings(columns['name'], counts['neo'])
+    sizes = {len(designations), len(names), len(columns['diameter']), len(columns['hazardous'])}
+    if sizes != {counts['neo']}:
+        raise ValueError("The snapshot's NEO columns don't match its header.")
+    sizes = {len(columns[name]) for name in ('time', 'distance', 'velocity', 'neo')}
+    if sizes != {counts['approach']}:
+        raise ValueError("The snapshot's close approach columns don't match its header.")
+
+    neo_rows = columns['neo']
+    if neo_rows and not NO_NEO <= min(neo_rows) <= max(neo_rows) < counts['neo']:
+        raise ValueError("The snapshot links close approaches to NEOs it doesn't have.")
+
+    neos = [
+        NearEarthObject(designation=designation, name=name,
+                        diameter=diameter, hazardous='Y' if hazardous else 'N')
+        for designation, name, diameter, hazardous
+        in zip(designations, names, columns['diameter'], columns['hazardous'])
+    ]
+
+    orphan_rows = [row for row, neo_row in enumerate(columns['neo']) if neo_row == NO_NEO]
+    orphan_designations = _unpack_strings(columns['orphan'], counts['orphan'])
+    if len(orphan_rows) != len(orphan_designations):
+        raise ValueError("The snapshot's orphaned close approaches don't match its header.")
+    orphans = dict(zip(orphan_rows, orphan_designations))
+    store = ApproachStore(time=columns['time'], distance=columns['distance'],
+                          velocity=columns['velocity'], neo=columns['neo'], orphans=orphans)
+    database = NEODatabase.from_store(neos, store)
+    if touched:
+        try:
+            _write_file(path, header, [view[body:]])
+        except OSError:
+            pass  # The snapshot is still good, if slower to check next time.
+    return database
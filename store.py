@@ -0,0 +1,87 @@
+"""Store close approaches column by column, in typed contiguous arrays.
+
+An `ApproachStore` keeps one `array.array` per attribute of a close approach -
+its time (as a count of minutes, see `helpers.datetime_to_minutes`), its
+nominal distance, its relative velocity, and the row index of its NEO - rather
+than one Python object per approach. A full scan over a column then walks a
+single block of memory instead of chasing a pointer to each object.
+
+The `NEODatabase` owns an `ApproachStore` and only builds `CloseApproach`
+objects for the rows that are actually handed out.
+"""
+import array
+import itertools
+
+
+# Stands in for a missing approach time in the `time` column.
+NO_TIME = -1
+
+# Stands in for a missing NEO in the `neo` column.
+NO_NEO = -1
+
+
+class ApproachStore:
+    """A struct-of-arrays table of close approaches.
+
+    Row `i` of the table is made up of `time[i]`, `distance[i]`, `velocity[i]`
+    and `neo[i]`. Approaches whose designation doesn't match any known NEO have
+    `neo[i] == NO_NEO`, and their designation is kept in `orphans`.
+    """
+    def __init__(self, time=None, distance=None, velocity=None, neo=None, orphans=None):
+        """Create a new `ApproachStore`, empty unless given existing columns.
+
+        :param time: An `array('q')` of approach times, in minutes.
+        :param distance: An `array('d')` of nominal approach distances, in au.
+        :param velocity: An `array('d')` of relative approach velocities, in km/s.
+        :param neo: An `array('q')` of NEO row indices.
+        :param orphans: A dictionary mapping rows without an NEO to their designations.
+        """
+        self.time = array.array('q') if time is None else time
+        self.distance = array.array('d') if distance is None else distance
+        self.velocity = array.array('d') if velocity is None else velocity
+        self.neo = array.array('q') if neo is None else neo
+        self.orphans = {} if orphans is None else orphans
+
+    def __len__(self):
+        """Return the number of rows in the table."""
+        return len(self.time)
+
+    def append(self, minutes, distance, velocity, neo, designation=None):
+        """Add a row to the end of the table.
+
+        :param minutes: The approach time, in minutes, or `NO_TIME`.
+        :param distance: The nominal approach distance, in au.
+        :param velocity: The relative approach velocity, in km/s.
+        :param neo: The row index of the approach's NEO, or `NO_NEO`.
+        :param designation: The approach's designation, only kept if `neo` is `NO_NEO`.
+        :return: The index of the new row.
+        """
+        row = len(self.time)
+        self.time.append(minutes)
+        self.distance.append(distance)
+        self.velocity.append(velocity)
+        self.neo.append(neo)
+        if neo == NO_NEO:
+            self.orphans[row] = designation
+        return row
+
+    def extend(self, minutes, distances, velocities, neos, designations):
+        """Add a batch of rows to the end of the table.
+
+        Each argument is a sequence with one entry per new row, as for `append`.
+
+        :return: The index of the first new row.
+        """
+        start = len(self.time)
+        self.time.extend(minutes)
+        self.distance.extend(distances)
+        self.velocity.extend(velocities)
+        self.neo.extend(neos)
+        if NO_NEO in neos:
+            missing = list(map(NO_NEO.__eq__, neos))
+            self.orphans.update(zip(itertools.compress(range(start, start + len(neos)), missing),
+                                    itertools.compress(designations, missing)))
+        return start
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(rows={len(self)}, orphans={len(self.orphans)})"
@@ -0,0 +1,111 @@
+"""Check that aggregates over the stored columns agree with folding the query results.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_aggregate
+"""
+import datetime
+import math
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def group_of(approach, group_by):
+    if group_by == 'year':
+        return approach.time.year
+    if group_by == 'month':
+        return approach.time.strftime('%Y-%m')
+    if group_by == 'hazardous':
+        return approach.neo.hazardous
+    if group_by == 'neo':
+        return approach.neo.designation
+    return None
+
+
+def value_of(approach, column):
+    return approach.neo.diameter if column == 'diameter' else getattr(approach, column)
+
+
+class TestAggregate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+
+    def tearDown(self):
+        self.db.__dict__.pop('engine', None)
+
+    def check(self, filters, column, group_by):
+        expected = {}
+        for approach in self.db.query(filters):
+            expected.setdefault(group_of(approach, group_by), []).append(approach)
+        summaries = self.db.aggregate(filters, column, group_by, bins=4)
+        self.assertEqual(set(summaries), set(expected))
+        for key, approaches in expected.items():
+            summary = summaries[key]
+            self.assertEqual(summary.count, len(approaches))
+            values = [value_of(approach, column) for approach in approaches]
+            values = [value for value in values if value == value]
+            self.assertEqual(summary.known, len(values))
+            self.assertEqual(sum(summary.histogram), len(values))
+            if values:
+                self.assertEqual(summary.minimum, min(values))
+                self.assertEqual(summary.maximum, max(values))
+                self.assertTrue(math.isclose(summary.mean, sum(values) / len(values)))
+        return summaries
+
+    def test_every_grouping_and_column_on_both_engines(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1), velocity_max=20)
+        for engine in ('python', 'numpy'):
+            for group_by in (None, 'year', 'month', 'hazardous', 'neo'):
+                for column in ('distance', 'velocity', 'diameter'):
+                    with self.subTest(engine=engine, group_by=group_by, column=column):
+                        self.db.engine = engine
+                        self.check(filters, column, group_by)
+
+    def test_groups_are_ordered(self):
+        months = list(self.db.aggregate(group_by='month'))
+        self.assertEqual(months, sorted(months))
+        self.assertEqual(months[0], '2020-01')
+
+    def test_count_only(self):
+        summary = self.db.aggregate(create_filters(hazardous=True))[None]
+        self.assertEqual(summary.count, len(list(self.db.query(create_filters(hazardous=True)))))
+        self.assertIsNone(summary.mean)
+        self.assertIsNone(summary.histogram)
+
+    def test_no_matches(self):
+        summary = self.db.aggregate(create_filters(velocity_min=1000), 'distance')[None]
+        self.assertEqual((summary.count, summary.known, summary.minimum), (0, 0, None))
+        self.assertEqual(self.db.aggregate(create_filters(velocity_min=1000), group_by='year'), {})
+
+    def test_unknown_column_or_grouping(self):
+        with self.assertRaises(ValueError):
+            self.db.aggregate(column='name')
+        with self.assertRaises(ValueError):
+            self.db.aggregate(group_by='day')
+
+
+class TestCount(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+
+    def test_count_agrees_with_query(self):
+        for kwargs in ({}, {'date': datetime.date(2020, 3, 2)}, {'distance_max': 0.1},
+                       {'distance_max': 0.1, 'hazardous': True}, {'diameter_min': 1}):
+            with self.subTest(**kwargs):
+                filters = create_filters(**kwargs)
+                self.assertEqual(self.db.count(filters), len(list(self.db.query(filters))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+"""Check the compressed bitmaps against sets of rows, and the flag bitmaps against filters on the NEOs.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_bitmaps
+"""
+import datetime
+import math
+import pathlib
+import random
+import unittest
+from unittest import mock
+
+import bitmaps
+from bitmaps import Bitmap, FlagBitmaps
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+from helpers import datetime_to_minutes
+from models import NearEarthObject
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestBitmap(unittest.TestCase):
+    def setUp(self):
+        self.generator = random.Random(24)
+
+    def random_rows(self):
+        """A set of rows spanning a few chunks, some sparse and some dense."""
+        density = self.generator.choice([0.001, 0.05, 0.5, 0.99])
+        return {row for row in range(200000) if self.generator.random() < density}
+
+    def check_operations(self):
+        for _ in range(8):
+            first, second = self.random_rows(), self.random_rows()
+            first_bitmap, second_bitmap = Bitmap(first), Bitmap(second)
+            self.assertEqual(first_bitmap.rows(), sorted(first))
+            self.assertEqual(list(first_bitmap), sorted(first))
+            self.assertEqual(len(first_bitmap), len(first))
+            self.assertEqual((first_bitmap & second_bitmap).rows(), sorted(first & second))
+            self.assertEqual((first_bitmap | second_bitmap).rows(), sorted(first | second))
+            self.assertEqual((first_bitmap - second_bitmap).rows(), sorted(first - second))
+
+            start, stop = sorted(self.generator.randrange(200000) for _ in range(2))
+            self.assertEqual(Bitmap.from_range(start, stop).rows(), list(range(start, stop)))
+            self.assertEqual(first_bitmap.select(range(start, stop)),
+                             sorted(row for row in first if start <= row < stop))
+            rows = sorted(self.generator.sample(range(200000), 3000))
+            self.assertEqual(first_bitmap.select(rows), [row for row in rows if row in first])
+
+    def test_operations_match_sets(self):
+        self.check_operations()
+
+    def test_operations_match_sets_without_numpy(self):
+        with mock.patch.object(bitmaps, 'numpy', None):
+            self.check_operations()
+
+    def test_add_and_discard(self):
+        rows = self.random_rows()
+        bitmap = Bitmap(rows)
+        for row in self.generator.sample(range(200000), 500):
+            self.assertEqual(row in bitmap, row in rows)
+            if self.generator.random() < 0.5:
+                bitmap.add(row)
+                rows.add(row)
+            else:
+                bitmap.discard(row)
+                rows.discard(row)
+        self.assertEqual(bitmap.rows(), sorted(rows))
+
+    def test_chunks_switch_containers(self):
+        bitmap = Bitmap(range(0, 10000, 2))
+        self.assertIsInstance(bitmap._chunks[0], int)
+        for row in range(0, 10000, 4):
+            bitmap.discard(row)
+        self.assertIsNot(type(bitmap._chunks[0]), int)
+        self.assertEqual(bitmap.rows(), list(range(2, 10000, 4)))
+        self.assertEqual(len(Bitmap.from_range(5, 5)), 0)
+        self.assertEqual(Bitmap().rows(), [])
+
+    def test_results_dont_share_chunks(self):
+        first, second = Bitmap([1, 2, 3]), Bitmap([70000])
+        union = first | second
+        first.add(4)
+        self.assertEqual(union.rows(), [1, 2, 3, 70000])
+
+
+class TestFlagBitmaps(unittest.TestCase):
+    def setUp(self):
+        self.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+
+    def check(self, filters):
+        plan = self.db.explain(filters)
+        expected = [a for a in self.db.query() if all(flt(a) for flt in filters)]
+        self.assertEqual(list(self.db.query(filters)), expected)
+        self.assertEqual(self.db.count(filters), len(expected))
+        return plan, expected
+
+    def test_flags_match_the_neos(self):
+        for build in (True, False):
+            with self.subTest(numpy=build), mock.patch.object(bitmaps, 'numpy', bitmaps.numpy if build else None):
+                store = self.db._store
+                flags = FlagBitmaps(store.neo, self.db._neo_hazardous, self.db._neo_diameter)
+                approaches = list(self.db.query())
+                self.assertEqual(flags['hazardous'].rows(),
+                                 [row for row, a in enumerate(approaches) if a.neo and a.neo.hazardous])
+                self.assertEqual(flags['not hazardous'].rows(),
+                                 [row for row, a in enumerate(approaches) if a.neo and not a.neo.hazardous])
+                known = flags['diameter known']
+                self.assertEqual(known.rows(), [row for row, a in enumerate(approaches)
+                                                if a.neo and not math.isnan(a.neo.diameter)])
+                self.assertEqual((known | flags['diameter unknown']).rows(), list(range(len(store))))
+
+    def test_queries_agree_with_filters(self):
+        for engine in ('python', 'numpy'):
+            self.db.engine = engine
+            for filters in (create_filters(hazardous=True),
+                            create_filters(hazardous=False, distance_max=0.1),
+                            create_filters(hazardous=True, start_date=datetime.date(2020, 2, 1),
+                                           end_date=datetime.date(2020, 4, 30)),
+                            create_filters(diameter_min=0.5, velocity_min=10),
+                            create_filters(hazardous=True, diameter_max=1, distance_max=0.3, velocity_max=20)):
+                with self.subTest(engine=engine, filters=[str(flt) for flt in filters]):
+                    self.check(filters)
+
+    def test_hazardous_is_answered_by_bitmaps(self):
+        plan, expected = self.check(create_filters(hazardous=True))
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(plan.access, 'scan')
+        self.assertEqual([flag for flag, _fraction in plan.flags], ['hazardous'])
+        self.assertEqual(plan.checks, [])
+        self.assertIn("bitmap scan", str(plan))
+        self.db.flag_bitmaps = False
+        self.assertEqual(self.db.explain(create_filters(hazardous=True)).flags, [])
+
+    def test_only_flag_filters_build_the_bitmaps(self):
+        list(self.db.query(create_filters(distance_max=0.1)))
+        self.assertIsNone(self.db._flags)
+        list(self.db.query(create_filters(diameter_min=1)))
+        self.assertIsNotNone(self.db._flags)
+
+    def test_changes_are_reflected(self):
+        filters = create_filters(hazardous=True)
+        before = self.db.count(filters)
+        self.assertIsNotNone(self.db._flags)
+        # A new hazardous NEO adopts an orphaned approach, and another NEO is corrected to be hazardous.
+        minutes = datetime_to_minutes(datetime.datetime(2020, 6, 1))
+        self.db.add_approach_records([('2999 ZZ', minutes, 0.01, 10.0)])
+        self.assertEqual(self.db.count(filters), before)
+        neo = self.db.get_neo_by_designation('2020 BS')
+        self.assertFalse(neo.hazardous)
+        self.db.add_neos([NearEarthObject(designation='2999 ZZ', name='', diameter='0.4', hazardous='Y'),
+                          NearEarthObject(designation='2020 BS', name='', diameter='', hazardous='Y')])
+        self.assertEqual(self.db.count(filters), before + 1 + len(neo.approaches))
+        self.db.add_approach_records([('2020 BS', minutes, 0.01, 10.0)])
+        self.assertEqual(self.db.count(filters), before + 2 + len(neo.approaches) - 1)
+        self.check(filters)
+        _plan, expected = self.check(create_filters(diameter_min=0.3, diameter_max=0.5))
+        self.assertIn('2999 ZZ', [approach.neo.designation for approach in expected])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Check that the query result cache serves repeated queries and stays within its memory cap.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_cache
+"""
+import contextlib
+import io
+import pathlib
+import sys
+import unittest
+from unittest import mock
+
+import main
+from cache import QueryCache, filter_key
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def load_database():
+    return NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+
+
+class TestQueryCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = load_database()
+
+    def test_filter_order_does_not_matter(self):
+        self.assertEqual(filter_key(create_filters(distance_max=0.1, velocity_min=5)),
+                         filter_key(tuple(reversed(create_filters(distance_max=0.1, velocity_min=5)))))
+        self.assertNotEqual(filter_key(create_filters(distance_max=0.1)),
+                            filter_key(create_filters(distance_min=0.1)))
+
+    def test_repeated_query_hits(self):
+        cache = QueryCache()
+        filters = create_filters(distance_max=0.05, hazardous=False)
+        rows = cache.rows(self.db, filters)
+        self.assertEqual(list(rows), list(self.db.query_rows(filters)))
+        self.assertIs(cache.rows(self.db, create_filters(hazardous=False, distance_max=0.05)), rows)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_least_recently_used_is_evicted(self):
+        first, second, third = (create_filters(velocity_min=velocity) for velocity in (10, 20, 30))
+        sizes = [sys.getsizeof(QueryCache().rows(self.db, filters)) for filters in (first, second, third)]
+        cache = QueryCache(max_bytes=sizes[0] + sizes[1] + sizes[2] - 1)
+        cache.rows(self.db, first)
+        cache.rows(self.db, second)
+        cache.rows(self.db, first)
+        cache.rows(self.db, third)
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.bytes, cache.max_bytes)
+        cache.rows(self.db, first)
+        self.assertEqual(cache.hits, 2)
+        cache.rows(self.db, second)
+        self.assertEqual(cache.misses, 4)
+
+    def test_oversized_results_are_not_cached(self):
+        cache = QueryCache(max_bytes=100)
+        self.assertEqual(list(cache.rows(self.db, create_filters())), list(range(len(self.db._store))))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.bytes, 0)
+
+    def test_limited_queries_stop_early(self):
+        cache = QueryCache()
+        common, rare = create_filters(distance_min=0), create_filters(distance_max=0.001)
+        self.assertEqual(list(cache.rows(self.db, common, limit=10)), list(range(10)))
+        self.assertEqual(len(cache), 1)
+        # Fewer matches than the limit are every match, so they serve any limit.
+        rows = cache.rows(self.db, rare, limit=1000)
+        self.assertLess(len(rows), 1000)
+        self.assertIs(cache.rows(self.db, rare), rows)
+        self.assertIsNone(cache.get(self.db, common))
+
+    def test_repeated_limited_query_is_a_hit(self):
+        cache = QueryCache()
+        filters = create_filters(distance_min=0)
+        rows = cache.rows(self.db, filters, limit=10)
+        self.assertIs(cache.rows(self.db, filters, limit=10), rows)
+        self.assertIs(cache.rows(self.db, filters, limit=5), rows)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        # A larger limit needs more rows, which replace the first ones.
+        more = cache.rows(self.db, filters, limit=20)
+        self.assertEqual(list(more), list(range(20)))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        self.assertIs(cache.rows(self.db, filters, limit=15), more)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.bytes, sys.getsizeof(more))
+        # Every match is still needed to count them.
+        self.assertIsNone(cache.get(self.db, filters))
+
+    def test_repeated_shell_query_is_a_hit(self):
+        cache = QueryCache()
+        _parser, _inspect_parser, query_parser, _aggregate_parser = main.make_parser()
+        args = query_parser.parse_args(['--max-distance', '0.01'])
+        with contextlib.redirect_stdout(io.StringIO()) as first:
+            main.query(self.db, args, cache)
+        self.assertEqual(len(first.getvalue().splitlines()), 10)
+        for _ in range(3):
+            with contextlib.redirect_stdout(io.StringIO()) as repeat:
+                main.query(self.db, args, cache)
+            self.assertEqual(repeat.getvalue(), first.getvalue())
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_sorted_shell_query_is_planned_once(self):
+        cache = QueryCache()
+        _parser, _inspect_parser, query_parser, _aggregate_parser = main.make_parser()
+        for options, access in ((['--sort-by', 'distance'], 'walk'),
+                                (['--sort-by', 'velocity', '--max-distance', '0.001'], 'index')):
+            args = query_parser.parse_args(options)
+            with self.subTest(options=options):
+                self.assertEqual(self.db.explain(main.filters_from_args(args), args.sort_by, False, 10).access,
+                                 access)
+                with mock.patch.object(NEODatabase, '_plan', autospec=True, side_effect=NEODatabase._plan) as plan, \
+                        contextlib.redirect_stdout(io.StringIO()) as output:
+                    main.query(self.db, args, cache)
+                self.assertEqual(plan.call_count, 1)
+                expected = self.db.query(main.filters_from_args(args), args.sort_by, False, 10)
+                self.assertEqual(output.getvalue(), ''.join(f'{approach}\n' for approach in expected))
+
+    def test_new_database_invalidates(self):
+        cache = QueryCache()
+        filters = create_filters(distance_max=0.05)
+        cache.rows(self.db, filters)
+        cache.rows(load_database(), filters)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_changed_database_invalidates(self):
+        db = load_database()
+        cache = QueryCache()
+        filters = create_filters(distance_max=0.05)
+        before = cache.rows(db, filters)
+        db.add_approach_records([('2020 AA', db._store.time[0], 0.001, 5.0)])
+        after = cache.rows(db, filters)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(len(after), len(before) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
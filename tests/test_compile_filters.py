@@ -0,0 +1,63 @@
+"""Check that a compiled predicate agrees with calling each of its filters.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_compile_filters
+"""
+import datetime
+import operator
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import AttributeFilter, DistanceFilter, compile_filters, create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class NameFilter(AttributeFilter):
+    @classmethod
+    def get(cls, approach):
+        return approach.neo.name
+
+
+class TestCompileFilters(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        NEODatabase(load_neos(TEST_NEO_FILE), cls.approaches)
+
+    def check(self, filters):
+        expected = [a for a in self.approaches if all(flt(a) for flt in filters)]
+        self.assertEqual(list(filter(compile_filters(filters), self.approaches)), expected)
+        return expected
+
+    def test_no_filters(self):
+        self.assertEqual(len(self.check(())), len(self.approaches))
+
+    def test_combinations(self):
+        for kwargs in ({'date': datetime.date(2020, 3, 2)},
+                       {'start_date': datetime.date(2020, 6, 1), 'distance_max': 0.1},
+                       {'velocity_min': 10, 'velocity_max': 20, 'hazardous': False},
+                       {'diameter_min': 0.5, 'diameter_max': 2, 'end_date': datetime.date(2020, 9, 1)}):
+            with self.subTest(**kwargs):
+                self.assertGreater(len(self.check(create_filters(**kwargs))), 0)
+
+    def test_other_filters_and_comparators(self):
+        filters = (DistanceFilter(operator.ne, self.approaches[0].distance),
+                   NameFilter(operator.eq, None))
+        self.assertGreater(len(self.check(filters)), 0)
+
+    def test_short_circuits(self):
+        def explode(approach):
+            raise AssertionError("Evaluated a filter after one failed.")
+        predicate = compile_filters((DistanceFilter(operator.lt, 0), explode))
+        self.assertFalse(predicate(self.approaches[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,13 +10,19 @@ To run these tests from the project root, run:
 
 These tests should pass when Task 2 is complete.
 """
+import array
+import gc
 import pathlib
 import math
 import unittest
+from unittest import mock
 
 
-from extract import load_neos, load_approaches
+from extract import load_neos, load_approaches, load_approach_records
+import database
 from database import NEODatabase
+from store import NO_NEO
+from filters import create_filters
 
 
 # Paths to the test data files.
@@ -115,5 +121,85 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNone(nonexistent)
 
 
+class TestDatabaseFromRecords(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.db = NEODatabase.from_records(cls.neos, load_approach_records(TEST_CAD_FILE))
+        cls.expected = [(a._designation, a.time, a.distance, a.velocity)
+                        for a in load_approaches(TEST_CAD_FILE)]
+
+    def test_records_produce_the_same_approaches(self):
+        received = [(a.neo.designation, a.time, a.distance, a.velocity) for a in self.db.query()]
+        self.assertEqual(received, self.expected)
+
+    def test_approaches_are_built_once_per_row(self):
+        first = list(self.db.query(create_filters(hazardous=True)))
+        second = list(self.db.query(create_filters(hazardous=True)))
+        self.assertGreater(len(first), 0)
+        for a, b in zip(first, second):
+            self.assertIs(a, b)
+            self.assertIn(a, a.neo.approaches)
+
+    def test_approaches_are_not_kept_alive(self):
+        approaches = list(self.db.query())
+        self.assertEqual(len(self.db._views), len(approaches))
+        del approaches
+        gc.collect()
+        self.assertEqual(len(self.db._views), 0)
+
+    def test_records_are_linked_once(self):
+        with mock.patch.object(NEODatabase, '_link', autospec=True, side_effect=NEODatabase._link) as link:
+            NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+        self.assertEqual(link.call_count, 1)
+
+    def test_neos_collectively_exhaust_approaches(self):
+        approaches = set()
+        for neo in self.neos:
+            approaches.update(neo.approaches)
+        self.assertEqual(approaches, set(self.db.query()))
+
+    def test_indexed_queries_keep_internal_order(self):
+        everything = list(self.db.query())
+        for filters in (create_filters(distance_max=0.01),
+                        create_filters(velocity_min=20, distance_max=0.1)):
+            received = list(self.db.query(filters))
+            self.assertGreater(len(received), 0)
+            expected = [a for a in everything if all(flt(a) for flt in filters)]
+            self.assertEqual(received, expected)
+
+
+class TestGroupByNEO(unittest.TestCase):
+    column = array.array('q', [2, 0, NO_NEO, 2, 1, 0, NO_NEO, 2])
+
+    def check_grouping(self):
+        order, offsets = database._group_by_neo(self.column, 4)
+        self.assertEqual(list(offsets), [0, 2, 3, 6, 6])
+        self.assertEqual(list(order), [1, 5, 4, 0, 3, 7])
+
+    def test_group_by_neo(self):
+        self.check_grouping()
+
+    def test_group_by_neo_without_numpy(self):
+        with mock.patch.object(database, 'numpy', None):
+            self.check_grouping()
+
+    def test_group_empty_column(self):
+        order, offsets = database._group_by_neo(array.array('q'), 2)
+        self.assertEqual(len(order), 0)
+        self.assertEqual(list(offsets), [0, 0, 0])
+
+    def test_approach_list_indexing(self):
+        neos = load_neos(TEST_NEO_FILE)
+        db = NEODatabase.from_records(neos, load_approach_records(TEST_CAD_FILE))
+        neo = max(neos, key=lambda neo: len(neo.approaches))
+        approaches = list(neo.approaches)
+        self.assertGreater(len(approaches), 1)
+        self.assertIs(neo.approaches[-1], approaches[-1])
+        self.assertEqual(neo.approaches[1:], approaches[1:])
+        with self.assertRaises(IndexError):
+            neo.approaches[len(approaches)]
+
+
 if __name__ == '__main__':
     unittest.main()
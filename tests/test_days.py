@@ -0,0 +1,155 @@
+"""Check that the day buckets find the same rows as a scan of the time column, and that day plans agree.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_days
+"""
+import array
+import calendar
+import datetime
+import pathlib
+import random
+import unittest
+from unittest import mock
+
+import indexes
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+from helpers import datetime_to_minutes
+from indexes import DayIndex, day_span
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+FIRST_DAY = datetime.date(2020, 1, 1).toordinal()
+
+
+class TestDayIndex(unittest.TestCase):
+    def setUp(self):
+        self.generator = random.Random(25)
+
+    def random_column(self, count=3000, presorted=False):
+        """Times over about a year, with a few unknown ones."""
+        times = [FIRST_DAY * 1440 + self.generator.randrange(365 * 1440) for _ in range(count)]
+        if presorted:
+            times.sort()
+        else:
+            for row in self.generator.sample(range(count), 30):
+                times[row] = -1
+        return array.array('q', times)
+
+    def scan(self, column, first, last):
+        return [row for row, minutes in enumerate(column) if minutes >= 0 and first <= minutes // 1440 <= last]
+
+    def check(self, index, column, spans=100):
+        for _ in range(spans):
+            first = FIRST_DAY + self.generator.randrange(-10, 375)
+            last = first + self.generator.choice([0, 0, 1, 30, 365, 1000])
+            self.assertEqual(list(index.rows(first, last)), self.scan(column, first, last), msg=(first, last))
+            self.assertEqual(index.count(first, last), len(self.scan(column, first, last)))
+
+    def test_days_match_scan(self):
+        for presorted in (True, False):
+            column = self.random_column(presorted=presorted)
+            for build in (True, False):
+                with self.subTest(presorted=presorted, numpy=build), \
+                        mock.patch.object(indexes, 'numpy', indexes.numpy if build else None):
+                    index = DayIndex(column)
+                    self.assertEqual(index.presorted, presorted)
+                    self.assertEqual(len(index), len([minutes for minutes in column if minutes >= 0]))
+                    self.check(index, column)
+
+    def test_presorted_days_are_ranges(self):
+        column = self.random_column(presorted=True)
+        index = DayIndex(column)
+        self.assertIsInstance(index.rows(FIRST_DAY + 40, FIRST_DAY + 40), range)
+        self.assertIsInstance(index.rows(FIRST_DAY, FIRST_DAY + 30), range)
+        self.assertEqual(index.rows(FIRST_DAY - 5, FIRST_DAY - 1), range(0))
+
+    def test_added_rows(self):
+        column = self.random_column(presorted=True)
+        index = DayIndex(column)
+        # Later times keep the buckets in order; an earlier one doesn't.
+        for minutes in (column[-1], column[-1] + 1440, -1, FIRST_DAY * 1440 + 5):
+            column.append(minutes)
+            index.add(len(column) - 1)
+        self.assertFalse(index.presorted)
+        self.check(index, column)
+
+    def test_day_span(self):
+        first = FIRST_DAY * 1440
+        self.assertEqual(day_span(first, True, first + 1439, True), (FIRST_DAY, FIRST_DAY))
+        self.assertEqual(day_span(first - 1, False, first + 2 * 1440, False), (FIRST_DAY, FIRST_DAY + 1))
+        self.assertIsNone(day_span(first, True, None, True))
+        self.assertIsNone(day_span(first + 60, True, first + 1439, True))
+
+
+class TestDayPlans(unittest.TestCase):
+    def setUp(self):
+        self.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+
+    def check(self, filters):
+        plan = self.db.explain(filters)
+        expected = [a for a in self.db.query() if all(flt(a) for flt in filters)]
+        self.assertEqual(list(self.db.query(filters)), expected)
+        self.assertEqual(self.db.count(filters), len(expected))
+        return plan, expected
+
+    def test_exact_date_is_one_lookup(self):
+        plan, expected = self.check(create_filters(date=datetime.date(2020, 1, 1)))
+        self.assertEqual(plan.access, 'day')
+        self.assertEqual(plan.bounds, (FIRST_DAY, FIRST_DAY))
+        self.assertEqual(plan.checks, [])
+        self.assertGreater(len(expected), 0)
+
+    def test_days_months_and_years_agree(self):
+        for engine in ('python', 'numpy'):
+            self.db.engine = engine
+            for filters in (create_filters(date=datetime.date(2020, 6, 30), distance_max=0.3),
+                            create_filters(start_date=datetime.date(2020, 3, 1), end_date=datetime.date(2020, 3, 31)),
+                            create_filters(start_date=datetime.date(2020, 1, 1), end_date=datetime.date(2020, 12, 31),
+                                           velocity_min=20),
+                            create_filters(date=datetime.date(2020, 2, 2), hazardous=False),
+                            create_filters(date=datetime.date(1900, 1, 1))):
+                with self.subTest(engine=engine, filters=[str(flt) for flt in filters]):
+                    self.check(filters)
+
+    def test_only_whole_days_build_the_buckets(self):
+        list(self.db.query(create_filters(start_date=datetime.date(2020, 3, 1), distance_max=0.1)))
+        self.assertIsNone(self.db._days)
+        # The time index bisects a month as quickly as the buckets look up its days.
+        march = create_filters(start_date=datetime.date(2020, 3, 1), end_date=datetime.date(2020, 3, 31))
+        self.assertEqual(self.db.explain(march).access, 'index')
+        self.assertIsNone(self.db._days)
+        list(self.db.query(create_filters(date=datetime.date(2020, 3, 1))))
+        self.assertIsNotNone(self.db._days)
+
+    def test_months_without_a_time_index(self):
+        self.db.indexed_columns = ('distance', 'velocity')
+        self.db._build_indexes()
+        for month in range(1, 13):
+            days = calendar.monthrange(2020, month)[1]
+            filters = create_filters(start_date=datetime.date(2020, month, 1),
+                                     end_date=datetime.date(2020, month, days))
+            with self.subTest(month=month):
+                plan, _expected = self.check(filters)
+                self.assertEqual(plan.access, 'day')
+
+    def test_added_approaches_are_found(self):
+        filters = create_filters(date=datetime.date(2020, 1, 1))
+        before = self.db.count(filters)
+        self.assertIsNotNone(self.db._days)
+        # One approach on a new day, and one back on the first day of the year, out of time order.
+        self.db.add_approach_records([('433', datetime_to_minutes(datetime.datetime(2030, 1, 1, 12)), 0.1, 5.0),
+                                      ('433', datetime_to_minutes(datetime.datetime(2020, 1, 1, 23, 59)), 0.1, 5.0)])
+        self.assertFalse(self.db._days.presorted)
+        self.assertEqual(self.db.count(filters), before + 1)
+        self.check(filters)
+        self.assertEqual(self.db.count(create_filters(date=datetime.date(2030, 1, 1))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,11 +12,16 @@ These tests should pass when Task 2 is complete.
 """
 import collections.abc
 import datetime
+import json
 import pathlib
 import math
+import tempfile
+import types
 import unittest
+import unittest.mock
 
-from extract import load_neos, load_approaches
+import extract
+from extract import load_neos, load_approaches, iter_approaches, iter_neo_rows
 from models import NearEarthObject, CloseApproach
 
 
@@ -78,6 +83,35 @@ class TestLoadNEOs(unittest.TestCase):
         self.assertEqual(neo.hazardous, True)
 
 
+class TestIterNEORows(unittest.TestCase):
+    def test_rows_are_projected_in_requested_order(self):
+        rows = list(iter_neo_rows(TEST_NEO_FILE, ('name', 'pdes')))
+        self.assertEqual(len(rows), 4226)
+        self.assertIn(('Adonis', '2101'), rows)
+
+    def test_extra_columns(self):
+        rows = {row[0]: row[1:] for row in iter_neo_rows(TEST_NEO_FILE, ('pdes', 'H', 'albedo', 'moid'))}
+        self.assertEqual(rows['1865'], ('16.7', '0.22', '.156542'))
+
+    def test_single_column(self):
+        rows = list(iter_neo_rows(TEST_NEO_FILE, ('pdes',)))
+        self.assertEqual(rows[0], ('1685',))
+
+    def test_quoted_fields(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pathlib.Path(tmpdir) / 'neos.csv'
+            path.write_text('full_name,pdes,name,pha\n'
+                            '"  433 Eros, (A898 PA)",433,Eros,N\n'
+                            '  1685 Toro (1948 OA),1685,Toro,N\n')
+            rows = list(iter_neo_rows(path, ('pdes', 'full_name', 'pha')))
+        self.assertEqual(rows, [('433', '  433 Eros, (A898 PA)', 'N'),
+                                ('1685', '  1685 Toro (1948 OA)', 'N')])
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            list(iter_neo_rows(TEST_NEO_FILE, ('pdes', 'not-a-column')))
+
+
 class TestLoadApproaches(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -118,5 +152,68 @@ class TestLoadApproaches(unittest.TestCase):
         self.assertIsInstance(approach.velocity, float)
 
 
+class TestIterApproaches(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+
+    @staticmethod
+    def as_tuples(approaches):
+        return [(a._designation, a.time, a.distance, a.velocity) for a in approaches]
+
+    def test_iter_approaches_is_a_generator(self):
+        self.assertIsInstance(iter_approaches(TEST_CAD_FILE), types.GeneratorType)
+
+    def test_iter_approaches_matches_load_approaches(self):
+        streamed = self.as_tuples(iter_approaches(TEST_CAD_FILE))
+        self.assertEqual(streamed, self.as_tuples(self.approaches))
+
+    def test_iter_approaches_with_tiny_buffer(self):
+        # Force values to straddle buffer refills.
+        streamed = self.as_tuples(iter_approaches(TEST_CAD_FILE, chunk_size=7))
+        self.assertEqual(streamed, self.as_tuples(self.approaches))
+
+    def test_iter_approaches_with_fields_before_data(self):
+        document = json.loads(TEST_CAD_FILE.read_text())
+        reordered = {'signature': document['signature'], 'count': document['count'],
+                     'fields': document['fields'], 'data': document['data'][:50]}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pathlib.Path(tmpdir) / 'cad.json'
+            path.write_text(json.dumps(reordered))
+            streamed = self.as_tuples(iter_approaches(path, chunk_size=13))
+        self.assertEqual(streamed, self.as_tuples(self.approaches[:50]))
+
+
+class TestParallelLoading(unittest.TestCase):
+    def setUp(self):
+        # Make the small test files split into several chunks.
+        patcher = unittest.mock.patch.object(extract, '_MIN_PARALLEL_CHUNK', 1 << 14)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parallel_neos_match_serial_neos(self):
+        serial = [(n.designation, n.name, n.hazardous) for n in load_neos(TEST_NEO_FILE)]
+        parallel = [(n.designation, n.name, n.hazardous) for n in load_neos(TEST_NEO_FILE, jobs=3)]
+        self.assertEqual(parallel, serial)
+
+    def test_parallel_neos_keep_unusual_line_separators(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pathlib.Path(tmpdir) / 'neos.csv'
+            lines = TEST_NEO_FILE.read_text().split('\n')
+            blank = ',' * (lines[0].count(',') - 7)
+            lines[5:5] = [f'a1,1,  1 Form\x0cFeed,1 F,Form\x0cFeed,,Y,N{blank}\r',
+                          f'a2,2,  2 Line\u2028Sep,2 L,Line\u2028Sep\x85,,Y,Y{blank}']
+            path.write_text('\n'.join(lines), newline='')
+            serial = [(n.designation, n.name, n.hazardous) for n in load_neos(path)]
+            parallel = [(n.designation, n.name, n.hazardous) for n in load_neos(path, jobs=3)]
+        self.assertEqual(parallel, serial)
+        self.assertEqual(serial[4:6], [('1 F', 'Form\x0cFeed', False), ('2 L', 'Line\u2028Sep\x85', True)])
+
+    def test_parallel_approaches_match_serial_approaches(self):
+        serial = TestIterApproaches.as_tuples(load_approaches(TEST_CAD_FILE))
+        parallel = TestIterApproaches.as_tuples(load_approaches(TEST_CAD_FILE, jobs=3))
+        self.assertEqual(parallel, serial)
+
+
 if __name__ == '__main__':
     unittest.main()
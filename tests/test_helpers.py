@@ -0,0 +1,71 @@
+"""Check that NASA-formatted calendar dates are parsed exactly like `strptime` would.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_helpers
+"""
+import datetime
+import json
+import pathlib
+import unittest
+
+from helpers import (cd_to_datetime, cd_to_datetimes, datetime_to_str,
+                     datetime_to_minutes, minutes_to_datetime)
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def strptime(calendar_date):
+    return datetime.datetime.strptime(calendar_date, "%Y-%b-%d %H:%M")
+
+
+class TestCalendarDates(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        document = json.loads(TEST_CAD_FILE.read_text())
+        index = document['fields'].index('cd')
+        cls.calendar_dates = [row[index] for row in document['data']]
+
+    def test_matches_strptime_on_test_data(self):
+        for calendar_date in self.calendar_dates:
+            self.assertEqual(cd_to_datetime(calendar_date), strptime(calendar_date))
+
+    def test_bulk_conversion(self):
+        expected = [strptime(calendar_date) for calendar_date in self.calendar_dates]
+        self.assertEqual(cd_to_datetimes(self.calendar_dates), expected)
+        self.assertEqual(cd_to_datetimes(iter(self.calendar_dates)), expected)
+
+    def test_matches_strptime_outside_fixed_format(self):
+        for calendar_date in ('2020-dec-31 12:00', '2020-DEC-31 12:00',
+                              '2020-Dec-1 12:00', '2020-Dec-31 1:05', '1900-Feb-28 23:59'):
+            self.assertEqual(cd_to_datetime(calendar_date), strptime(calendar_date))
+
+    def test_rejects_what_strptime_rejects(self):
+        for calendar_date in ('2020-Feb-30 12:00', '2020-Dec-31 24:00', '2020-Dec-31 12:60',
+                              '2020-Dex-31 12:00', '2020-Dec-00 12:00', '2020/Dec/31 12:00',
+                              '+020-Dec-31 12:00', ''):
+            with self.assertRaises(ValueError):
+                strptime(calendar_date)
+            with self.assertRaises(ValueError):
+                cd_to_datetime(calendar_date)
+
+
+class TestMinutes(unittest.TestCase):
+    def test_minutes_round_trip(self):
+        for dt in (datetime.datetime(1900, 1, 1), datetime.datetime(2020, 12, 31, 23, 59),
+                   datetime.datetime(2000, 2, 29, 7, 3)):
+            self.assertEqual(minutes_to_datetime(datetime_to_minutes(dt)), dt)
+
+    def test_minutes_are_ordered(self):
+        earlier = datetime.datetime(2020, 1, 1, 0, 59)
+        later = datetime.datetime(2020, 1, 1, 1, 0)
+        self.assertEqual(datetime_to_minutes(later) - datetime_to_minutes(earlier), 1)
+
+    def test_datetime_to_str(self):
+        self.assertEqual(datetime_to_str(datetime.datetime(2020, 12, 31, 12, 0)), '2020-12-31 12:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
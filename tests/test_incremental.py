@@ -0,0 +1,147 @@
+"""Check that adding NEOs and close approaches to a database matches building it in one go.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_incremental
+"""
+import array
+import datetime
+import math
+import pathlib
+import random
+import unittest
+from unittest import mock
+
+import database
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+from indexes import SortedIndex
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+QUERIES = (
+    {},
+    {'date': datetime.date(2020, 12, 30)},
+    {'start_date': datetime.date(2020, 12, 1), 'distance_max': 0.2},
+    {'velocity_min': 20, 'velocity_max': 30},
+    {'hazardous': True, 'diameter_min': 0.5},
+    {'diameter_max': 0.1, 'hazardous': False, 'distance_min': 0.1},
+)
+
+
+def as_tuples(approaches):
+    return [(a.neo.designation if a.neo else a._designation, a.time, a.distance, a.velocity)
+            for a in approaches]
+
+
+class TestIncrementalIngestion(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        neos = load_neos(TEST_NEO_FILE)
+        records = list(load_approach_records(TEST_CAD_FILE))
+        cls.full = NEODatabase.from_records(load_neos(TEST_NEO_FILE), records)
+
+        # Hold back the last fifth of the NEOs and the last tenth of the approaches.
+        neo_split, record_split = len(neos) * 4 // 5, len(records) * 9 // 10
+        cls.db = NEODatabase.from_records(neos[:neo_split], records[:record_split])
+        cls.added_approaches = cls.db.add_approach_records(records[record_split:])
+        cls.added_neos = cls.db.add_neos(neos[neo_split:])
+        cls.neos, cls.records = neos, records
+
+    def test_counts(self):
+        self.assertEqual(self.added_approaches, (len(self.records) - len(self.records) * 9 // 10, 0))
+        self.assertEqual(self.added_neos, (len(self.neos) - len(self.neos) * 4 // 5, 0))
+        self.assertEqual(self.db.version, 2)
+
+    def test_queries_match_a_full_build(self):
+        for kwargs in QUERIES:
+            with self.subTest(**kwargs):
+                filters = create_filters(**kwargs)
+                self.assertEqual(as_tuples(self.db.query(filters)), as_tuples(self.full.query(filters)))
+
+    def test_neos_are_linked(self):
+        for neo in self.db._neos:
+            expected = self.full.get_neo_by_designation(neo.designation)
+            self.assertEqual(as_tuples(neo.approaches), as_tuples(expected.approaches))
+            for approach in neo.approaches:
+                self.assertIs(approach.neo, neo)
+        self.assertEqual(len(self.db._store.orphans), 0)
+
+    def test_lookups(self):
+        last = self.neos[-1]
+        self.assertIs(self.db.get_neo_by_designation(last.designation), last)
+        if last.name:
+            self.assertIs(self.db.get_neo_by_name(last.name), last)
+
+
+class TestRegrouping(unittest.TestCase):
+    def test_regrouping_keeps_results(self):
+        records = list(load_approach_records(TEST_CAD_FILE))
+        full = NEODatabase.from_records(load_neos(TEST_NEO_FILE), records)
+        db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), records[:1000])
+        with mock.patch.object(database, '_MAX_EXTRA_ROWS', 10):
+            for start in range(1000, len(records), 100):
+                db.add_approach_records(records[start:start + 100])
+        self.assertLess(db._extra_rows, len(records))
+        for neo, expected in zip(db._neos, full._neos):
+            self.assertEqual(as_tuples(neo.approaches), as_tuples(expected.approaches))
+        filters = create_filters(hazardous=True, diameter_min=0.5)
+        self.assertEqual(as_tuples(db.query(filters)), as_tuples(full.query(filters)))
+
+
+class TestCorrections(unittest.TestCase):
+    def setUp(self):
+        self.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+
+    def test_corrected_approach_is_updated_in_place(self):
+        row = next(iter(self.db.query_rows(create_filters(distance_min=0.4))))
+        approach = self.db._approach(row)
+        designation, minutes = approach.neo.designation, self.db._store.time[row]
+        count = len(self.db._store)
+
+        self.assertEqual(self.db.add_approach_records([(designation, minutes, 0.00001, 99.0)]), (0, 1))
+        self.assertEqual(len(self.db._store), count)
+        self.assertEqual((approach.distance, approach.velocity), (0.00001, 99.0))
+        self.assertIn(approach, list(self.db.query(create_filters(distance_max=0.00002))))
+        self.assertNotIn(approach, list(self.db.query(create_filters(distance_min=0.4))))
+        self.assertIn(approach, list(self.db.query(create_filters(velocity_min=98))))
+
+    def test_corrected_neo_is_updated_in_place(self):
+        neo = self.db.get_neo_by_designation('1865')
+        corrected = type(neo)(designation='1865', name='Renamed', diameter='123.0', hazardous='Y')
+        self.assertEqual(self.db.add_neos([corrected]), (0, 1))
+        self.assertIs(self.db.get_neo_by_name('Renamed'), neo)
+        self.assertIsNone(self.db.get_neo_by_name('Cerberus'))
+        self.assertEqual((neo.diameter, neo.hazardous), (123.0, True))
+        results = set(self.db.query(create_filters(diameter_min=100, hazardous=True)))
+        self.assertEqual(results, set(neo.approaches))
+
+
+class TestSortedIndexUpdates(unittest.TestCase):
+    def test_adds_and_updates_match_a_rebuild(self):
+        rng = random.Random(7)
+        for presorted in (True, False):
+            values = sorted(rng.random() for _ in range(50)) if presorted else [rng.random() for _ in range(50)]
+            column = array.array('d', values)
+            index = SortedIndex(column)
+            for step in range(400):
+                if rng.random() < 0.5:
+                    column.append(math.nan if step % 17 == 0 else rng.random())
+                    index.add(len(column) - 1)
+                else:
+                    row = rng.randrange(len(column))
+                    old, column[row] = column[row], rng.random()
+                    index.update(row, old)
+                fresh = SortedIndex(column)
+                for bounds in ((0.2, True, 0.6, False), (None, True, 0.1, True), (0.9, False, None, True)):
+                    self.assertEqual(list(index.rows(*bounds)), list(fresh.rows(*bounds)))
+                    self.assertEqual(index.count(*bounds), len(fresh.rows(*bounds)))
+                self.assertEqual(len(index), len(fresh))
+
+
+if __name__ == '__main__':
+    unittest.main()
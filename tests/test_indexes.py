@@ -0,0 +1,150 @@
+"""Check that secondary indexes find the same rows as a full scan.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_indexes
+"""
+import array
+import operator
+import random
+import unittest
+from unittest import mock
+
+import indexes
+from indexes import SortedIndex, range_bounds
+
+
+class TestRangeBounds(unittest.TestCase):
+    def test_tightest_bounds_win(self):
+        conditions = [('x', operator.ge, 1), ('x', operator.gt, 2), ('x', operator.le, 9),
+                      ('x', operator.lt, 9)]
+        self.assertEqual(range_bounds(conditions), (2, False, 9, False))
+
+    def test_equality_bounds_both_sides(self):
+        self.assertEqual(range_bounds([('x', operator.eq, 5)]), (5, True, 5, True))
+
+    def test_no_conditions(self):
+        self.assertEqual(range_bounds([]), (None, True, None, True))
+
+
+class TestSortedIndex(unittest.TestCase):
+    def setUp(self):
+        self.column = array.array('d', [5.0, 1.0, float('nan'), 3.0, 3.0, 9.0, 0.5])
+
+    def scan(self, lower, lower_inclusive, upper, upper_inclusive):
+        rows = []
+        for row, value in enumerate(self.column):
+            if value != value:
+                continue
+            if lower is not None and not (value >= lower if lower_inclusive else value > lower):
+                continue
+            if upper is not None and not (value <= upper if upper_inclusive else value < upper):
+                continue
+            rows.append(row)
+        return rows
+
+    def test_unsorted_column_matches_scan(self):
+        index = SortedIndex(self.column)
+        self.assertIsNotNone(index.order)
+        for bounds in [(1.0, True, 5.0, True), (1.0, False, 5.0, False), (3.0, True, 3.0, True),
+                       (None, True, 3.0, False), (4.0, True, None, True), (10.0, True, 20.0, True),
+                       (None, True, None, True)]:
+            self.assertEqual(list(index.rows(*bounds)), self.scan(*bounds), msg=bounds)
+
+    def test_rows_by_value(self):
+        index = SortedIndex(self.column)
+        self.assertEqual(list(index.rows_by_value(1.0, True, 5.0, True)), [1, 3, 4, 0])
+
+    def test_nan_rows_are_not_indexed(self):
+        index = SortedIndex(self.column)
+        self.assertEqual(len(index), len(self.column) - 1)
+        self.assertNotIn(2, index.rows())
+
+    def test_sorted_column_needs_no_permutation(self):
+        column = array.array('q', [1, 2, 2, 7, 10])
+        index = SortedIndex(column)
+        self.assertIsNone(index.order)
+        self.assertEqual(index.rows(2, True, 7, True), range(1, 4))
+
+    def test_empty_column(self):
+        index = SortedIndex(array.array('q'))
+        self.assertEqual(list(index.rows(0, True, 10, True)), [])
+
+    def test_changes_to_a_sorted_column_dont_rebuild(self):
+        column = array.array('d', [float(value) for value in range(100)])
+        index = SortedIndex(column)
+        self.assertIsNone(index.order)
+        with mock.patch.object(SortedIndex, '_build') as build:
+            for row, value in ((10, 95.5), (50, -1.0), (10, 20.5), (99, float('nan'))):
+                old, column[row] = column[row], value
+                index.update(row, old)
+            column.append(7.0)
+            index.add(100)
+        build.assert_not_called()
+        self.assertIsNone(index.order)
+        for bounds in [(0.0, True, 30.0, True), (-5.0, True, 0.0, False), (90.0, False, None, True)]:
+            expected = [row for row, value in enumerate(column) if indexes._in_range(value, *bounds)]
+            self.assertEqual(list(index.rows(*bounds)), expected, msg=bounds)
+            self.assertEqual(index.count(*bounds), len(expected))
+            self.assertEqual(sorted(index.walk(*bounds)), expected)
+
+    def test_rows_changed_more_than_once(self):
+        nan = float('nan')
+        for start, values in (([1.0, nan, 3.0, 0.5], [2.5, 0.1]), ([1.0, nan, 3.0, 0.5], [2.5, 0.1, nan, 2.0]),
+                              ([1.0, 4.0, 3.0, 0.5], [2.5, 0.1, 5.0]), ([0.0, 1.0, 2.0, 3.0], [2.5, 0.1, 2.5])):
+            column = array.array('d', start)
+            index = SortedIndex(column)
+            index.rows()
+            for value in values:
+                old, column[1] = column[1], value
+                index.update(1, old)
+            with self.subTest(start=start, values=values):
+                for bounds in [(2.0, True, 3.0, True), (0.0, True, 1.0, False), (None, True, None, True)]:
+                    expected = [row for row, value in enumerate(column) if indexes._in_range(value, *bounds)]
+                    self.assertEqual(sorted(index.rows_by_value(*bounds)), expected, msg=bounds)
+                    self.assertEqual(list(index.rows(*bounds)), expected, msg=bounds)
+                    self.assertEqual(index.count(*bounds), len(expected), msg=bounds)
+                    self.assertEqual(sorted(index.walk(*bounds)), expected, msg=bounds)
+                self.assertEqual(index.unknown_rows(), [row for row, value in enumerate(column) if value != value])
+
+    def test_random_changes_match_scan(self):
+        generator = random.Random(16)
+        values = [float(value) for value in range(8)] + [float('nan')]
+        for presorted in (True, False):
+            column = array.array('d', sorted(generator.choice(values) for _ in range(40)))
+            if not presorted:
+                generator.shuffle(column)
+            index = SortedIndex(column)
+            index.rows()
+            for _ in range(200):
+                row = generator.randrange(len(column))
+                old, column[row] = column[row], generator.choice(values)
+                index.update(row, old)
+            with self.subTest(presorted=presorted):
+                for lower in range(-1, 9):
+                    bounds = (float(lower), True, lower + 2.5, False)
+                    expected = [row for row, value in enumerate(column) if indexes._in_range(value, *bounds)]
+                    self.assertEqual(list(index.rows(*bounds)), expected, msg=bounds)
+                    self.assertEqual(index.count(*bounds), len(expected), msg=bounds)
+
+    def test_built_on_first_lookup(self):
+        index = SortedIndex(self.column)
+        self.assertFalse(index.built)
+        index.add(len(self.column) - 1)
+        self.assertFalse(index.built)
+        self.assertEqual(list(index.rows(3.0, True, 3.0, True)), [3, 4])
+        self.assertTrue(index.built)
+
+    def test_numpy_build_matches_python_build(self):
+        generator = random.Random(9)
+        column = array.array('d', (generator.choice([float('nan'), generator.randrange(50) / 2])
+                                   for _ in range(2000)))
+        index = SortedIndex(column)
+        built = (list(index.order), list(index.keys))
+        with mock.patch.object(indexes, 'numpy', None):
+            index = SortedIndex(column)
+            self.assertEqual((list(index.order), list(index.keys)), built)
+
+
+if __name__ == '__main__':
+    unittest.main()
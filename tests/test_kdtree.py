@@ -0,0 +1,161 @@
+"""Check that the k-d tree finds the same rows within a box as a full scan, and that box plans agree.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_kdtree
+"""
+import array
+import datetime
+import math
+import pathlib
+import random
+import unittest
+from unittest import mock
+
+import indexes
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+from indexes import KDTree, _in_range
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestKDTree(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(23)
+        count = 3000
+        self.columns = {
+            'time': array.array('q', (generator.randrange(10000) for _ in range(count))),
+            # A few unknown distances, which no bounded box holds.
+            'distance': array.array('d', (math.nan if generator.random() < 0.01 else generator.random()
+                                          for _ in range(count))),
+            'velocity': array.array('d', (generator.uniform(0, 50) for _ in range(count))),
+        }
+        self.generator = generator
+
+    def scan(self, box):
+        bounded = [(self.columns[name], bounds) for name, bounds in box.items()]
+        return [row for row in range(len(self.columns['time']))
+                if all(_in_range(column[row], *bounds) for column, bounds in bounded)]
+
+    def random_box(self):
+        box = {}
+        for name, high in (('time', 10000), ('distance', 1), ('velocity', 50)):
+            if self.generator.random() < 0.3:
+                continue
+            lower, upper = sorted(self.generator.uniform(0, high) for _ in range(2))
+            if name == 'time':
+                lower, upper = int(lower), int(upper)
+            box[name] = (lower if self.generator.random() < 0.8 else None, self.generator.random() < 0.5,
+                         upper if self.generator.random() < 0.8 else None, self.generator.random() < 0.5)
+        return box
+
+    def check(self, tree, boxes=100):
+        for _ in range(boxes):
+            box = self.random_box()
+            self.assertEqual(tree.rows(box), self.scan(box), msg=box)
+
+    def test_boxes_match_scan(self):
+        self.check(KDTree(self.columns))
+
+    def test_boxes_match_scan_without_numpy(self):
+        with mock.patch.object(indexes, 'numpy', None):
+            self.check(KDTree(self.columns))
+
+    def test_exact_values_and_empty_boxes(self):
+        tree = KDTree(self.columns)
+        time = self.columns['time'][42]
+        self.assertIn(42, tree.rows({'time': (time, True, time, True)}))
+        self.assertNotIn(42, tree.rows({'time': (time, False, time, True)}))
+        self.assertEqual(tree.rows({'distance': (2.0, True, None, True), 'velocity': (0, True, 10, True)}), [])
+
+    def append(self, tree):
+        self.columns['time'].append(self.generator.randrange(10000))
+        self.columns['distance'].append(self.generator.random())
+        self.columns['velocity'].append(self.generator.uniform(0, 50))
+        tree.add(len(self.columns['time']) - 1)
+
+    def test_added_and_changed_rows(self):
+        tree = KDTree(self.columns)
+        for _ in range(50):
+            self.append(tree)
+        for row in self.generator.sample(range(len(self.columns['time'])), 50):
+            self.columns['distance'][row] = self.generator.random()
+            tree.update(row)
+        self.check(tree)
+        # Enough changes rebuild the tree.
+        while tree._changes:
+            self.append(tree)
+        self.assertEqual(len(tree.order) + len(tree._loose), len(self.columns['time']))
+        self.check(tree, boxes=20)
+
+    def test_estimate(self):
+        tree = KDTree(self.columns)
+        box = {'distance': (0.1, True, 0.3, True), 'velocity': (10, True, 20, True)}
+        matches, checked, visited = tree.estimate(box)
+        self.assertAlmostEqual(matches, len(self.scan(box)), delta=0.5 * len(self.scan(box)))
+        self.assertLess(checked, len(self.columns['time']) / 2)
+        self.assertLess(visited, len(tree._starts))
+        # Searching the tree for the leaves estimates the same rows as comparing every leaf.
+        with mock.patch.object(indexes, 'numpy', None):
+            python_matches, python_checked, python_visited = tree.estimate(box)
+        self.assertAlmostEqual(python_matches, matches)
+        self.assertEqual((python_checked, python_visited), (checked, visited))
+
+    def test_empty_tree(self):
+        tree = KDTree({'x': array.array('d'), 'y': array.array('d')})
+        self.assertEqual(tree.rows({'x': (0, True, 1, True)}), [])
+        self.assertEqual(tree.estimate({'x': (0, True, 1, True)}), (0.0, 0, 0))
+
+
+class TestBoxPlans(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+        cls.db.engine = 'python'
+
+    def check(self, filters):
+        plan = self.db.explain(filters)
+        received = list(self.db.query(filters))
+        self.assertEqual(received, [a for a in self.db.query() if all(flt(a) for flt in filters)])
+        return plan, received
+
+    def test_screening_query_searches_the_tree(self):
+        plan, received = self.check(create_filters(distance_max=0.05, velocity_min=20, hazardous=False))
+        self.assertEqual(plan.access, 'box')
+        self.assertIn('k-d tree box search', str(plan))
+        self.assertGreater(len(received), 0)
+        filters = create_filters(distance_max=0.05, velocity_min=20)
+        self.assertEqual(self.db.count(filters), len(list(self.db.query(filters))))
+
+    def test_box_plans_agree_with_other_plans(self):
+        for filters in (create_filters(start_date=datetime.date(2020, 3, 1), end_date=datetime.date(2020, 3, 31),
+                                       distance_max=0.1, velocity_min=5),
+                        create_filters(distance_min=0.05, distance_max=0.1, velocity_max=10),
+                        create_filters(date=datetime.date(2020, 1, 1), distance_max=0.5)):
+            with self.subTest(filters=[str(flt) for flt in filters]):
+                self.check(filters)
+
+    def test_one_column_doesnt_build_the_tree(self):
+        database = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+        list(database.query(create_filters(distance_max=0.02)))
+        self.assertIsNone(database._box)
+
+    def test_added_approaches_are_found(self):
+        database = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+        database.engine = 'python'
+        filters = create_filters(distance_max=0.05, velocity_min=20)
+        before = database.count(filters)
+        self.assertIsNotNone(database._box)
+        # One new approach inside the box, and one outside it.
+        database.add_approach_records([('433', 1, 0.0005, 46.0), ('433', 2, 0.5, 46.0)])
+        self.assertEqual(database.count(filters), before + 1)
+        self.assertEqual(database.explain(filters).access, 'box')
+
+
+if __name__ == '__main__':
+    unittest.main()
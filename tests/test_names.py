@@ -0,0 +1,191 @@
+"""Check the case-insensitive name and trigram indexes, and the lookups, completion and searches built on them.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_names
+"""
+import contextlib
+import io
+import pathlib
+import unittest
+from unittest import mock
+
+import names
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from main import NEOShell, inspect, make_parser
+from models import NearEarthObject
+from names import NameIndex, TrigramIndex, trigrams
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = NameIndex(['Halley', None, 'Hermes', 'halley', '', 'Apollo', 'HALLEY'])
+
+    def test_exact_lookups_keep_duplicates_and_ignore_case(self):
+        self.assertEqual(self.index.get('Halley'), [0, 3, 6])
+        self.assertEqual(self.index.get('hERMES'), [2])
+        self.assertEqual(self.index.get('Hal'), [])
+        self.assertEqual(self.index.get(''), [])
+        self.assertEqual(len(self.index), 5)
+
+    def test_prefix_lookups(self):
+        self.assertEqual(self.index.prefix('h'), [0, 3, 6, 2])
+        self.assertEqual(self.index.prefix('H', limit=2), [0, 3])
+        self.assertEqual(self.index.prefix(''), [5, 0, 3, 6, 2])
+        self.assertEqual(self.index.prefix('z'), [])
+
+    def test_add_and_discard(self):
+        self.index.add('Halley', 9)
+        self.index.add('HALLEY', 1)
+        self.assertEqual(self.index.get('halley'), [0, 1, 3, 6, 9])
+        self.index.discard('Halley', 3)
+        self.index.discard('Halley', 42)
+        self.assertEqual(self.index.get('halley'), [0, 1, 6, 9])
+
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TrigramIndex([('Hermes', 0), ('69230', 0), ('Apophis', 1), ('99942', 1),
+                                   ('Apollo', 2), (None, 3), ('1862', 2), ('Apollonia', 4)])
+
+    def search(self, *args, **kwargs):
+        """Search with NumPy, and check that searching without it agrees."""
+        found = self.index.search(*args, **kwargs)
+        with mock.patch.object(names, 'numpy', None):
+            self.assertEqual(self.index.search(*args, **kwargs), found)
+        return found
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams('ab'), {'  a', ' ab', 'ab '})
+        self.assertEqual(trigrams('a'), {'  a', ' a '})
+
+    def test_typos_are_found(self):
+        self.assertEqual([ident for ident, _score in self.search('APOLO')], [2, 4, 1])
+        self.assertEqual(self.search('Hermes'), [(0, 1.0)])
+        self.assertEqual(self.search('Herems')[0][0], 0)
+        self.assertEqual(self.search('99924')[0][0], 1)
+        self.assertEqual(self.search('xyzzy'), [])
+
+    def test_limit_and_threshold(self):
+        self.assertEqual([ident for ident, _score in self.search('apollo', limit=2)], [2, 4])
+        self.assertEqual([ident for ident, _score in self.search('apollo', threshold=0.6)], [2])
+        self.assertEqual(self.search('apollo', limit=0), [])
+
+    def test_add_and_discard(self):
+        self.index.add('Apolo', 5)
+        self.index.discard('Apollo', 2)
+        self.index.discard('Apollo', 42)
+        self.assertEqual(self.search('apolo', limit=1), [(5, 1.0)])
+        self.assertNotIn(2, [ident for ident, _score in self.search('apollo')])
+        self.assertEqual(len(self.index), 7)
+
+    def test_many_texts(self):
+        # Queries whose common trigrams have long posting lists, and whose rare ones have short lists.
+        self.index = TrigramIndex((f'20{year:02} {chr(65 + row % 26)}{chr(65 + row // 26 % 26)}{row % 97}', row)
+                                  for row, year in enumerate(list(range(100)) * 30))
+        for query in ('2026 AB26', '2026 AB62', '2020 ZZ', '2050'):
+            for threshold in (0.2, 0.4, 0.6):
+                with self.subTest(query=query, threshold=threshold):
+                    self.search(query, limit=25, threshold=threshold)
+        self.assertEqual(self.search('2026 AB62', threshold=0.4)[0][0], 26)
+
+
+class TestNameLookups(unittest.TestCase):
+    def setUp(self):
+        neos = load_neos(TEST_NEO_FILE)
+        neos.append(NearEarthObject(designation='2999 XX', name='CERBERUS', diameter='', hazardous='N'))
+        self.db = NEODatabase.from_records(neos, load_approach_records(TEST_CAD_FILE))
+
+    def test_exact_match_is_preferred(self):
+        self.assertEqual(self.db.get_neo_by_name('Cerberus').designation, '1865')
+        self.assertEqual(self.db.get_neo_by_name('CERBERUS').designation, '2999 XX')
+        self.assertEqual(self.db.get_neo_by_name('cerberus').designation, '1865')
+        self.assertIsNone(self.db.get_neo_by_name('Cerb'))
+
+    def test_every_neo_sharing_a_name(self):
+        self.assertEqual([neo.designation for neo in self.db.get_neos_by_name('cerberus')], ['1865', '2999 XX'])
+
+    def test_completion(self):
+        self.assertEqual(self.db.complete_names('cerb'), ['Cerberus', 'CERBERUS'])
+        designations = self.db.complete_designations('2020 b')
+        self.assertIn('2020 BS', designations)
+        self.assertTrue(all(designation.startswith('2020 B') for designation in designations))
+
+    def test_added_and_renamed_neos(self):
+        self.db.get_neos_by_name('anything')  # Build the index before the changes.
+        self.db.add_neos([NearEarthObject(designation='3000 YY', name='cerberus', diameter='', hazardous='N'),
+                          NearEarthObject(designation='1865', name='Kerberos', diameter='1.2', hazardous='N')])
+        self.assertEqual([neo.designation for neo in self.db.get_neos_by_name('Cerberus')],
+                         ['2999 XX', '3000 YY'])
+        self.assertEqual(self.db.get_neo_by_name('kerberos').designation, '1865')
+        self.assertEqual(self.db.complete_designations('3000'), ['3000 YY'])
+
+    def test_fuzzy_search(self):
+        neo, score = self.db.search_neos('Jormungand')[0]
+        self.assertEqual(neo.name, 'Jormungandr')
+        self.assertLess(score, 1)
+        self.assertEqual([neo.designation for neo, _score in self.db.search_neos('cerberus', 2)], ['1865', '2999 XX'])
+        self.assertEqual(self.db.search_neos('2020 BS', 1)[0], (self.db.get_neo_by_designation('2020 BS'), 1.0))
+
+    def test_fuzzy_search_after_changes(self):
+        self.db.search_neos('anything')  # Build the index before the changes.
+        self.db.add_neos([NearEarthObject(designation='1865', name='Kerberos', diameter='1.2', hazardous='N'),
+                          NearEarthObject(designation='3000 YY', name='Zagreus', diameter='', hazardous='N')])
+        self.assertEqual(self.db.search_neos('Kerberus', 1)[0][0].designation, '1865')
+        self.assertEqual([neo.designation for neo, _score in self.db.search_neos('cerberus', 1)], ['2999 XX'])
+        self.assertEqual(self.db.search_neos('zagreos', 1)[0][0].designation, '3000 YY')
+
+    def test_fuzzy_inspect(self):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            self.assertIsNone(inspect(self.db, name='Jormungand'))
+            self.assertEqual(inspect(self.db, name='Jormungand', fuzzy=True).name, 'Jormungandr')
+            self.assertEqual(inspect(self.db, name='Jormungandr', fuzzy=True).name, 'Jormungandr')
+            self.assertIsNone(inspect(self.db, name='xyzzy', fuzzy=True))
+
+
+class TestShellCompletion(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        database = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+        _parser, inspect_parser, query_parser, aggregate_parser = make_parser()
+        cls.shell = NEOShell(database, inspect_parser, query_parser, aggregate_parser)
+
+    def complete(self, line):
+        text = line.split()[-1] if not line.endswith(' ') else ''
+        text = text.split('"')[-1]
+        return self.shell.complete_inspect(text, 'inspect ' + line, len('inspect ' + line) - len(text),
+                                           len('inspect ' + line))
+
+    def test_names(self):
+        self.assertEqual(self.complete('--name cerb'), ['Cerberus'])
+        self.assertEqual(self.complete('-v -n ADO'), ['Adonis'])
+
+    def test_designations_with_spaces(self):
+        completions = self.complete('--pdes 2020')
+        self.assertGreater(len(completions), 0)
+        self.assertTrue(all(completion.startswith('"2020 ') for completion in completions))
+        # Within quotes, only the word after the space is replaced.
+        self.assertIn('BS', self.complete('--pdes "2020 bs'))
+        self.assertEqual(self.complete('--pdes 1865'), ['1865'])
+
+    def test_options(self):
+        self.assertEqual(self.complete('--na'), ['--name'])
+        self.assertEqual(self.complete('x'), [])
+
+    def test_search_command(self):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.shell.onecmd('search Apophsi')
+        self.assertTrue(output.getvalue().splitlines()[0].endswith('99942 Apophis'))
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            self.shell.onecmd('search')
+        self.assertIn('Search for what?', errors.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Check that a full scan split over worker processes agrees with a scan in this process.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_parallel_scan
+"""
+import contextlib
+import datetime
+import io
+import pathlib
+import sys
+import unittest
+from unittest import mock
+
+import database
+import main
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+@unittest.skipIf(database._FORK is None, "Worker processes can't be forked on this platform.")
+@mock.patch.object(database, '_MIN_SHARD_ROWS', 100)
+@mock.patch.object(database, '_MIN_PARALLEL_ROWS', 0)
+class TestParallelScan(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+        cls.db.indexed_columns = ()
+        cls.db.box_columns = ()
+        cls.db._build_indexes()
+
+    def tearDown(self):
+        self.db.__dict__.pop('workers', None)
+        self.db.__dict__.pop('engine', None)
+
+    def check(self, filters):
+        expected = list(self.db.query_rows(filters))
+        self.db.workers = 3
+        self.assertIn('parallel full scan (3 workers)', str(self.db.explain(filters)))
+        self.assertEqual(list(self.db.query_rows(filters)), expected)
+        self.assertEqual(list(self.db.query(filters)), list(self.db.fetch(expected)))
+        return expected
+
+    def test_agrees_with_serial_scan(self):
+        for engine in ('python', 'numpy'):
+            with self.subTest(engine=engine):
+                self.db.engine = engine
+                filters = create_filters(distance_max=0.2, velocity_min=10, hazardous=False)
+                self.assertGreater(len(self.check(filters)), 0)
+
+    def test_dates_and_no_matches(self):
+        self.assertGreater(len(self.check(create_filters(start_date=datetime.date(2020, 6, 1)))), 0)
+        self.assertEqual(self.check(create_filters(velocity_min=1000)), [])
+
+    def test_unfiltered_and_small_stores_stay_serial(self):
+        self.db.workers = 3
+        self.assertEqual(self.db.explain(create_filters()).workers, 1)
+        with mock.patch.object(database, '_MIN_PARALLEL_ROWS', len(self.db._store) + 1):
+            self.assertEqual(self.db.explain(create_filters(distance_max=0.2)).workers, 1)
+
+    def test_limit_stops_early(self):
+        self.db.workers = 2
+        rows = self.db.query_rows(create_filters(distance_min=0), limit=5)
+        self.assertEqual(list(rows), [0, 1, 2, 3, 4])
+
+    def test_small_limit_of_common_matches_stays_serial(self):
+        self.db.workers = 2
+        filters = create_filters(distance_min=0)
+        with mock.patch.object(database, '_MIN_PARALLEL_ROWS', 1000):
+            self.assertEqual(self.db.explain(filters, limit=5).workers, 1)
+            self.assertEqual(self.db.explain(filters).workers, 2)
+
+
+class TestJobs(unittest.TestCase):
+    def test_jobs_apply_to_the_loaded_database_only(self):
+        argv = ['main.py', '--neofile', str(TEST_NEO_FILE), '--cadfile', str(TEST_CAD_FILE), '--no-cache',
+                '--jobs', '3', 'query', '--max-distance', '0.2']
+        loaded, original = [], main.load_database
+
+        def load_database(*args, **kwargs):
+            loaded.append(original(*args, **kwargs))
+            return loaded[-1]
+
+        with mock.patch.object(sys, 'argv', argv), mock.patch.object(main, 'load_database', load_database), \
+                contextlib.redirect_stdout(io.StringIO()):
+            main.main()
+        self.assertEqual(loaded[0].workers, 3)
+        self.assertEqual(NEODatabase.workers, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
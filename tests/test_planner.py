@@ -0,0 +1,110 @@
+"""Check the query planner's statistics, estimates and choice of access path.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_planner
+"""
+import datetime
+import math
+import operator
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+from planner import ColumnStats
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestColumnStats(unittest.TestCase):
+    def test_uniform_ranges(self):
+        stats = ColumnStats([i / 10 for i in range(1000)], 1000)
+        self.assertEqual(stats.minimum, 0)
+        self.assertEqual(stats.maximum, 99.9)
+        self.assertAlmostEqual(stats.selectivity(upper=25), 0.25, places=2)
+        self.assertAlmostEqual(stats.selectivity(lower=90, upper=95), 0.05, places=2)
+        self.assertEqual(stats.selectivity(lower=200), 0)
+        self.assertEqual(stats.selectivity(), 1)
+
+    def test_integer_equality_is_exact(self):
+        stats = ColumnStats.from_values([0, 1, 1, 0, 0, 0, 0, 1], integer=True)
+        self.assertEqual(stats.selectivity(lower=1, upper=1), 3 / 8)
+        self.assertEqual(stats.selectivity(lower=0, upper=0), 5 / 8)
+        self.assertEqual(stats.selectivity(lower=0, lower_inclusive=False), 3 / 8)
+
+    def test_weights_and_unknown_values(self):
+        stats = ColumnStats.from_values([1.0, math.nan, 3.0], weights=[1, 5, 4])
+        self.assertEqual(stats.total, 10)
+        self.assertAlmostEqual(stats.selectivity(lower=2), 0.4)
+        self.assertAlmostEqual(stats.selectivity(), 0.5)
+
+    def test_empty_column(self):
+        stats = ColumnStats([], 0)
+        self.assertEqual(stats.selectivity(lower=1), 0)
+
+
+class TestPlanner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+
+    def test_no_filters_scan(self):
+        plan = self.db.explain(create_filters())
+        self.assertEqual(plan.access, 'scan')
+        self.assertEqual(plan.checks, [])
+
+    def test_date_uses_day_buckets_or_time_index(self):
+        plan = self.db.explain(create_filters(date=datetime.date(2020, 3, 2)))
+        self.assertEqual(plan.access, 'day')
+        self.assertEqual(plan.column, 'time')
+        self.assertIn('day bucket lookup (2020-03-02)', str(plan))
+        self.db.day_buckets = False
+        try:
+            plan = self.db.explain(create_filters(date=datetime.date(2020, 3, 2)))
+            self.assertEqual(plan.access, 'index')
+            self.assertEqual(plan.column, 'time')
+            self.assertIn('index scan on time', str(plan))
+        finally:
+            del self.db.day_buckets
+
+    def test_checks_are_ordered_by_selectivity(self):
+        plan = self.db.explain(create_filters(distance_min=0.01, velocity_min=20, hazardous=False))
+        selectivities = [selectivity for _condition, selectivity in plan.checks]
+        self.assertEqual(selectivities, sorted(selectivities))
+
+    def test_neo_first_plan(self):
+        self.db.engine = 'python'
+        try:
+            plan = self.db.explain(create_filters(diameter_min=1))
+            self.assertEqual(plan.access, 'neo')
+            self.assertEqual(plan.used, [('diameter', operator.ge, 1)])
+        finally:
+            del self.db.engine
+
+    def test_neo_first_results_keep_internal_order(self):
+        filters = create_filters(hazardous=True, diameter_min=1)
+        self.assertEqual(self.db.explain(filters).access, 'neo')
+        expected = [a for a in self.db.query() if all(flt(a) for flt in filters)]
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(list(self.db.query(filters)), expected)
+
+    def test_every_access_path_agrees(self):
+        filters = create_filters(diameter_min=0.5, distance_max=0.2, start_date=datetime.date(2020, 2, 1))
+        expected = [a for a in self.db.query() if all(flt(a) for flt in filters)]
+        self.assertGreater(len(expected), 0)
+        conditions, _residual = self.db._split_filters(filters)
+        on_diameter = [condition for condition in conditions if condition[0] == 'diameter']
+        for access, rows in (('index', self.db._indexes['distance'].rows(upper=0.2)),
+                             ('neo', self.db._neo_candidates(on_diameter))):
+            with self.subTest(access=access):
+                received = [self.db._approach(row) for row in self.db._scan(conditions, rows)]
+                self.assertEqual(received, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
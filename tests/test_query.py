@@ -16,6 +16,11 @@ import datetime
 import pathlib
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from database import NEODatabase
 from extract import load_neos, load_approaches
 from filters import create_filters
@@ -529,5 +534,29 @@ class TestQuery(unittest.TestCase):
         self.assertEqual(expected, received, msg="Computed results do not match expected results.")
 
 
+class TestQueryWithPythonEngine(TestQuery):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db.engine = 'python'
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed.")
+class TestQueryWithNumPyEngine(TestQuery):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db.engine = 'numpy'
+
+
+class TestQueryWithoutIndexes(TestQuery):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db.indexed_columns = ()
+        cls.db.box_columns = ()
+        cls.db._build_indexes()
+
+
 if __name__ == '__main__':
     unittest.main()
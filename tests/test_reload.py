@@ -0,0 +1,118 @@
+"""Check that changed data files are reloaded as a delta, or rebuilt when records disappear.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_reload
+"""
+import json
+import pathlib
+import shutil
+import tempfile
+import time
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+from reload import Reloader, diff_neos, diff_records
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def as_tuples(database):
+    return [(a.neo.designation, a.time, a.distance, a.velocity) for a in database.query()]
+
+
+class TestDiff(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.records = list(load_approach_records(TEST_CAD_FILE))
+        cls.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), cls.records[:-5])
+
+    def test_unchanged(self):
+        self.assertEqual(diff_records(self.db, self.records[:-5]), [])
+        self.assertEqual(diff_neos(self.db, load_neos(TEST_NEO_FILE)), [])
+
+    def test_appended_and_corrected(self):
+        records = list(self.records)
+        designation, minutes, distance, velocity = records[10]
+        records[10] = (designation, minutes, distance / 2, velocity)
+        self.assertEqual(diff_records(self.db, records), [records[10]] + self.records[-5:])
+
+    def test_removed(self):
+        self.assertIsNone(diff_records(self.db, self.records[1:]))
+        self.assertIsNone(diff_neos(self.db, load_neos(TEST_NEO_FILE)[1:]))
+
+    def test_corrected_neo(self):
+        neos = load_neos(TEST_NEO_FILE)
+        neos[3].name = 'Renamed'
+        self.assertEqual(diff_neos(self.db, neos), [neos[3]])
+
+
+class TestReloader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = pathlib.Path(self.tmpdir.name)
+        self.neo_file = root / 'neos.csv'
+        self.cad_file = root / 'cad.json'
+        shutil.copy(TEST_NEO_FILE, self.neo_file)
+        with open(TEST_CAD_FILE) as infile:
+            self.contents = json.load(infile)
+        self.full_data = self.contents['data']
+        self.write_cad(self.full_data[:-20])
+        self.db = NEODatabase.from_records(load_neos(self.neo_file), load_approach_records(self.cad_file))
+        self.reloader = Reloader(self.neo_file, self.cad_file, cache=False)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_cad(self, data):
+        contents = dict(self.contents, data=data, count=str(len(data)))
+        with open(self.cad_file, 'w') as outfile:
+            json.dump(contents, outfile)
+
+    def wait(self):
+        for _ in range(500):
+            result = self.reloader.poll()
+            if result is not None:
+                return result
+            time.sleep(0.01)
+        self.fail("The reload didn't finish.")
+
+    def test_appended_records_are_applied_as_a_delta(self):
+        self.assertFalse(self.reloader.changed())
+        self.write_cad(self.full_data)
+        self.assertTrue(self.reloader.changed())
+        self.reloader.start(self.db)
+        update = self.wait()
+        self.assertIsNone(update.database)
+        self.assertEqual(len(update.records), 20)
+        self.assertIs(update.apply(self.db), self.db)
+        self.assertFalse(self.reloader.changed())
+
+        expected = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+        self.assertEqual(as_tuples(self.db), as_tuples(expected))
+
+    def test_removed_records_rebuild(self):
+        self.db.workers = 3
+        self.write_cad(self.full_data[100:])
+        self.reloader.start(self.db)
+        update = self.wait()
+        self.assertIsNotNone(update.database)
+        rebuilt = update.apply(self.db)
+        self.assertIsNot(rebuilt, self.db)
+        self.assertEqual(rebuilt.workers, 3)
+        self.assertEqual(len(list(rebuilt.query())), len(self.full_data) - 100)
+        self.assertGreater(len(list(self.db.query(create_filters()))), len(self.full_data) - 100)
+
+    def test_failed_reload_is_reported(self):
+        self.cad_file.write_text('{"fields": ["des"], "data": [')
+        self.reloader.start(self.db)
+        self.assertIsInstance(self.wait(), Exception)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""Check that a binary snapshot round-trips the parsed data and detects stale sources.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_snapshot
+"""
+import json
+import math
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+import snapshot
+from snapshot import snapshot_path, load_snapshot, write_snapshot
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = pathlib.Path(self.tmpdir.name)
+        self.neo_file = root / 'neos.csv'
+        self.cad_file = root / 'cad.json'
+        shutil.copy(TEST_NEO_FILE, self.neo_file)
+        shutil.copy(TEST_CAD_FILE, self.cad_file)
+        self.path = snapshot_path(self.neo_file, self.cad_file)
+
+        self.db = NEODatabase(load_neos(self.neo_file), load_approaches(self.cad_file))
+        write_snapshot(self.path, self.db, self.neo_file, self.cad_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_snapshot_lives_next_to_the_data_files(self):
+        self.assertEqual(self.path.parent, self.neo_file.parent)
+        self.assertTrue(self.path.exists())
+
+    def test_snapshot_round_trips_neos(self):
+        loaded = load_snapshot(self.path, self.neo_file, self.cad_file)
+        self.assertEqual(len(loaded._neos), len(self.db._neos))
+        for neo, original in zip(loaded._neos, self.db._neos):
+            self.assertEqual(neo.designation, original.designation)
+            self.assertEqual(neo.name, original.name)
+            self.assertEqual(neo.hazardous, original.hazardous)
+            if math.isnan(original.diameter):
+                self.assertTrue(math.isnan(neo.diameter))
+            else:
+                self.assertEqual(neo.diameter, original.diameter)
+
+    def test_snapshot_round_trips_approaches(self):
+        loaded = load_snapshot(self.path, self.neo_file, self.cad_file)
+        approaches = list(loaded.query())
+        originals = list(self.db.query())
+        self.assertEqual(len(approaches), len(originals))
+        for approach, original in zip(approaches, originals):
+            self.assertEqual(approach.time, original.time)
+            self.assertEqual(approach.distance, original.distance)
+            self.assertEqual(approach.velocity, original.velocity)
+            self.assertEqual(approach.neo.designation, original.neo.designation)
+
+    def test_snapshot_links_neos_to_approaches(self):
+        loaded = load_snapshot(self.path, self.neo_file, self.cad_file)
+        for neo in loaded._neos:
+            for approach in neo.approaches:
+                self.assertIs(approach.neo, neo)
+
+    def test_touched_source_is_still_fresh(self):
+        stat = self.cad_file.stat()
+        os.utime(self.cad_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(load_snapshot(self.path, self.neo_file, self.cad_file))
+
+    def test_touched_source_is_hashed_once(self):
+        stat = self.cad_file.stat()
+        os.utime(self.cad_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        with mock.patch.object(snapshot, '_file_digest', wraps=snapshot._file_digest) as digest:
+            first = load_snapshot(self.path, self.neo_file, self.cad_file)
+            second = load_snapshot(self.path, self.neo_file, self.cad_file)
+        self.assertEqual(digest.call_count, 1)
+        self.assertEqual([(a.time, a.distance, a.velocity, a.neo.designation) for a in second.query()],
+                         [(a.time, a.distance, a.velocity, a.neo.designation) for a in first.query()])
+        self.assertEqual(sorted(path.name for path in self.path.parent.iterdir()),
+                         sorted([self.path.name, self.neo_file.name, self.cad_file.name]))
+
+    def test_modified_source_is_stale(self):
+        with open(self.neo_file, 'a') as outfile:
+            outfile.write('\n')
+        self.assertIsNone(load_snapshot(self.path, self.neo_file, self.cad_file))
+
+    def test_missing_snapshot(self):
+        self.path.unlink()
+        self.assertIsNone(load_snapshot(self.path, self.neo_file, self.cad_file))
+
+    def test_truncated_snapshot(self):
+        data = self.path.read_bytes()
+        for size in (len(snapshot._MAGIC) + 2, len(snapshot._MAGIC) + 20, len(data) // 2, len(data) - 8, len(data) - 1):
+            with self.subTest(size=size):
+                self.path.write_bytes(data[:size])
+                self.assertIsNone(load_snapshot(self.path, self.neo_file, self.cad_file))
+
+    def test_snapshot_that_doesnt_match_its_header(self):
+        data = self.path.read_bytes()
+        start = len(snapshot._MAGIC) + snapshot._HEADER_LENGTH.size
+        (length,) = snapshot._HEADER_LENGTH.unpack_from(data, len(snapshot._MAGIC))
+        header = json.loads(data[start:start + length].decode('utf-8'))
+        for section, key, change in (('counts', 'neo', 1), ('counts', 'approach', -1), ('counts', 'orphan', 1),
+                                     ('columns', 0, ['designation', 'str', 0]), ('counts', 'neo', None)):
+            with self.subTest(section=section, key=key):
+                changed = json.loads(json.dumps(header))
+                if section == 'columns':
+                    changed[section][key] = change
+                elif change is None:
+                    del changed[section][key]
+                else:
+                    changed[section][key] += change
+                encoded = json.dumps(changed).encode('utf-8')
+                self.path.write_bytes(snapshot._MAGIC + snapshot._HEADER_LENGTH.pack(len(encoded)) + encoded
+                                      + data[start + length:])
+                self.assertIsNone(load_snapshot(self.path, self.neo_file, self.cad_file))
+
+    def test_failed_write_leaves_no_temporary_file(self):
+        original = self.path.read_bytes()
+        with mock.patch.object(snapshot.os, 'replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                write_snapshot(self.path, self.db, self.neo_file, self.cad_file)
+        self.assertEqual(sorted(path.name for path in self.path.parent.iterdir()),
+                         sorted([self.path.name, self.neo_file.name, self.cad_file.name]))
+        self.assertEqual(self.path.read_bytes(), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Check that ordered queries agree with sorting every match, however they're answered.
+
+To run these tests from the project root, run:
+
+    $ python3 -m unittest --verbose tests.test_sort
+"""
+import datetime
+import math
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approach_records
+from filters import create_filters
+from helpers import datetime_to_minutes
+from indexes import SortedIndex
+from store import NO_TIME
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def sort_key(column):
+    """The value of an approach to sort by, or None if it's unknown."""
+    def value(approach):
+        if column == 'diameter':
+            result = approach.neo.diameter if approach.neo else math.nan
+        else:
+            result = getattr(approach, column)
+        return None if result is None or result != result else result
+    return value
+
+
+def expected_order(approaches, column, reverse=False, limit=None):
+    value = sort_key(column)
+    known = sorted((a for a in approaches if value(a) is not None), key=value, reverse=reverse)
+    unknown = [a for a in approaches if value(a) is None]
+    return (known + unknown)[:limit or None]
+
+
+class TestSortedIndexWalk(unittest.TestCase):
+    def test_walk_with_changes(self):
+        column = [5.0, 1.0, 3.0, 3.0, math.nan, 2.0, 3.0]
+        index = SortedIndex(column)
+        column.append(3.0)
+        index.add(7)
+        column[1] = 4.0
+        index.update(1, 1.0)
+        self.assertEqual(list(index.walk()), [5, 2, 3, 6, 7, 1, 0])
+        # Equal values stay in internal order in either direction.
+        self.assertEqual(list(index.walk(reverse=True)), [0, 1, 2, 3, 6, 7, 5])
+        self.assertEqual(list(index.walk(upper=3.0, upper_inclusive=False)), [5])
+        self.assertEqual(list(index.walk(lower=3.0, reverse=True)), [0, 1, 2, 3, 6, 7])
+
+    def test_unknown_rows(self):
+        column = [5.0, math.nan, 3.0, 3.0, math.nan]
+        index = SortedIndex(column)
+        self.assertEqual(index.unknown_rows(), [1, 4])
+        column.append(math.nan)
+        index.add(5)
+        column[1], column[2] = 2.0, math.nan
+        index.update(1, math.nan)
+        index.update(2, 3.0)
+        self.assertEqual(index.unknown_rows(), [2, 4, 5])
+        self.assertEqual(list(index.walk()), [1, 3, 0])
+
+
+class TestSortedQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+
+    def check(self, filters, column, reverse=False, limit=None):
+        matches = list(self.db.query(filters))
+        received = list(self.db.query(filters, column, reverse, limit))
+        self.assertEqual(received, expected_order(matches, column, reverse, limit))
+        return self.db.explain(filters, column, reverse, limit)
+
+    def test_every_column_and_direction(self):
+        filters = create_filters(start_date=datetime.date(2020, 3, 1), velocity_min=5)
+        for column in ('time', 'distance', 'velocity', 'diameter'):
+            for reverse in (False, True):
+                for limit in (None, 1, 10):
+                    with self.subTest(column=column, reverse=reverse, limit=limit):
+                        self.check(filters, column, reverse, limit)
+
+    def test_common_matches_walk_the_index(self):
+        plan = self.check(create_filters(velocity_min=1), 'distance', limit=10)
+        self.assertEqual(plan.access, 'walk')
+        self.assertIn('stop after 10 matches', str(plan))
+        plan = self.check(create_filters(start_date=datetime.date(2020, 6, 1)), 'time', True, 5)
+        self.assertEqual(plan.access, 'walk')
+
+    def test_rare_matches_use_a_heap(self):
+        plan = self.check(create_filters(date=datetime.date(2020, 3, 2)), 'velocity', True, 3)
+        self.assertNotEqual(plan.access, 'walk')
+        self.assertIn('top 3 by velocity (descending) with a bounded heap', str(plan))
+
+    def test_unknown_diameters_come_last(self):
+        approaches = self.db.fetch(self.db.sort_rows(range(len(self.db._store)), 'diameter', True))
+        diameters = [approach.neo.diameter for approach in approaches]
+        known = [diameter for diameter in diameters if diameter == diameter]
+        self.assertGreater(len(known), 0)
+        self.assertEqual(diameters[:len(known)], sorted(known, reverse=True))
+        self.assertTrue(all(diameter != diameter for diameter in diameters[len(known):]))
+
+    def test_walks_end_with_unknown_values(self):
+        db = NEODatabase.from_records(load_neos(TEST_NEO_FILE), load_approach_records(TEST_CAD_FILE))
+        db.add_approach_records([('433', NO_TIME, 0.1, 5.0), ('433', datetime_to_minutes(datetime.datetime(2020, 5, 1)), math.nan, 5.0)])
+        approaches = list(db.query())
+        for column in ('time', 'distance'):
+            for reverse in (False, True):
+                with self.subTest(column=column, reverse=reverse):
+                    self.assertEqual(db.explain(create_filters(), column, reverse, len(approaches)).access, 'walk')
+                    received = list(db.query(create_filters(), column, reverse, len(approaches)))
+                    self.assertEqual(received, expected_order(approaches, column, reverse))
+                    self.assertEqual(sort_key(column)(received[-1]), None)
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            list(self.db.query(create_filters(), 'name'))
+
+
+if __name__ == '__main__':
+    unittest.main()